@@ -0,0 +1,103 @@
+from os import path
+import datetime
+import json
+import os
+import shutil
+import sys
+import tempfile
+project_root = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.append(f"{project_root}/nacos-jmeter")
+
+from loguru import logger
+
+from benchmark import BenchmarkRecorder, check_throughput, compare_results, generate_jmx, generate_snapshot, \
+    run_isolated, save_results
+from builder import Builder
+from collector import Collector
+from testplan import TestPlan
+import settings
+
+
+def run_case(case, trace_memory=False) -> dict:
+    """Time Collector, TestPlan and Builder operations on synthetic inputs of one case."""
+    case_name = f"cfg{case['snapshot_files']}-smp{case['samplers']}-tg{case['thread_groups']}-" \
+                f"depth{case['controller_depth']}"
+    recorder = BenchmarkRecorder(case_name, dict(case), trace_memory=trace_memory)
+    controller_count = case["thread_groups"] * case["controller_depth"]
+    test_plans = [f"plans/plan-{i}.jmx" for i in range(case["test_plans"])]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        snapshot_base = os.path.join(tmp_dir, "snapshot")
+        test_plan_base_dir = os.path.join(tmp_dir, "repo")
+        workspace = os.path.join(tmp_dir, "workspace")
+        summary_dir = os.path.join(tmp_dir, "summary")
+        for directory in [workspace, summary_dir, os.path.join(tmp_dir, "jmeter")]:
+            os.mkdir(directory)
+        generate_snapshot(snapshot_base, case["snapshot_files"], case["value_size"], test_plans)
+        for test_plan in test_plans:
+            generate_jmx(os.path.join(test_plan_base_dir, test_plan), case["samplers"], case["thread_groups"],
+                         case["controller_depth"])
+
+        with recorder.phase("collector.filter_data_ids"):
+            collector = Collector(snapshot_base)
+        recorder.set_throughput("collector.filter_data_ids", case["snapshot_files"])
+
+        with recorder.phase("collector.generate_all_stages_summary"):
+            collector.generate_all_stages_summary(summary_dir, collect_for_debug=True)
+        recorder.set_throughput("collector.generate_all_stages_summary", case["snapshot_files"])
+
+        # summaries are encoded by ant, plain summary is good enough for Builder
+        summary_file_name = collector.get_summary_file_name("ci")
+        shutil.copy(os.path.join(summary_dir, summary_file_name + collector.extension_before_encode),
+                    os.path.join(snapshot_base, summary_file_name))
+
+        jmx = os.path.join(test_plan_base_dir, test_plans[0])
+        with recorder.phase("testplan.parse"):
+            test_plan_instance = TestPlan(jmx)
+        recorder.set_throughput("testplan.parse", case["samplers"])
+
+        with recorder.phase("testplan.change_controller_type"):
+            test_plan_instance.change_controller_type()
+        recorder.set_throughput("testplan.change_controller_type", controller_count)
+
+        with recorder.phase("testplan.add_jsr223listener_to_each_http_request"):
+            test_plan_instance.add_jsr223listener_to_each_http_request("benchmark-ci")
+        recorder.set_throughput("testplan.add_jsr223listener_to_each_http_request", case["samplers"])
+
+        with recorder.phase("testplan.save"):
+            test_plan_instance.save(jmx)
+        recorder.set_throughput("testplan.save", case["samplers"])
+
+        with recorder.phase("builder.generate_new_build_xml"):
+            build = Builder("benchmark-ci", snapshot_base)
+            build.sample_build_xml = os.path.join(settings.PROJECT_ROOT, "resources", "build_template.xml")
+            build.generate_new_build_xml(workspace, os.path.join(tmp_dir, "jmeter"), "benchmark", test_plan_base_dir,
+                                         os.path.join(workspace, "build.xml"))
+        # cost grows with samplers of every test plan, as properties referenced are searched in each of them
+        recorder.set_throughput("builder.generate_new_build_xml", len(test_plans) * case["samplers"])
+    return recorder.to_dict()
+
+
+if __name__ == "__main__":
+    # usage: benchmark_builder.py [result_json] [baseline_json]
+    date_str = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    result_json = sys.argv[1] if len(sys.argv) > 1 else \
+        os.path.join(settings.BENCHMARK_RESULT_DIR, f"builder-{date_str}.json")
+    baseline_json = sys.argv[2] if len(sys.argv) > 2 else None
+
+    results = []
+    for benchmark_case in settings.BENCHMARK_BUILDER_CASES:
+        logger.info(f"Benchmark case starts: {benchmark_case}")
+        result = run_isolated(run_case, benchmark_case)
+        # tracemalloc slows down every allocation, so memory is measured in another run
+        memory_result = run_isolated(run_case, benchmark_case, True)
+        for phase, measurement in memory_result["phases"].items():
+            result["phases"][phase]["python_peak_mb"] = measurement["python_peak_mb"]
+        results.append(result)
+    save_results("builder", results, result_json)
+
+    failures = check_throughput(results, settings.BENCHMARK_BUILDER_THROUGHPUT_TARGETS)
+    if baseline_json:
+        failures += compare_results(baseline_json, result_json)
+    if failures:
+        print(json.dumps(failures, indent=2))
+        sys.exit(1)
@@ -0,0 +1,126 @@
+from os import path
+import datetime
+import json
+import os
+import sys
+import tempfile
+project_root = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.append(f"{project_root}/nacos-jmeter")
+
+from loguru import logger
+
+from benchmark import BenchmarkRecorder, compare_results, run_isolated, save_results
+from fakedatabase import FakeVesyncDatabase
+from fakenacos import FakeNacosServer
+from nacosserver import NacosServer
+from databasesyncer import DatabaseSyncer
+import settings
+
+
+class RecordingRobot(object):
+    """Stand-in of DingtalkChatbot keeping messages instead of sending them."""
+
+    def __init__(self):
+        self.messages = []
+
+    def send_text(self, msg, is_at_all=False):
+        self.messages.append(msg)
+
+
+def run_cycle_by_phase(recorder: BenchmarkRecorder, database_syncer: DatabaseSyncer, database_info: dict, rows: int):
+    """Run the steps of DatabaseSyncer.sync_once() one by one, each step of both tables is measured as one phase."""
+    tables = [
+        (settings.TABLE_DEVICE_TYPE_DATA_ID, database_syncer.get_data_from_table_device_type,
+         database_syncer.get_device_type_snapshot_from_nacos),
+        (settings.TABLE_FIRMWARE_INFO_DATA_ID, database_syncer.get_data_from_table_firmware_info,
+         database_syncer.get_firmware_info_snapshot_from_nacos)
+    ]
+    with recorder.phase("extract"):
+        from_database = [get_from_database(database_info) for _, get_from_database, _ in tables]
+    recorder.set_throughput("extract", rows)
+
+    with recorder.phase("nacos_fetch"):
+        from_nacos = [get_from_nacos() for _, _, get_from_nacos in tables]
+    recorder.set_throughput("nacos_fetch", rows)
+
+    # sync_once() formats the diff for the notification, it is part of the cost
+    with recorder.phase("diff"):
+        diffs = [database_syncer.diff_nacos_and_database(nacos_data, database_data)
+                 for nacos_data, database_data in zip(from_nacos, from_database)]
+        changed = [len(ddiff) > 0 and bool(ddiff.pretty()) for ddiff in diffs]
+    recorder.set_throughput("diff", rows)
+    recorder.params["changed_tables"] = sum(changed)
+
+    with recorder.phase("serialize"):
+        contents = [database_syncer.serialize_table(data) if is_changed else None
+                    for data, is_changed in zip(from_database, changed)]
+    recorder.set_throughput("serialize", rows)
+    recorder.params["published_bytes"] = sum(len(content.encode()) for content in contents if content)
+
+    with recorder.phase("publish"):
+        for (data_id, _, _), content in zip(tables, contents):
+            if content:
+                database_syncer.publish_table_snapshot(data_id, content)
+
+
+def run_case(scale, mutation_ratio) -> dict:
+    """
+    Time DatabaseSyncer cycles on tables of today's sizes multiplied by scale.
+
+    Nacos is filled by a first cycle, then rows are changed by mutation_ratio and a cycle is measured step by step.
+    The same ratio of rows is changed again, and a whole sync_once() is measured as the cycle DatabaseSyncer.run()
+    repeats.
+    """
+    case_name = f"scale{scale}-mutation{mutation_ratio}"
+    device_types = settings.BENCHMARK_DATABASE_DEVICE_TYPES * scale
+    stage = "ci"
+    with tempfile.TemporaryDirectory() as tmp_dir, FakeNacosServer(seed=0) as fake:
+        database = FakeVesyncDatabase(os.path.join(tmp_dir, "vesync.db"), seed=0)
+        database.generate(device_types, settings.BENCHMARK_DATABASE_FIRMWARE_VERSIONS,
+                          settings.BENCHMARK_DATABASE_PLUGINS)
+        database.publish_database_info(fake, settings.STAGE_TO_NAMESPACE_IDS[stage])
+        # latest firmware of every model, region and plugin
+        firmware_rows = device_types * len(FakeVesyncDatabase.REGIONS) * settings.BENCHMARK_DATABASE_PLUGINS
+        rows = device_types + firmware_rows
+        recorder = BenchmarkRecorder(case_name, {
+            "scale": scale, "mutation_ratio": mutation_ratio, "device_type_rows": device_types,
+            "firmware_info_rows": firmware_rows * settings.BENCHMARK_DATABASE_FIRMWARE_VERSIONS
+        }, lambda: fake.request_counts)
+
+        robot = RecordingRobot()
+        database_syncer = DatabaseSyncer(stage, NacosServer(fake.host, fake.port), connect=database.connect)
+        database_info = database_syncer.get_vesync_database_info_from_nacos()
+        with recorder.phase("initial_cycle"):
+            database_syncer.sync_once(robot, database_info)
+        recorder.set_throughput("initial_cycle", rows)
+
+        recorder.params["changed_rows"] = database.mutate(mutation_ratio)
+        run_cycle_by_phase(recorder, database_syncer, database_info, rows)
+
+        database.mutate(mutation_ratio)
+        with recorder.phase("cycle"):
+            database_syncer.sync_once(robot, database_info)
+        recorder.set_throughput("cycle", rows)
+        recorder.params["notifications"] = len(robot.messages)
+        return recorder.to_dict()
+
+
+if __name__ == "__main__":
+    # usage: benchmark_database_syncer.py [result_json] [baseline_json]
+    date_str = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    result_json = sys.argv[1] if len(sys.argv) > 1 else \
+        os.path.join(settings.BENCHMARK_RESULT_DIR, f"database-syncer-{date_str}.json")
+    baseline_json = sys.argv[2] if len(sys.argv) > 2 else None
+
+    results = []
+    for benchmark_scale in settings.BENCHMARK_DATABASE_SCALES:
+        for benchmark_mutation_ratio in settings.BENCHMARK_DATABASE_MUTATION_RATIOS:
+            logger.info(f"Benchmark case starts: scale {benchmark_scale}, mutation ratio {benchmark_mutation_ratio}")
+            results.append(run_isolated(run_case, benchmark_scale, benchmark_mutation_ratio))
+    save_results("database-syncer", results, result_json)
+
+    if baseline_json:
+        regressions = compare_results(baseline_json, result_json)
+        if regressions:
+            print(json.dumps(regressions, indent=2))
+            sys.exit(1)
@@ -0,0 +1,88 @@
+from os import path
+from pathlib import Path
+import datetime
+import json
+import os
+import shutil
+import sys
+import tempfile
+project_root = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.append(f"{project_root}/nacos-jmeter")
+
+from loguru import logger
+import git
+
+from benchmark import BenchmarkRecorder, compare_results, run_isolated, save_results
+from fakenacos import FakeNacosServer
+from nacosserver import NacosServer
+from nacossyncer import NacosSyncer
+import settings
+
+
+def init_remote(base_dir) -> str:
+    """Create a local bare git remote with one commit, return its path."""
+    remote_dir = os.path.join(base_dir, "remote.git")
+    git.Repo.init(remote_dir, bare=True)
+    seed_repo = git.Repo.clone_from(remote_dir, os.path.join(base_dir, "seed"))
+    Path(seed_repo.working_dir, "README").write_text("nacos snapshot for benchmark\n")
+    seed_repo.index.add(["README"])
+    seed_repo.index.commit("init")
+    seed_repo.remotes.origin.push(seed_repo.active_branch.name)
+    return remote_dir
+
+
+def run_case(case) -> dict:
+    """Run the three phases of sync_to_git for one case, a full sync first, then an incremental one."""
+    case_name = f"ns{case['namespaces']}-cfg{case['configs_per_namespace']}-val{case['value_size']}"
+    with tempfile.TemporaryDirectory() as tmp_dir, FakeNacosServer(seed=0) as fake:
+        remote_dir = init_remote(tmp_dir)
+        config_count = fake.generate_dataset(case["namespaces"], case["configs_per_namespace"], case["value_size"])
+        recorder = BenchmarkRecorder(case_name, {**case, "total_configs": config_count}, lambda: fake.request_counts)
+
+        repo_dir = os.path.join(tmp_dir, settings.NACOS_SNAPSHOT_REPO_NAME)
+        with recorder.phase("init"):
+            nacos_syncer = NacosSyncer(NacosServer(fake.host, fake.port), nacos_snapshot_repo_url=remote_dir,
+                                       nacos_snapshot_repo_dir=repo_dir,
+                                       commit_history_file=os.path.join(tmp_dir, "commit.log"))
+        nacos_syncer.sync_task_reason = "benchmark"
+
+        for sync in ["full", "incremental"]:
+            if sync == "incremental":
+                modified = fake.mutate_dataset(settings.BENCHMARK_SYNCER_MODIFY_RATIO, case["value_size"])
+                recorder.params["modified_configs"] = modified
+
+            with recorder.phase(f"{sync}.make_snapshot"):
+                changes = nacos_syncer.make_snapshot(repo_dir, clean_base=True)
+            recorder.set_throughput(f"{sync}.make_snapshot", config_count)
+
+            # summaries are encoded by ant
+            if shutil.which("ant"):
+                changed_files = changes["added"] + changes["modified"] + changes["removed"]
+                with recorder.phase(f"{sync}.collect_and_publish_summary"):
+                    nacos_syncer.collect_and_publish_summary(collect_for_debug=True, changed_files=changed_files)
+            else:
+                recorder.skip(f"{sync}.collect_and_publish_summary", "ant not found")
+
+            with recorder.phase(f"{sync}.commit_and_push_to_remote"):
+                nacos_syncer.commit_and_push_to_remote(f"benchmark: {sync} sync")
+        return recorder.to_dict()
+
+
+if __name__ == "__main__":
+    # usage: benchmark_syncer.py [result_json] [baseline_json]
+    date_str = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    result_json = sys.argv[1] if len(sys.argv) > 1 else \
+        os.path.join(settings.BENCHMARK_RESULT_DIR, f"syncer-{date_str}.json")
+    baseline_json = sys.argv[2] if len(sys.argv) > 2 else None
+
+    results = []
+    for benchmark_case in settings.BENCHMARK_SYNCER_CASES:
+        logger.info(f"Benchmark case starts: {benchmark_case}")
+        results.append(run_isolated(run_case, benchmark_case))
+    save_results("syncer", results, result_json)
+
+    if baseline_json:
+        regressions = compare_results(baseline_json, result_json)
+        if regressions:
+            print(json.dumps(regressions, indent=2))
+            sys.exit(1)
@@ -0,0 +1,17 @@
+from os import path
+import sys
+project_root = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.append(f"{project_root}/nacos-jmeter")
+
+from snapshotrepo import update_snapshot_repo
+import settings
+
+
+if __name__ == "__main__":
+    # usage: clone_snapshot.py snapshot_dir [mode] [depth] [repo_url]
+    # clone Nacos snapshot repo on a build agent, or update the existing clone to the latest commit
+    snapshot_dir = sys.argv[1]
+    mode = sys.argv[2] if len(sys.argv) > 2 else settings.SNAPSHOT_AGENT_CLONE_MODE
+    depth = int(sys.argv[3]) if len(sys.argv) > 3 else settings.SNAPSHOT_AGENT_CLONE_DEPTH
+    repo_url = sys.argv[4] if len(sys.argv) > 4 else settings.NACOS_SNAPSHOT_REPO_URL
+    print(update_snapshot_repo(snapshot_dir, repo_url, mode, depth))
@@ -0,0 +1,21 @@
+from os import path
+import json
+import sys
+project_root = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.append(f"{project_root}/nacos-jmeter")
+
+from builder import Builder
+from history import PerformanceHistory
+
+jenkins_job_name = sys.argv[1]
+nacos_snapshot_base = sys.argv[2]
+
+build = Builder(jenkins_job_name, nacos_snapshot_base)
+history = PerformanceHistory()
+regressions = history.compare(jenkins_job_name, build.stage)
+history.close()
+
+# non-zero exit code marks the Jenkins build so regressions can be noticed
+if regressions:
+    print(json.dumps(regressions, indent=2, ensure_ascii=False))
+    sys.exit(1)
@@ -7,6 +7,7 @@ from loguru import logger
 
 from builder import Builder
 from testplan import TestPlan
+import settings
 
 jenkins_job_name = sys.argv[1]
 jenkins_job_workspace = sys.argv[2]
@@ -27,10 +28,33 @@ for test_plan in build.relative_path_test_plans:
 
     test_plan_instance.change_controller_type()
 
+    if build.load_profile:
+        test_plan_instance.apply_load_profile(build.load_profile)
+
+    if build.stage in settings.OPTIMIZE_FOR_CI_STAGES and (not build.debug or settings.OPTIMIZE_FOR_CI_IN_DEBUG):
+        logger.info("disable GUI-only listeners and debug elements for headless run now.")
+        test_plan_instance.optimize_for_ci(trim_save_config=not build.keep_save_config)
+
     if is_smoke_test == "true":
-        logger.info("smoke test flag was set, add JSR223Listener to HTTP Request now.")
-        test_plan_instance.add_jsr223listener_to_each_http_request(jenkins_job_name)
+        if settings.MONITOR_MODE == "backend":
+            logger.info("smoke test flag was set, add BackendListener to test plan now.")
+            test_plan_instance.add_backend_listener(jenkins_job_name,
+                                                    settings.BACKEND_LISTENER_URL,
+                                                    settings.BACKEND_LISTENER_PERCENTILES,
+                                                    settings.BACKEND_LISTENER_QUEUE_SIZE)
+        else:
+            logger.info("smoke test flag was set, add JSR223Listener to HTTP Request now.")
+            test_plan_instance.add_jsr223listener_to_each_http_request(jenkins_job_name)
 
     test_plan_instance.save(test_plan_abs_path)
 
+    if build.split_thread_groups:
+        split_test_plans = test_plan_instance.split_by_thread_groups(build.split_thread_groups)
+        if len(split_test_plans) > 1:
+            build.set_split_test_plans(
+                test_plan, [path.relpath(p, test_plan_base_dir) for p in split_test_plans])
+
+if is_smoke_test == "true" and settings.MONITOR_MODE == "backend":
+    build.jmeter_properties["backend_influxdb.send_interval"] = settings.BACKEND_LISTENER_SEND_INTERVAL
+
 build.generate_new_build_xml(jenkins_job_workspace, jmeter_home, test_name, test_plan_base_dir, new_build_xml)
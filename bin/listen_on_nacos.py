@@ -8,13 +8,15 @@ from loguru import logger
 
 import nacosserver
 import settings
-import syncer
+import nacossyncer
+import tracing
 
 
 if __name__ == "__main__":
     log_dir = settings.LOG_DIR
     Path(log_dir).mkdir(parents=True, exist_ok=True)
-    logger.add(f"{log_dir}/nacos_syncer.log", rotation="5 MB", compression="zip", encoding="utf-8")
+    logger.add(f"{log_dir}/nacos_syncer.log", rotation="5 MB", compression="zip", encoding="utf-8",
+               format=tracing.LOG_FORMAT)
     nacos_server = nacosserver.NacosServer(settings.NACOS_SERVER_HOST_TESTONLINE, settings.NACOS_SERVER_PORT)
-    ns = syncer.NacosSyncer(nacos_server)
+    ns = nacossyncer.NacosSyncer(nacos_server)
     ns.run()
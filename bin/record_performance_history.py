@@ -0,0 +1,17 @@
+from os import path
+import sys
+project_root = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.append(f"{project_root}/nacos-jmeter")
+
+from builder import Builder
+from history import PerformanceHistory
+
+jenkins_job_name = sys.argv[1]
+jenkins_job_workspace = sys.argv[2]
+nacos_snapshot_base = sys.argv[3]
+build_id = sys.argv[4] if len(sys.argv) > 4 else None
+
+build = Builder(jenkins_job_name, nacos_snapshot_base)
+history = PerformanceHistory()
+history.record_workspace(jenkins_job_name, build.stage, jenkins_job_workspace, build_id)
+history.close()
@@ -1 +1,12 @@
-ps -ef | grep '/srv/nacos-jmeter/bin/listen_on_nacos.py' | grep -v grep | awk '{print $2}' | xargs -r kill -9
\ No newline at end of file
+# send SIGTERM to the main process only (the oldest one, Pool workers share its command line), it quits after
+# in-flight syncs finish; kill everything left if it is still running after DAEMON_SHUTDOWN_TIMEOUT (with margin)
+SCRIPT='/srv/nacos-jmeter/bin/listen_on_nacos.py'
+PID=$(pgrep -o -f "${SCRIPT}")
+if [ -n "${PID}" ]; then
+    kill -TERM "${PID}"
+    for _ in $(seq 330); do
+        kill -0 "${PID}" 2>/dev/null || break
+        sleep 1
+    done
+fi
+ps -ef | grep "${SCRIPT}" | grep -v grep | awk '{print $2}' | xargs -r kill -9
@@ -0,0 +1,73 @@
+from os import path
+import datetime
+import sys
+project_root = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.append(f"{project_root}/nacos-jmeter")
+
+from tracing import critical_path, load_spans
+import settings
+
+
+def format_time(seconds):
+    return datetime.datetime.fromtimestamp(seconds).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+def print_traces(spans):
+    """Print root spans, latest last."""
+    for span in sorted((s for s in spans if not s["parent_span_id"]), key=lambda s: s["start"]):
+        print(f"{span['trace_id']}  {format_time(span['start'])}  {span['end'] - span['start']:9.3f}s  "
+              f"{span['name']}  {span['attributes'].get('reason', '')!r:.80}")
+
+
+def children_on_path(path_spans, index):
+    """Return spans on path directly under the one at index."""
+    depth = path_spans[index][0]
+    children = []
+    for child_depth, span in path_spans[index + 1:]:
+        if child_depth <= depth:
+            break
+        if child_depth == depth + 1:
+            children.append(span)
+    return children
+
+
+def print_critical_path(spans, trace_id):
+    """Print spans on the critical path of a trace, with time spent in each of them excluding children on path."""
+    trace_spans = [s for s in spans if s["trace_id"] == trace_id]
+    roots = [s for s in trace_spans if not s["parent_span_id"]]
+    if not roots:
+        print(f"Trace {trace_id} not found (or its root span is not ended yet).")
+        sys.exit(1)
+    root = roots[0]
+    path_spans = critical_path(trace_spans, root["span_id"])
+    total = root["end"] - root["start"]
+    print(f"trace {trace_id}, {root['name']} started at {format_time(root['start'])}, took {total:.3f}s, "
+          f"{len(trace_spans)} spans in {len({s['pid'] for s in trace_spans})} processes")
+    print(f"{'span':<60} {'start':>9} {'duration':>9} {'self':>9} {'%':>6}  attributes")
+    for i, (depth, span) in enumerate(path_spans):
+        duration = span["end"] - span["start"]
+        self_time = duration - sum(s["end"] - s["start"] for s in children_on_path(path_spans, i))
+        attributes = {k: v for k, v in span["attributes"].items() if k not in ["thread.name", "reason"]}
+        status = " ERROR" if span["status"].get("code") == 2 else ""
+        print(f"{'  ' * depth + span['name']:<60} {span['start'] - root['start']:9.3f} {duration:9.3f} "
+              f"{self_time:9.3f} {self_time / total * 100 if total else 0:5.1f}%  "
+              f"pid {span['pid']}{status} {attributes}")
+
+
+if __name__ == "__main__":
+    # usage: trace_critical_path.py [trace_id | --list] [trace_file]
+    #   prints critical path of the trace (the latest one if not specified), or lists traces with --list
+    trace_file = sys.argv[2] if len(sys.argv) > 2 else settings.TRACE_FILE
+    all_spans = load_spans(trace_file)
+    if not all_spans:
+        print(f"No span found in {trace_file}")
+        sys.exit(1)
+    if len(sys.argv) > 1 and sys.argv[1] == "--list":
+        print_traces(all_spans)
+    else:
+        if len(sys.argv) > 1:
+            target_trace_id = sys.argv[1]
+        else:
+            latest_root = max((s for s in all_spans if not s["parent_span_id"]), key=lambda s: s["start"])
+            target_trace_id = latest_root["trace_id"]
+        print_critical_path(all_spans, target_trace_id)
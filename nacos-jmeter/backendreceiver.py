@@ -0,0 +1,126 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import threading
+
+from loguru import logger
+
+
+def parse_line_protocol(line) -> dict:
+    """
+    Parse one line of InfluxDB line protocol.
+
+    For example, line 'jmeter,application=foo,transaction=all count=3i,avg=12.5 1600000000000000000' returns as:
+        {
+            "measurement": "jmeter",
+            "tags": {"application": "foo", "transaction": "all"},
+            "fields": {"count": 3, "avg": 12.5},
+            "timestamp": 1600000000000000000
+        }
+    """
+    # split into series, fields and timestamp on spaces which are neither escaped nor quoted
+    sections = []
+    current = ""
+    escaped = False
+    quoted = False
+    for char in line:
+        if escaped:
+            current += char
+            escaped = False
+        elif char == "\\":
+            current += char
+            escaped = True
+        elif char == '"':
+            current += char
+            quoted = not quoted
+        elif char == " " and not quoted:
+            sections.append(current)
+            current = ""
+        else:
+            current += char
+    sections.append(current)
+
+    series = sections[0].replace("\\ ", " ").split(",")
+    tags = dict(tag.split("=", 1) for tag in series[1:])
+    fields = {}
+    for field in sections[1].split(","):
+        key, value = field.split("=", 1)
+        if value.startswith('"'):
+            fields[key] = value.strip('"')
+        elif value.endswith("i"):
+            fields[key] = int(value[:-1])
+        elif value in ("t", "T", "true", "True"):
+            fields[key] = True
+        elif value in ("f", "F", "false", "False"):
+            fields[key] = False
+        else:
+            fields[key] = float(value)
+    timestamp = int(sections[2]) if len(sections) > 2 and sections[2] else None
+    return {"measurement": series[0], "tags": tags, "fields": fields, "timestamp": timestamp}
+
+
+class BackendReceiver(object):
+    """
+    Class representing a local stand-in of the metrics server BackendListener sends to.
+
+    Used in tests only, every point received is kept in memory.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        """
+        Init a receiver, call start() to listen.
+
+        :param host: host to bind
+        :param port: port to bind, a free port is chosen if set to 0
+        """
+        self.points = []
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self):
+        """Url to be set as influxdbUrl of BackendListener."""
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/write?db=jmeter"
+
+    def _handler_class(self):
+        """Return a request handler class bound to this receiver."""
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if urlparse(self.path).path != "/write":
+                    self.send_error(404)
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length).decode("utf-8")
+                points = [parse_line_protocol(line) for line in body.splitlines() if line.strip()]
+                with receiver._lock:
+                    receiver.request_count += 1
+                    receiver.points.extend(points)
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                logger.debug(f"backend receiver: {format % args}")
+
+        return Handler
+
+    def start(self):
+        """Start serving in a daemon thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Backend receiver is listening on {self.url}")
+        return self
+
+    def stop(self):
+        """Stop serving and release the port."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -0,0 +1,307 @@
+from contextlib import contextmanager
+from multiprocessing import Process, Queue
+from pathlib import Path
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import time
+import tracemalloc
+
+from loguru import logger
+
+import settings
+
+
+def peak_rss_mb(children=False) -> float:
+    """
+    Return peak resident set size in MB of current process, or of the largest child process waited for.
+
+    :param children: return peak of child processes (for example, Pool workers) if set True
+    """
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in bytes on macOS, in kilobytes on Linux
+    divisor = 1024 * 1024 if platform.system() == "Darwin" else 1024
+    return round(usage.ru_maxrss / divisor, 1)
+
+
+def _run_and_put(queue, func, args):
+    """Target of run_isolated(), put result or error of func into queue."""
+    try:
+        queue.put(("ok", func(*args)))
+    except Exception as e:
+        logger.exception(f"Benchmark case failed: {e!r}")
+        queue.put(("error", repr(e)))
+
+
+def run_isolated(func, *args):
+    """
+    Run func in a fresh process and return its result, so peak RSS of every case is measured separately.
+
+    The process is not daemonic, so func can create a Pool. Result must be picklable.
+    """
+    queue = Queue()
+    process = Process(target=_run_and_put, args=(queue, func, args))
+    process.start()
+    status, result = queue.get()
+    process.join()
+    if status != "ok":
+        raise RuntimeError(f"Benchmark case failed in process {process.pid}: {result}")
+    return result
+
+
+class BenchmarkRecorder(object):
+    """
+    Class representing measurements of one benchmark case.
+
+    Every phase records wall time, peak RSS (of the process and of its children) and, if a request counter is given,
+    requests made during the phase. If trace_memory is set, peak of Python allocations during each phase is recorded
+    by tracemalloc too, which slows down the phase, so timing and memory are better measured in separate runs.
+    """
+
+    def __init__(self, case_name, params=None, request_counter=None, trace_memory=False):
+        """
+        Init a recorder.
+
+        :param case_name: unique name of the case, used to match cases when comparing with baseline
+        :param params: parameters of the case, saved as they are
+        :param request_counter: function returning a dict of request counts so far, e.g. FakeNacosServer.request_counts
+        :param trace_memory: record peak of Python allocations of each phase if set True
+        """
+        self.case_name = case_name
+        self.params = params or {}
+        self.request_counter = request_counter
+        self.trace_memory = trace_memory
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Measure the block as one phase.
+
+        If the block raises, the phase is recorded as failed (without wall time, so it is never compared with
+        baseline) and the exception is raised again.
+        """
+        requests_before = dict(self.request_counter()) if self.request_counter else {}
+        if self.trace_memory:
+            tracemalloc.start()
+        try:
+            start = time.perf_counter()
+            yield
+            wall_time = time.perf_counter() - start
+            python_peak = tracemalloc.get_traced_memory()[1] if self.trace_memory else None
+        except Exception as e:
+            self.phases[name] = {"failed": repr(e)}
+            logger.error(f"[{self.case_name}] phase {name} failed: {e!r}")
+            raise
+        finally:
+            if self.trace_memory:
+                tracemalloc.stop()
+        result = {
+            "wall_time": round(wall_time, 4),
+            "peak_rss_mb": peak_rss_mb(),
+            "children_peak_rss_mb": peak_rss_mb(children=True)
+        }
+        if self.trace_memory:
+            result["python_peak_mb"] = round(python_peak / 1024 / 1024, 2)
+        if self.request_counter:
+            requests_after = dict(self.request_counter())
+            result["requests"] = {k: v - requests_before.get(k, 0) for k, v in requests_after.items()
+                                  if v - requests_before.get(k, 0)}
+        self.phases[name] = result
+        logger.info(f"[{self.case_name}] phase {name}: {result}")
+
+    def skip(self, name, reason):
+        """Record a phase as skipped."""
+        self.phases[name] = {"skipped": reason}
+        logger.warning(f"[{self.case_name}] phase {name} skipped: {reason}")
+
+    def set_throughput(self, name, items):
+        """Add items per second of a measured phase."""
+        wall_time = self.phases[name]["wall_time"]
+        self.phases[name]["items"] = items
+        self.phases[name]["throughput"] = round(items / wall_time, 1) if wall_time else None
+
+    def to_dict(self) -> dict:
+        return {"case": self.case_name, "params": self.params, "phases": self.phases}
+
+
+def check_throughput(results, targets, min_scaling_ratio=settings.BENCHMARK_MIN_SCALING_RATIO,
+                     min_wall_time=settings.BENCHMARK_MIN_WALL_TIME) -> list:
+    """
+    Check throughput of phases against targets, and catch super-linear phases.
+
+    A phase fails if its throughput (items per second) is lower than its target, or if throughput of the largest case
+    drops below min_scaling_ratio times of the smallest case, i.e. time grows much faster than input.
+    Phases faster than min_wall_time are too noisy to compare scaling, they are checked against targets only.
+
+    :param results: list of BenchmarkRecorder.to_dict()
+    :param targets: dict of phase name -> min items per second
+    :param min_scaling_ratio: min ratio of throughput of the largest case to the smallest one
+    :param min_wall_time: min seconds of a phase to be used in scaling check
+    :return: list of failures as {"case": ..., "phase": ..., "reason": ...}
+    """
+    failures = []
+    throughputs = {}  # phase -> [(items, throughput, case)]
+    for result in results:
+        for phase, measurement in result["phases"].items():
+            throughput = measurement.get("throughput")
+            if throughput is None:
+                continue
+            if measurement["wall_time"] >= min_wall_time:
+                throughputs.setdefault(phase, []).append((measurement["items"], throughput, result["case"]))
+            if phase in targets and throughput < targets[phase]:
+                failures.append({"case": result["case"], "phase": phase,
+                                 "reason": f"throughput {throughput}/s is lower than target {targets[phase]}/s"})
+
+    for phase, measurements in throughputs.items():
+        measurements.sort()
+        smallest, largest = measurements[0], measurements[-1]
+        if largest[0] > smallest[0] and largest[1] < smallest[1] * min_scaling_ratio:
+            failures.append({"case": largest[2], "phase": phase,
+                             "reason": f"throughput drops from {smallest[1]}/s ({smallest[0]} items) to "
+                                       f"{largest[1]}/s ({largest[0]} items), super-linear growth"})
+    for failure in failures:
+        logger.warning(f"Benchmark throughput check failed: {failure}")
+    return failures
+
+
+def generate_snapshot(snapshot_base, config_count, value_size=128, test_plans=None, job_name="benchmark") -> list:
+    """
+    Generate a synthetic Nacos snapshot directory.
+
+    Configs are spread across cross-env and stage namespaces, and preset groups and DEBUG group in turn.
+    If test plans are given, nacos.jmeter.test-plan is written with job_name mapped to them.
+
+    :param snapshot_base: directory to write files to, created if not exist
+    :param config_count: count of config files
+    :param value_size: bytes of each config file
+    :param test_plans: test plans relative to test plan base directory
+    :param job_name: Jenkins job name without modifiers
+    :return: list of config file names
+    """
+    Path(snapshot_base).mkdir(parents=True, exist_ok=True)
+    namespace_ids = [settings.CROSS_ENV_NAMESPACE_ID, *settings.STAGE_TO_NAMESPACE_IDS.values()]
+    groups = [*settings.STAGE_PRESET_GROUPS, settings.DEBUG_GROUP]
+    file_names = []
+    for i in range(config_count):
+        data_id = f"config-{i:06d}"
+        file_name = "+".join([data_id, groups[i % len(groups)], namespace_ids[i // len(groups) % len(namespace_ids)]])
+        line = f"{data_id}.key=" + "v" * max(1, value_size - len(data_id) - 6) + "\n"
+        with open(os.path.join(snapshot_base, file_name), "w", encoding="utf-8") as f:
+            f.write(line)
+        file_names.append(file_name)
+
+    if test_plans:
+        relationship_file_name = "+".join([settings.JENKINS_JMX_RELATIONSHIP_DATA_ID,
+                                           settings.JENKINS_JMX_RELATIONSHIP_GROUP,
+                                           settings.JENKINS_JMX_RELATIONSHIP_NAMESPACE_ID])
+        with open(os.path.join(snapshot_base, relationship_file_name), "w", encoding="utf-8") as f:
+            json.dump({job_name: test_plans}, f)  # JSON is valid YAML
+    return file_names
+
+
+def generate_jmx(out_file, samplers=100, thread_groups=1, controller_depth=1):
+    """
+    Generate a synthetic JMeter test plan.
+
+    Every thread group holds a chain of controller_depth nested simple controllers, samplers are spread evenly among
+    thread groups and placed in the innermost controller. Samplers reference properties by __P(), so trimming of
+    property files has something to do.
+
+    :param out_file: jmx file
+    :param samplers: count of HTTP samplers
+    :param thread_groups: count of thread groups
+    :param controller_depth: depth of nested simple controllers in each thread group
+    """
+    def element(tag, testclass, testname, guiclass):
+        return f'<{tag} guiclass="{guiclass}" testclass="{testclass}" testname="{testname}" enabled="true">'
+
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<jmeterTestPlan version="1.2" properties="5.0" jmeter="5.4.1">', "<hashTree>",
+             element("TestPlan", "TestPlan", "Test Plan", "TestPlanGui") + "</TestPlan>", "<hashTree>"]
+    for group_index in range(thread_groups):
+        lines += [element("ThreadGroup", "ThreadGroup", f"Thread Group {group_index}", "ThreadGroupGui"),
+                  '<stringProp name="ThreadGroup.num_threads">${__P(threads,1)}</stringProp>',
+                  '<stringProp name="ThreadGroup.ramp_time">1</stringProp>',
+                  "</ThreadGroup>", "<hashTree>"]
+        for depth in range(controller_depth):
+            lines += [element("GenericController", "GenericController", f"Controller {group_index}-{depth}",
+                              "LogicControllerGui") + "</GenericController>", "<hashTree>"]
+        group_samplers = samplers // thread_groups + (1 if group_index < samplers % thread_groups else 0)
+        for sampler_index in range(group_samplers):
+            domain = "${__P(config-%06d.key,localhost)}" % sampler_index
+            lines += [element("HTTPSamplerProxy", "HTTPSamplerProxy", f"Request {group_index}-{sampler_index}",
+                              "HttpTestSampleGui"),
+                      f'<stringProp name="HTTPSampler.domain">{domain}</stringProp>',
+                      '<stringProp name="HTTPSampler.path">/api/v1/foo</stringProp>',
+                      "</HTTPSamplerProxy>", "<hashTree/>"]
+        lines += ["</hashTree>"] * controller_depth
+        lines += ["</hashTree>"]
+    lines += ["</hashTree>", "</hashTree>", "</jmeterTestPlan>"]
+    Path(os.path.dirname(os.path.abspath(out_file))).mkdir(parents=True, exist_ok=True)
+    with open(out_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+
+
+def _git_revision():
+    """Return HEAD commit of this project, None if unknown."""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=settings.PROJECT_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(suite, results, out_file):
+    """
+    Save results of a benchmark suite as JSON.
+
+    :param suite: name of the suite
+    :param results: list of BenchmarkRecorder.to_dict()
+    :param out_file: JSON file
+    """
+    Path(os.path.dirname(os.path.abspath(out_file))).mkdir(parents=True, exist_ok=True)
+    data = {
+        "suite": suite,
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results
+    }
+    with open(out_file, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    logger.success(f"Benchmark results of {suite} saved to {out_file}")
+
+
+def compare_results(baseline_file, current_file, tolerance=settings.BENCHMARK_REGRESSION_TOLERANCE) -> list:
+    """
+    Compare wall time of every phase with a baseline result file.
+
+    :param baseline_file: JSON saved by save_results() of an older version
+    :param current_file: JSON saved by save_results() of current version
+    :param tolerance: phases slower than (1 + tolerance) times of baseline are regressions
+    :return: list of regressions as {"case": ..., "phase": ..., "baseline": ..., "current": ..., "ratio": ...}
+    """
+    with open(baseline_file, encoding="utf-8") as f:
+        baseline = {r["case"]: r["phases"] for r in json.load(f)["results"]}
+    with open(current_file, encoding="utf-8") as f:
+        current = {r["case"]: r["phases"] for r in json.load(f)["results"]}
+
+    regressions = []
+    for case, phases in current.items():
+        for phase, result in phases.items():
+            baseline_result = baseline.get(case, {}).get(phase, {})
+            if "wall_time" not in result or not baseline_result.get("wall_time"):
+                continue
+            ratio = result["wall_time"] / baseline_result["wall_time"]
+            if ratio > 1 + tolerance:
+                regressions.append({"case": case, "phase": phase, "baseline": baseline_result["wall_time"],
+                                    "current": result["wall_time"], "ratio": round(ratio, 2)})
+    for regression in regressions:
+        logger.warning(f"Benchmark regression: {regression}")
+    return regressions
@@ -7,7 +7,9 @@ import xml.etree.ElementTree as ET
 from loguru import logger
 import yaml
 
+import common
 import settings
+from testplan import TestPlan
 
 
 class Builder(object):
@@ -28,6 +30,22 @@ class Builder(object):
         :param snapshot_base: Directory where nacos-snapshot.git located.
         """
         self.parallel = False
+        # JMeter properties passed to every <jmeter> element as nested <property>, same as -J on command line
+        self.jmeter_properties = {}
+        # keep save configs of listeners in test plans untouched when optimized for CI
+        self.keep_save_config = False
+        # dict of load parameters applied to thread groups of every test plan, None means untouched
+        self.load_profile = None
+        # count of thread groups in each test plan split from original one, None means no splitting
+        self.split_thread_groups = None
+        # relative path of original test plan -> relative paths of test plans split from it
+        self.split_test_plans = {}
+        # test plan file name -> property keys referenced but neither defined nor given a default value
+        self.unresolved_properties = {}
+        # JMeter servers (host or host:port) running test plans remotely, empty means running locally
+        self.remote_hosts = list(settings.JMETER_REMOTE_HOSTS)
+        # "all": every test plan runs on all remote hosts; "split": test plans are spread across remote hosts
+        self.remote_mode = settings.JMETER_REMOTE_MODE
         self.sample_build_xml = "../resources/build_template.xml"
         self.jenkins_job_name = jenkins_job_name
 
@@ -96,6 +114,58 @@ class Builder(object):
         logger.info(f"self.parallel is set to: {self.parallel}")
         return test_plans
 
+    def set_options(self, data: dict):
+        """
+        Set optional settings of the job based on keys other than 'testplans' and 'parallel'.
+        :param data: a dict, which may contain optional keys "keep-save-config", "load-profile", "split",
+            "remote-hosts", "remote-mode"
+        """
+        if "keep-save-config" in data.keys():
+            assert isinstance(data["keep-save-config"], bool), "Value assigned to 'keep-save-config' must be boolean."
+            self.keep_save_config = data["keep-save-config"]
+            logger.info(f"self.keep_save_config is set to: {self.keep_save_config}")
+        if "load-profile" in data.keys():
+            load_profile = data["load-profile"]
+            if isinstance(load_profile, str):
+                assert load_profile in settings.LOAD_PROFILES, \
+                    f"Load profile '{load_profile}' must be one of {settings.LOAD_PROFILES.keys()}"
+                load_profile = settings.LOAD_PROFILES[load_profile]
+            assert isinstance(load_profile, dict), "Value assigned to 'load-profile' must be a name or a dict."
+            self.load_profile = load_profile
+            logger.info(f"self.load_profile is set to: {self.load_profile}")
+        if "split" in data.keys():
+            split = data["split"]
+            assert isinstance(split, (bool, int)), \
+                "Value assigned to 'split' must be boolean or count of thread groups in each test plan."
+            if split is True:
+                self.split_thread_groups = 1
+            elif split is not False and split > 0:
+                self.split_thread_groups = split
+            logger.info(f"self.split_thread_groups is set to: {self.split_thread_groups}")
+        if "remote-hosts" in data.keys():
+            remote_hosts = data["remote-hosts"]
+            if isinstance(remote_hosts, str):
+                remote_hosts = [h.strip() for h in remote_hosts.split(",") if h.strip()]
+            assert isinstance(remote_hosts, list), "Value assigned to 'remote-hosts' must be a list or a str."
+            self.remote_hosts = remote_hosts
+            logger.info(f"self.remote_hosts is set to: {self.remote_hosts}")
+        if "remote-mode" in data.keys():
+            assert data["remote-mode"] in ["all", "split"], "Value assigned to 'remote-mode' must be 'all' or 'split'."
+            self.remote_mode = data["remote-mode"]
+            logger.info(f"self.remote_mode is set to: {self.remote_mode}")
+
+    def set_split_test_plans(self, relative_path_test_plan, split_test_plans: list):
+        """
+        Replace one test plan by test plans split from it in build.xml, which will run in parallel.
+
+        :param relative_path_test_plan: original test plan, one of self.relative_path_test_plans
+        :param split_test_plans: test plans split from the original one, relative to the same base directory
+        """
+        assert relative_path_test_plan in self.relative_path_test_plans, \
+            f"{relative_path_test_plan} is not one of {self.relative_path_test_plans}"
+        self.split_test_plans[relative_path_test_plan] = split_test_plans
+        logger.info(f"test plan {relative_path_test_plan} is replaced by {split_test_plans}")
+
     def _get_jmeter_relative_path_test_plans(self) -> list:
         """
         Get the JMeter test plans from nacos.jmeter.test-plan.
@@ -126,10 +196,12 @@ class Builder(object):
                     test_plans = object_to_stage
                 elif isinstance(object_to_stage, dict):
                     test_plans = self.set_parallel(object_to_stage)
+                    self.set_options(object_to_stage)
                 else:
                     raise ValueError(f"Object assigned to {self.stage} can only be string, list or dict.")
             else:
                 test_plans = self.set_parallel(object_to_job_name)
+                self.set_options(object_to_job_name)
         else:
             raise ValueError(f"Object assigned to {self.job_name_without_modifier} can only be string, list or dict.")
 
@@ -151,6 +223,136 @@ class Builder(object):
         assert os.path.exists(abs_path_test_plan), f"file or directory {abs_path_test_plan} does not exist"
         return abs_path_test_plan
 
+    @staticmethod
+    def estimate_heap_size(abs_path_test_plan) -> int:
+        """
+        Estimate JVM heap (MB) needed to run the test plan based on count of threads and samplers.
+
+        :param abs_path_test_plan: absolute path of test plan
+        :return: heap size in MB, between settings.JMETER_HEAP_MIN_MB and settings.JMETER_HEAP_MAX_MB
+        """
+        test_plan = TestPlan(abs_path_test_plan)
+        threads = test_plan.count_threads()
+        samplers = test_plan.count_samplers()
+        heap_size = settings.JMETER_HEAP_BASE_MB + threads * settings.JMETER_HEAP_PER_THREAD_MB + \
+            samplers * settings.JMETER_HEAP_PER_SAMPLER_MB
+        # round up to multiple of 64 MB
+        heap_size = -(-int(heap_size) // 64) * 64
+        heap_size = min(max(heap_size, settings.JMETER_HEAP_MIN_MB), settings.JMETER_HEAP_MAX_MB)
+        logger.debug(f"heap size estimated for {abs_path_test_plan} (threads: {threads}, samplers: {samplers}): "
+                     f"{heap_size}MB")
+        return heap_size
+
+    def _heap_sizes(self, test_plan_base_dir) -> dict:
+        """
+        Estimate heap size of each test plan to run, heap of test plans running in parallel are scaled down together
+        so that the total does not exceed settings.AGENT_MEMORY_BUDGET_MB. Heap is never scaled below
+        settings.JMETER_HEAP_MIN_MB, if the total still exceeds the budget, fewer runs start at the same time (see
+        max_concurrent_runs()).
+
+        In distributed mode samplers run on remote hosts, the local JMeter is only the controller, so nothing is
+        estimated.
+
+        :param test_plan_base_dir: directory that stores all test plans
+        :return: dict as {relative path of test plan (or split test plan): heap size in MB}, empty in distributed mode
+        """
+        if self.remote_hosts:
+            return {}
+
+        # test plans in the same group run at the same time
+        if self.parallel:
+            concurrent_groups = [[p for t in self.relative_path_test_plans for p in self.split_test_plans.get(t, [t])]]
+        else:
+            concurrent_groups = [self.split_test_plans.get(t, [t]) for t in self.relative_path_test_plans]
+
+        heap_sizes = {}
+        for group in concurrent_groups:
+            group_heap_sizes = {
+                p: self.estimate_heap_size(self.abs_path_test_plan(test_plan_base_dir, p)) for p in group
+            }
+            total = sum(group_heap_sizes.values())
+            if total > settings.AGENT_MEMORY_BUDGET_MB:
+                ratio = settings.AGENT_MEMORY_BUDGET_MB / total
+                logger.warning(f"total heap {total}MB of test plans running in parallel exceeds agent memory budget "
+                               f"{settings.AGENT_MEMORY_BUDGET_MB}MB, scale down by {ratio:.2f}: {group}")
+                group_heap_sizes = {
+                    p: min(max(int(h * ratio) // 64 * 64, settings.JMETER_HEAP_MIN_MB), settings.AGENT_MEMORY_BUDGET_MB)
+                    for p, h in group_heap_sizes.items()
+                }
+                if sum(group_heap_sizes.values()) > settings.AGENT_MEMORY_BUDGET_MB:
+                    logger.warning(f"total heap of test plans running in parallel still exceeds agent memory budget "
+                                   f"at minimum heap {settings.JMETER_HEAP_MIN_MB}MB, at most "
+                                   f"{self.max_concurrent_runs(list(group_heap_sizes.values()))} of them run at the "
+                                   f"same time: {group}")
+            heap_sizes.update(group_heap_sizes)
+        return heap_sizes
+
+    @staticmethod
+    def max_concurrent_runs(heap_sizes: list) -> int:
+        """
+        Return how many JMeter runs may run at the same time with total heap within settings.AGENT_MEMORY_BUDGET_MB.
+
+        Ant starts tasks of <parallel> in no particular order, so the runs with largest heaps are assumed.
+
+        :param heap_sizes: heap size (MB) of each run
+        :return: count of runs, at least 1
+        """
+        total = 0
+        for count, heap_size in enumerate(sorted(heap_sizes, reverse=True)):
+            total += heap_size
+            if total > settings.AGENT_MEMORY_BUDGET_MB:
+                return max(count, 1)
+        return max(len(heap_sizes), 1)
+
+    def generate_trimmed_property_file(self, abs_path_test_plan, property_file, out_property_file):
+        """
+        Generate a property file containing only properties the test plan references.
+
+        Properties matching settings.PROPERTY_KEYS_ALWAYS_KEPT (mostly read by JMeter itself) are always kept.
+        If properties referenced cannot be fully analyzed, no file is generated.
+        Keys referenced without default value but not defined in property file are recorded in
+        self.unresolved_properties.
+
+        :param abs_path_test_plan: absolute path of test plan
+        :param property_file: full property file, for example, stage summary
+        :param out_property_file: trimmed property file to generate
+        :return: out_property_file if generated, else property_file
+        """
+        if not os.path.exists(property_file):
+            logger.warning(f"property file {property_file} does not exist, cannot be trimmed")
+            return property_file
+
+        references = TestPlan(abs_path_test_plan).referenced_properties()
+        if not references["complete"]:
+            logger.info(f"properties referenced by {abs_path_test_plan} cannot be fully analyzed, "
+                        f"load full property file {property_file}")
+            return property_file
+
+        properties = common.load_property_lines_from_file(property_file)
+        keep_patterns = [re.compile(p) for p in [*references["patterns"], *settings.PROPERTY_KEYS_ALWAYS_KEPT]]
+        kept_keys = [
+            key for key in properties
+            if key in references["keys"] or any(p.fullmatch(key) for p in keep_patterns)
+        ]
+
+        jmx_file_name = os.path.splitext(os.path.basename(abs_path_test_plan))[0]
+        unresolved_keys = [
+            key for key, has_default in references["keys"].items() if not has_default and key not in properties
+        ]
+        if unresolved_keys:
+            logger.warning(f"properties referenced by {jmx_file_name} but not defined: {unresolved_keys}")
+            self.unresolved_properties[jmx_file_name] = unresolved_keys
+
+        Path(os.path.dirname(out_property_file)).mkdir(parents=True, exist_ok=True)
+        with open(out_property_file, "w", encoding="iso-8859-1") as f:
+            f.write(f"# {len(kept_keys)} of {len(properties)} properties in {property_file} "
+                    f"referenced by {abs_path_test_plan}\n")
+            for key in kept_keys:
+                f.write(properties[key])
+        logger.info(f"trimmed property file generated: {out_property_file}, "
+                    f"{len(kept_keys)} of {len(properties)} properties kept")
+        return out_property_file
+
     def generate_new_build_xml(
             self,
             jenkins_job_workspace,
@@ -185,53 +387,119 @@ class Builder(object):
         jmeter_home_element.set("value", jmeter_home)
         test_name_element.set("value", test_name)
 
-        # create element "parallel"
+        heap_sizes = self._heap_sizes(test_plan_base_dir)
+
+        # one JMeter server runs only one test at a time, so in distributed mode runs sharing remote hosts never
+        # start together: 'parallel' and parallel runs of split test plans are ignored
+        run_in_parallel = self.parallel and not self.remote_hosts
+        if self.parallel and self.remote_hosts:
+            logger.warning("'parallel' is ignored in distributed mode, test plans run one by one on remote hosts")
+
+        # create element "parallel", runs started at the same time are bounded by memory budget of the agent
         ant_parallel_element = ET.Element("parallel")
-        if self.parallel:
+        if heap_sizes:
+            ant_parallel_element.set("threadCount", str(self.max_concurrent_runs(list(heap_sizes.values()))))
+        if run_in_parallel:
             target_run_element.append(ant_parallel_element)
 
+        # in remote split mode, test plans are assigned to remote hosts in turn,
+        # test plans of the same host run one by one since one JMeter server can run only one test at a time
+        remote_split = bool(self.remote_hosts) and self.remote_mode == "split"
+        remote_sequential_elements = []
+        if self.remote_hosts:
+            for name, value in settings.JMETER_REMOTE_JMETER_PROPERTIES.items():
+                self.jmeter_properties.setdefault(name, value)
+            if remote_split:
+                remote_parallel_element = ET.SubElement(target_run_element, "parallel")
+                remote_sequential_elements = [
+                    ET.SubElement(remote_parallel_element, "sequential") for _ in self.remote_hosts
+                ]
+
         # list every test plan under target "run", showed as <jmeter> element
         jmx_file_names = []
         for test_plan in self.relative_path_test_plans:
-            jmx_file_name = os.path.splitext(os.path.basename(test_plan))[0]
-            jmx_file_names.append(jmx_file_name)
-            result_jtl = f"{jenkins_job_workspace}/{jmx_file_name}.jtl"
-            result_html = f"{jenkins_job_workspace}/reports/{jmx_file_name}.html"
-            abs_path_test_plan = self.abs_path_test_plan(test_plan_base_dir, test_plan)
-
-            # set attributes for each <jmeter> element
-            jmeter_element = ET.Element("jmeter", attrib={
-                "jmeterhome": jmeter_home,
-                "testplan": abs_path_test_plan,
-                "resultlog": result_jtl
-            })
-
-            # add sub element <jmeterarg> to <jmeter>
-            summary_group = self.summary_group_debug if self.debug else self.summary_group_stable
-            stage_summary_property_file_name = "+".join(
-                [f"{self.stage}", summary_group, self.summary_namespace_id]
-            )
-            stage_summary_property_file = os.path.join(self.nacos_snapshot_base, stage_summary_property_file_name)
-            logger.debug(f"summary property file referred in build.xml: {stage_summary_property_file}")
-            ET.SubElement(jmeter_element, "jmeterarg", attrib={"value": "-q{}".format(stage_summary_property_file)})
-
-            if self.parallel:
-                ant_parallel_element.append(jmeter_element)
-            else:
-                target_run_element.append(jmeter_element)
-
-            # add xslt element for each test plan
-            xslt_element = ET.Element("xslt", {
-                "classpathref": "xslt.classpath",
-                "force": "true",
-                "in": result_jtl,
-                "out": result_html,
-                "style": f"{jmeter_home}/extras/jmeter.results.foldable.xsl"
-            })
-            target_xslt_report_element.append(xslt_element)
+            split_test_plans = self.split_test_plans.get(test_plan, [test_plan])
+            parent_element = ant_parallel_element if run_in_parallel else target_run_element
+            if len(split_test_plans) > 1 and not self.parallel and not self.remote_hosts:
+                # test plans split from the same one run in parallel, at most one per processor of this agent (the
+                # one running ant), and bounded by memory budget
+                thread_count = os.cpu_count() or 1
+                if heap_sizes:
+                    split_heap_sizes = [heap_sizes[p] for p in split_test_plans]
+                    thread_count = min(thread_count, self.max_concurrent_runs(split_heap_sizes))
+                parent_element = ET.SubElement(target_run_element, "parallel",
+                                               attrib={"threadCount": str(thread_count)})
+            for split_test_plan in split_test_plans:
+                jmx_file_name = os.path.splitext(os.path.basename(split_test_plan))[0]
+                jmx_file_names.append(jmx_file_name)
+                result_jtl = f"{jenkins_job_workspace}/{jmx_file_name}.jtl"
+                result_html = f"{jenkins_job_workspace}/reports/{jmx_file_name}.html"
+                abs_path_test_plan = self.abs_path_test_plan(test_plan_base_dir, split_test_plan)
+
+                # set attributes for each <jmeter> element
+                jmeter_element = ET.Element("jmeter", attrib={
+                    "jmeterhome": jmeter_home,
+                    "testplan": abs_path_test_plan,
+                    "resultlog": result_jtl
+                })
+
+                # add sub element <jmeterarg> to <jmeter>
+                summary_group = self.summary_group_debug if self.debug else self.summary_group_stable
+                stage_summary_property_file_name = "+".join(
+                    [f"{self.stage}", summary_group, self.summary_namespace_id]
+                )
+                stage_summary_property_file = os.path.join(self.nacos_snapshot_base, stage_summary_property_file_name)
+                property_file = stage_summary_property_file
+                if settings.TRIM_PROPERTY_FILES:
+                    property_file = self.generate_trimmed_property_file(
+                        abs_path_test_plan,
+                        stage_summary_property_file,
+                        f"{jenkins_job_workspace}/properties/{jmx_file_name}.properties"
+                    )
+                logger.debug(f"property file referred in build.xml: {property_file}")
+                ET.SubElement(jmeter_element, "jmeterarg", attrib={"value": "-q{}".format(property_file)})
+                for name, value in self.jmeter_properties.items():
+                    ET.SubElement(jmeter_element, "property", attrib={"name": name, "value": str(value)})
+
+                # add sub element <jvmarg> to <jmeter>, same initial and max heap to avoid resizing during the test,
+                # the controller of distributed mode keeps default heap
+                heap_args = []
+                if split_test_plan in heap_sizes:
+                    heap_size = heap_sizes[split_test_plan]
+                    heap_args = [f"-Xms{heap_size}m", f"-Xmx{heap_size}m"]
+                for jvm_arg in [*heap_args, *settings.JMETER_GC_JVM_ARGS]:
+                    ET.SubElement(jmeter_element, "jvmarg", attrib={"value": jvm_arg})
+
+                # run remotely, properties are sent to remote hosts by -G, results are sent back and saved to
+                # result log in workspace
+                if self.remote_hosts:
+                    if remote_split:
+                        host_index = (len(jmx_file_names) - 1) % len(self.remote_hosts)
+                        remote_hosts = [self.remote_hosts[host_index]]
+                        parent_element = remote_sequential_elements[host_index]
+                    else:
+                        remote_hosts = self.remote_hosts
+                    ET.SubElement(jmeter_element, "jmeterarg", attrib={"value": f"-R{','.join(remote_hosts)}"})
+                    ET.SubElement(jmeter_element, "jmeterarg", attrib={"value": f"-G{property_file}"})
+
+                parent_element.append(jmeter_element)
+
+                # add xslt element for each test plan
+                xslt_element = ET.Element("xslt", {
+                    "classpathref": "xslt.classpath",
+                    "force": "true",
+                    "in": result_jtl,
+                    "out": result_html,
+                    "style": f"{jmeter_home}/extras/jmeter.results.foldable.xsl"
+                })
+                target_xslt_report_element.append(xslt_element)
 
         # save file names of all test plans to file jmx.json, used to prepend [PASS] or [FAIL] based on jtl
         with open(f"{jenkins_job_workspace}/jmx.json", "w") as f:
             json.dump(jmx_file_names, f)
 
+        # save properties referenced but not defined, so missing configs can be found before checking results
+        with open(f"{jenkins_job_workspace}/unresolved_properties.json", "w") as f:
+            json.dump(self.unresolved_properties, f, indent=2)
+
         tree.write(output_build_xml, encoding="utf-8")
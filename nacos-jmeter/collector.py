@@ -10,6 +10,7 @@ from loguru import logger
 
 import common
 import settings
+from tracing import tracer
 
 
 class Collector(object):
@@ -39,13 +40,15 @@ class Collector(object):
         self.extension_before_encode = settings.SUMMARY_EXTENSION_BEFORE_ENCODE
         self.extension_after_encode = settings.SUMMARY_EXTENSION_AFTER_ENCODE
 
-    def _filter_data_ids(self) -> dict:
+    def _filter_data_ids(self, file_names=None) -> dict:
         """
         Filter config files for preset stages.
 
         Only config files corresponding to cross-env and stage namespaces retained, other namespaces are omitted.
         Group config files by namespace and group, and save the result to a dict.
 
+        :param file_names: files to filter, all files in snapshot base if not set
+
         returns as:
             {
                 "cross-env": {
@@ -66,7 +69,8 @@ class Collector(object):
             for group in target_groups:
                 nacos_snapshot_dict[namespace_id][group] = []
 
-        for file in os.listdir(self.snapshot_base):
+        file_names = os.listdir(self.snapshot_base) if file_names is None else file_names
+        for file in file_names:
             # filter out files whose names start with "++"
             if not file.startswith("++"):
                 parts = file.split("+")
@@ -80,35 +84,37 @@ class Collector(object):
         logger.debug(f"Config files for all stages after filtering: {json.dumps(nacos_snapshot_dict)}")
         return nacos_snapshot_dict
 
-    def collect(self, stage, debug=False) -> list:
+    def collect(self, stage, debug=False, nacos_snapshot_dict=None) -> list:
         """
         Collect and return configurations existed in local snapshot for specified stage.
         Each element of the returned list is a config file name, whose format as DATA_ID+GROUP+NAMESPACE
 
         :param stage: stage flag as ci, testonline, ...
         :param debug: if collecting configs with GROUP set to 'DEBUG'
+        :param nacos_snapshot_dict: configs returned by _filter_data_ids(), self.nacos_snapshot_dict if not set
         :return: list
         """
+        nacos_snapshot_dict = self.nacos_snapshot_dict if nacos_snapshot_dict is None else nacos_snapshot_dict
         valid_stage_flags = self.stage_to_namespace_ids.keys()
         assert stage in valid_stage_flags, f"Stage flag can only be one of {valid_stage_flags}"
         stage_namespace_id = self.stage_to_namespace_ids[stage]
         # cross-env and one specified stage namespace
         target_namespace_ids = [self.cross_env_namespace_id, stage_namespace_id]
-        target_groups = self.stage_preset_groups
+        target_groups = [*self.stage_preset_groups]
         if debug:
             target_groups += [self.debug_group]
 
         product_config_file_list = []
         for namespace_id in target_namespace_ids:
             for group in target_groups:
-                data_ids_to_group = self.nacos_snapshot_dict[namespace_id][group]
+                data_ids_to_group = nacos_snapshot_dict[namespace_id][group]
                 if len(data_ids_to_group) > 0:
                     product_config_file_list += data_ids_to_group
 
         logger.debug(f"Config files collected for stage {stage}: {json.dumps(product_config_file_list)}")
         return product_config_file_list
 
-    def _generate_one_stage_summary(self, stage, dst_dir, debug=False):
+    def _generate_one_stage_summary(self, stage, dst_dir, debug=False, trace_context=None):
         """
         Generate a property file by concatenating all configs for the specific stage.
 
@@ -119,14 +125,91 @@ class Collector(object):
             stage: stage flag as ci, testonline, ...
             dst_dir: dir to store file generated
             debug: if set True, data ids with group "DEBUG" will be collected too
+            trace_context: context of parent span, as this runs in a Pool worker
         """
+        with tracer.span("generate_summary", parent=trace_context, stage=stage, debug=debug) as span:
+            summary_file_name = self.get_summary_file_name(stage, debug) + self.extension_before_encode
+            config_file_list = self.collect(stage, debug)
+            absolute_path_config_file_list = list(map(lambda x: os.path.join(self.snapshot_base, x), config_file_list))
+            summary_file_path = os.path.join(dst_dir, summary_file_name)
+            common.concatenate_files(absolute_path_config_file_list, summary_file_path)
+            span.set_attributes(configs=len(config_file_list))
+
+    def get_summary_file_name(self, stage, debug=False):
+        """Return name of summary file (without extension) as {stage}+{STABLE or DEBUG}+summary."""
         summary_group = self.summary_group_debug if debug else self.summary_group_stable
-        summary_file_name = "+".join([stage, summary_group, self.summary_namespace_id]) + \
-                            self.extension_before_encode
-        config_file_list = self.collect(stage, debug)
-        absolute_path_config_file_list = list(map(lambda x: os.path.join(self.snapshot_base, x), config_file_list))
-        summary_file_path = os.path.join(dst_dir, summary_file_name)
-        common.concatenate_files(absolute_path_config_file_list, summary_file_path)
+        return "+".join([stage, summary_group, self.summary_namespace_id])
+
+    def get_all_summaries(self, collect_for_debug=False) -> list:
+        """
+        Return all summaries as list of (stage, debug).
+
+        :param collect_for_debug: if set to True, DEBUG summaries are included
+        """
+        debug_flags = [False, True] if collect_for_debug else [False]
+        return [(stage, debug) for stage in self.stage_to_namespace_ids.keys() for debug in debug_flags]
+
+    def build_dependency_graph(self, file_names=None) -> dict:
+        """
+        Build graph from config files to summaries they contribute to.
+
+        The same rules as summary generating (_filter_data_ids and collect) are used, so files already removed
+        from snapshot can be passed to find summaries they contributed to.
+
+        returns as:
+            {
+                "foo+SHARED+cross-env": [("ci", False), ("ci", True), ("testonline", False), ...],
+                "bar+DEBUG+env-01": [("ci", True)]
+            }
+
+        :param file_names: config files in graph, all files in snapshot base if not set
+        :return: dict mapping file name to list of (stage, debug)
+        """
+        nacos_snapshot_dict = self._filter_data_ids(file_names)
+        graph = {}
+        for stage, debug in self.get_all_summaries(collect_for_debug=True):
+            for file_name in self.collect(stage, debug, nacos_snapshot_dict):
+                graph.setdefault(file_name, []).append((stage, debug))
+        return graph
+
+    def get_affected_summaries(self, changed_files, collect_for_debug=False) -> list:
+        """
+        Return summaries need to be regenerated after files changed.
+
+        Summaries depending on any changed file are affected, summaries not generated yet (missing in snapshot base)
+        are always included.
+
+        :param changed_files: names of config files added, modified or removed
+        :param collect_for_debug: if set to True, DEBUG summaries are considered too
+        :return: list of (stage, debug)
+        """
+        affected = set()
+        for summaries in self.build_dependency_graph(list(changed_files)).values():
+            affected.update(summaries)
+
+        result = []
+        for stage, debug in self.get_all_summaries(collect_for_debug):
+            summary_file_path = os.path.join(self.snapshot_base, self.get_summary_file_name(stage, debug))
+            if (stage, debug) in affected or not os.path.exists(summary_file_path):
+                result.append((stage, debug))
+        logger.info(f"Summaries affected by {len(changed_files)} changed file(s): {result}")
+        return result
+
+    def generate_summaries(self, dst_dir, summaries):
+        """
+        Generate summary property files for specified summaries.
+
+        Args:
+            dst_dir: dir to store file generated
+            summaries: list of (stage, debug)
+        """
+        if not summaries:
+            return
+        p = Pool(len(summaries))
+        for stage, debug in summaries:
+            p.apply_async(self._generate_one_stage_summary, args=(stage, dst_dir, debug, tracer.current_context()))
+        p.close()
+        p.join()
 
     def generate_all_stages_summary(self, dst_dir, collect_for_debug=False):
         """
@@ -136,16 +219,7 @@ class Collector(object):
             dst_dir: dir to store file generated
             collect_for_debug: if set to True, collect for both STABLE and DEBUG, else for only STABLE
         """
-        threads = len(self.stage_to_namespace_ids.keys())
-        if collect_for_debug:
-            threads = threads + threads
-        p = Pool(threads)
-        for stage in self.stage_to_namespace_ids.keys():
-            p.apply_async(self._generate_one_stage_summary, args=(stage, dst_dir))
-            if collect_for_debug:
-                p.apply_async(self._generate_one_stage_summary, args=(stage, dst_dir, True))
-        p.close()
-        p.join()
+        self.generate_summaries(dst_dir, self.get_all_summaries(collect_for_debug))
 
     def encode_properties(self, src_dir, out_build_xml):
         """
@@ -1,6 +1,7 @@
 from loguru import logger
 import os
 import platform
+import re
 import subprocess
 import textwrap
 
@@ -86,3 +87,32 @@ def load_properties_from_string(property_string, sep='=', comment_char='#'):
             value = sep.join(key_value[1:]).strip().strip('"')
             props[key] = value
     return props
+
+
+def load_property_lines_from_file(filepath):
+    """
+    Read the file passed as parameter as a properties file, and keep the raw lines of each property.
+    As java.util.Properties does, the key ends at the first unescaped '=', ':' or whitespace, lines starting with
+    '#' or '!' are comments, and lines ending with a backslash are continued by the next line.
+
+    The file is read as ISO 8859-1 (as JMeter does), so lines can be written back byte by byte.
+    :return: dict as {key: raw lines of the property, including the line break}
+    """
+    props = {}
+    key = None
+    with open(filepath, "r", encoding="iso-8859-1") as f:
+        for line in f:
+            if key is not None:
+                # continuation of last property
+                props[key] += line
+            else:
+                l = line.strip()
+                if not l or l.startswith(("#", "!")):
+                    continue
+                key = re.match(r"(?:\\.|[^\\=:\s])*", l).group(0)
+                props[key] = line if line.endswith("\n") else line + "\n"
+            stripped = line.rstrip("\r\n")
+            # odd count of trailing backslashes means the line continues
+            if (len(stripped) - len(stripped.rstrip("\\"))) % 2 == 0:
+                key = None
+    return props
@@ -0,0 +1,136 @@
+from contextlib import contextmanager
+import os
+import signal
+import threading
+import time
+
+from loguru import logger
+
+import settings
+
+
+class DaemonRuntime(object):
+    """
+    Class representing runtime shared by long-running syncers.
+
+    It provides:
+        1. an event-based wait, which wakes up immediately when stopping instead of polling
+        2. handling of SIGTERM / SIGINT, which starts a graceful shutdown
+        3. tracking of in-flight tasks, so shutdown waits for them (at most for a bounded time)
+        4. hooks called after tasks drained, for example, to flush state to disk
+    """
+
+    def __init__(self, name, shutdown_timeout=settings.DAEMON_SHUTDOWN_TIMEOUT):
+        """
+        Init a runtime.
+
+        :param name: name of daemon, used for logging
+        :param shutdown_timeout: max seconds to wait for in-flight tasks when shutting down, None means forever
+        """
+        self.name = name
+        self.shutdown_timeout = shutdown_timeout
+        self.pid = os.getpid()
+        self._stop_event = threading.Event()
+        self._tasks_condition = threading.Condition()
+        self._in_flight_tasks = []
+        self._shutdown_hooks = []
+        # lock for short check-and-set sections shared by threads of the daemon, for example, the sync task lock
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        """Events and locks cannot be pickled, only name and timeout are sent to worker processes."""
+        return {"name": self.name, "shutdown_timeout": self.shutdown_timeout}
+
+    def __setstate__(self, state):
+        """Rebuild runtime from state returned by __getstate__."""
+        self.__init__(state["name"], state["shutdown_timeout"])
+
+    @property
+    def stopping(self):
+        """True if shutdown has been requested."""
+        return self._stop_event.is_set()
+
+    def request_stop(self):
+        """Request shutdown, every wait() returns immediately."""
+        if not self._stop_event.is_set():
+            logger.info(f"Shutdown of {self.name} requested.")
+        self._stop_event.set()
+
+    def _handle_signal(self, signum, frame):
+        """
+        Start graceful shutdown in the daemon process.
+
+        Child processes forked by Pool inherit the handler: they ignore SIGINT (Ctrl-C is sent to the whole process
+        group, the daemon drains them), and quit on SIGTERM as before, which is what Pool.terminate() relies on.
+        """
+        if os.getpid() != self.pid:
+            if signum == signal.SIGTERM:
+                signal.signal(signum, signal.SIG_DFL)
+                os.kill(os.getpid(), signum)
+            return
+        logger.info(f"Signal {signal.Signals(signum).name} received.")
+        self.request_stop()
+
+    def install_signal_handlers(self):
+        """Handle SIGTERM and SIGINT with graceful shutdown, must be called in main thread."""
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGINT, self._handle_signal)
+
+    def add_shutdown_hook(self, hook):
+        """Register a function called without arguments after in-flight tasks drained."""
+        self._shutdown_hooks.append(hook)
+
+    @contextmanager
+    def task(self, name):
+        """Track a task as in-flight while the block runs, shutdown waits for it."""
+        with self._tasks_condition:
+            self._in_flight_tasks.append(name)
+        try:
+            yield
+        finally:
+            with self._tasks_condition:
+                self._in_flight_tasks.remove(name)
+                self._tasks_condition.notify_all()
+
+    def wait(self, timeout=None):
+        """
+        Wait until timeout or shutdown requested, whichever comes first.
+
+        :return: True if shutdown requested
+        """
+        return self._stop_event.wait(timeout)
+
+    def shutdown(self, timeout=None):
+        """
+        Wait for in-flight tasks, then call shutdown hooks.
+
+        :param timeout: max seconds to wait for tasks, self.shutdown_timeout used if not set
+        :return: True if all tasks finished in time
+        """
+        self.request_stop()
+        timeout = self.shutdown_timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._tasks_condition:
+            while self._in_flight_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                logger.info(f"Waiting for in-flight tasks of {self.name}: {self._in_flight_tasks}")
+                self._tasks_condition.wait(remaining)
+            drained = not self._in_flight_tasks
+            if not drained:
+                logger.error(f"Tasks of {self.name} still running after {timeout}s, quit anyway: "
+                             f"{self._in_flight_tasks}")
+
+        for hook in self._shutdown_hooks:
+            try:
+                hook()
+            except Exception:
+                logger.exception(f"Shutdown hook {hook} of {self.name} failed.")
+        logger.success(f"{self.name} shut down.")
+        return drained
+
+    def run_forever(self):
+        """Block until shutdown requested (no polling), then shut down gracefully."""
+        self.wait()
+        self.shutdown()
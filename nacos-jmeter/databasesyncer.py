@@ -0,0 +1,356 @@
+from typing import TYPE_CHECKING
+import os
+
+from loguru import logger
+from nacos.exception import NacosRequestException
+import nacos
+import yaml
+
+import common
+import settings
+from nacosserver import NacosServer
+from daemon import DaemonRuntime
+from metrics import registry as metrics
+from profiling import CycleProfiler
+from tracing import tracer
+
+# the database stack is imported when first used, so importing this module (and the daemon starting) stays fast
+if TYPE_CHECKING:
+    from deepdiff import DeepDiff
+    from dingtalkchatbot.chatbot import DingtalkChatbot
+    from pymysqlpool import ConnectionPool
+    import pymysql
+
+
+def connect_to_mysql(**database_info) -> "pymysql.connections.Connection":
+    """Connect to MySQL by PyMySQL, default connect function of DatabaseSyncer."""
+    import pymysql
+    return pymysql.connect(**database_info)
+
+
+class DatabaseSyncer(object):
+    """Class representing syncer from database to Nacos."""
+    def __init__(self, stage, nacos_server: NacosServer, nacos_client_debug=False, connect=connect_to_mysql):
+        """
+        Init an object.
+
+        :param connect: function connecting to database with database info as keyword arguments, replace it to read
+                        tables from a stand-in database (for example, fakedatabase.FakeVesyncDatabase in benchmarks)
+        """
+        self.nacos_server = nacos_server
+        self.connect = connect
+        self.nacos_client_debug = nacos_client_debug
+        self.stage = stage
+        assert self.stage in settings.STAGE_TO_NAMESPACE_IDS, \
+            f"Stage specified must be one of {settings.STAGE_TO_NAMESPACE_IDS.keys()}"
+        self.stage_namespace_id = settings.STAGE_TO_NAMESPACE_IDS[self.stage]
+        self.metrics_port = settings.METRICS_PORT_DATABASE_SYNCER + list(settings.STAGE_TO_NAMESPACE_IDS).index(stage)
+        self.metrics_dump_file = os.path.join(settings.METRICS_DUMP_DIR, f"database_syncer_{self.stage}.json")
+        self.profiler = CycleProfiler(f"database-syncer-{self.stage}")
+        self.runtime = DaemonRuntime(f"DatabaseSyncer ({self.stage})")
+        self.runtime.add_shutdown_hook(lambda: metrics.dump(self.metrics_dump_file))
+
+    def set_nacos_client_debug(self, client: nacos.NacosClient):
+        """Enable NacosClient debugging when possible."""
+        if self.nacos_client_debug:
+            client.set_debugging()
+
+    @staticmethod
+    def execute_select_statement(connection: "pymysql.connections.Connection", sql) -> dict:
+        """
+        Execute select statement and return result as a dict.
+
+        :param connection: instance of Connection
+        :param sql: SQL select statement
+        :return: dict of result
+        """
+        with connection:
+            with connection.cursor() as cursor:
+                cursor.execute(sql)
+                result = cursor.fetchall()
+        logger.debug(f"result: {result}, sql: {sql}")
+
+        return result
+
+    def get_vesync_database_info_from_nacos(self) -> dict:
+        """
+        Get database info from Nacos.
+
+        :return: dict containing database info
+        """
+        import pymysql
+        nacos_client = nacos.NacosClient(self.nacos_server.server_address, namespace=self.stage_namespace_id)
+        self.set_nacos_client_debug(nacos_client)
+        configs = nacos_client.get_config(settings.VESYNC_DATABASE_DATA_ID,
+                                          settings.VESYNC_DATABASE_GROUP,
+                                          no_snapshot=True)
+        logger.debug(f"configs (data id: {settings.VESYNC_DATABASE_DATA_ID}, group: {settings.VESYNC_DATABASE_GROUP}): "
+                     f"{configs}")
+        configs = common.load_properties_from_string(configs)
+        database_info = {
+            "host": configs[settings.KEY_TO_VESYNC_DATABASE_HOST],
+            "port": int(configs[settings.KEY_TO_VESYNC_DATABASE_PORT]),
+            "user": configs[settings.KEY_TO_VESYNC_DATABASE_USER],
+            "password": configs[settings.KEY_TO_VESYNC_DATABASE_PASSWORD],
+            "database": configs[settings.KEY_TO_VESYNC_DATABASE_NAME],
+            "charset": "utf8",
+            "cursorclass": pymysql.cursors.DictCursor
+        }
+        logger.info(f"database info used to connect: {database_info}")
+        return database_info
+
+    @staticmethod
+    def get_vesync_database_connection_pool(database_info: dict) -> "ConnectionPool":
+        """
+        Create database connection and return instance of connection.
+
+        :return: instance of Pool
+        """
+        from pymysqlpool import ConnectionPool
+        connection_pool = ConnectionPool(size=2, name='connection_pool', **database_info)
+        return connection_pool
+
+    def get_data_from_table_device_type(self, database_info: dict) -> dict:
+        """
+        Get info from database table device_type.
+
+        :return: dict containing info from table device_type
+        """
+        sql = """
+            SELECT
+                type,
+                model,
+                model_img,
+                model_name,
+                device_img,
+                config_model,
+                detail_table_name,
+                device_brand,
+                typeV2,
+                category
+            FROM
+                device_type;
+        """
+        with metrics.time("database_phase_seconds", phase="extract", table="device_type"):
+            connection = self.connect(**database_info)
+            result = self.execute_select_statement(connection, sql)
+        metrics.inc("database_rows_total", len(result), table="device_type")
+        device_property_dict = {}
+        for item in result:
+            key = item["config_model"]
+            device_property_dict[key] = item
+        logger.debug(f"data from table device_type: {device_property_dict}")
+        return device_property_dict
+
+    def get_data_from_table_firmware_info(self, database_info: dict) -> dict:
+        """
+        Get info from database table firmware_info.
+
+        :return: dict containing info from table firmware_info
+        """
+        sql = """
+            SELECT
+                f1.config_module,
+                f1.firmware_version,
+                f1.device_region,
+                f1.firmware_url
+            FROM
+                firmware_info AS f1
+            INNER JOIN (
+                SELECT
+                    max(version_code) AS max_version_code,
+                    config_module,
+                    device_region,
+                    plugin_name
+                FROM
+                    firmware_info AS f2
+                GROUP BY
+                    f2.config_module,
+                    f2.device_region,
+                    f2.plugin_name ) AS f3 ON
+                f1.version_code = f3.max_version_code
+                AND f1.config_module = f3.config_module
+                AND f1.device_region = f3.device_region
+                AND f1.plugin_name = f3.plugin_name;
+        """
+        with metrics.time("database_phase_seconds", phase="extract", table="firmware_info"):
+            connection = self.connect(**database_info)
+            result = self.execute_select_statement(connection, sql)
+        metrics.inc("database_rows_total", len(result), table="firmware_info")
+        device_firmware_info_dict = {}
+        for item in result:
+            key = item["config_module"]
+            device_firmware_info_dict[key] = item
+        logger.debug(f"data from table firmware_info: {device_firmware_info_dict}")
+        return device_firmware_info_dict
+
+    def get_device_type_snapshot_from_nacos(self):
+        """
+        Get snapshot of table device_type from Nacos.
+        """
+        nacos_client = nacos.NacosClient(self.nacos_server.server_address, namespace=self.stage_namespace_id)
+        self.set_nacos_client_debug(nacos_client)
+        with metrics.time("database_phase_seconds", phase="nacos_fetch", table="device_type"):
+            snapshot = nacos_client.get_config(settings.TABLE_DEVICE_TYPE_DATA_ID, settings.DATABASE_SNAPSHOT_GROUP,
+                                               no_snapshot=True)
+            logger.debug(f"device_type data from Nacos: {snapshot}")
+            if snapshot:
+                return yaml.safe_load(snapshot)
+            else:
+                return None
+
+    def get_firmware_info_snapshot_from_nacos(self):
+        """
+        Get snapshot of table firmware_info from Nacos.
+        """
+        nacos_client = nacos.NacosClient(self.nacos_server.server_address, namespace=self.stage_namespace_id)
+        self.set_nacos_client_debug(nacos_client)
+        with metrics.time("database_phase_seconds", phase="nacos_fetch", table="firmware_info"):
+            snapshot = nacos_client.get_config(settings.TABLE_FIRMWARE_INFO_DATA_ID, settings.DATABASE_SNAPSHOT_GROUP,
+                                               no_snapshot=True)
+            logger.debug(f"firmware_info data from Nacos: {snapshot}")
+            if snapshot:
+                return yaml.safe_load(snapshot)
+            else:
+                return None
+
+    @staticmethod
+    def diff_nacos_and_database(data_from_nacos, data_from_database) -> "DeepDiff":
+        """
+        Compare table device_type between data from database and data from Nacos.
+        """
+        from deepdiff import DeepDiff
+        ddiff = DeepDiff(data_from_nacos, data_from_database)
+        return ddiff
+
+    @staticmethod
+    def serialize_table(data: dict) -> str:
+        """Serialize data of a table to the content published to Nacos."""
+        return yaml.dump(data)
+
+    def publish_table_snapshot(self, data_id, content: str):
+        """
+        Publish serialized data of a table to Nacos.
+
+        :param data_id: data id of the table snapshot
+        :param content: content returned by serialize_table()
+        """
+        logger.debug(f"Update Nacos "
+                     f"(data id: {data_id}, group: {settings.DATABASE_SNAPSHOT_GROUP})"
+                     f"with data {content}")
+        # snapshots of tables outgrow the query string NacosClient.publish_config() sends content in
+        self.nacos_server.publish_config(data_id, settings.DATABASE_SNAPSHOT_GROUP, content, self.stage_namespace_id)
+
+    def sync_table_to_nacos(self, table, data_id, data: dict):
+        """
+        Serialize data from a table and publish it to Nacos.
+
+        :param table: name of table, used as label of metrics
+        :param data_id: data id of the table snapshot
+        :param data: data from the table
+        """
+        with metrics.time("database_phase_seconds", phase="serialize", table=table):
+            content = self.serialize_table(data)
+        with metrics.time("database_phase_seconds", phase="publish", table=table):
+            self.publish_table_snapshot(data_id, content)
+        metrics.inc("published_bytes_total", len(content.encode("utf-8")), data_id=data_id)
+
+    def sync_device_type_to_nacos(self, data: dict):
+        """
+        Publish data from table device_type to Nacos.
+        """
+        self.sync_table_to_nacos("device_type", settings.TABLE_DEVICE_TYPE_DATA_ID, data)
+
+    def sync_firmware_info_to_nacos(self, data: dict):
+        """
+        Publish data from table firmware_info to Nacos.
+        """
+        self.sync_table_to_nacos("firmware_info", settings.TABLE_FIRMWARE_INFO_DATA_ID, data)
+
+    def sync_once(self, robot: "DingtalkChatbot", database_info: dict):
+        """
+        Compare between database and Nacos once, sync latest data to Nacos if any change was detected.
+
+        :param robot: DingTalk robot to send notifications
+        :param database_info: database connection info
+        """
+        if not self.nacos_server.is_nacos_online():
+            return
+
+        is_need_sync_device_type = False
+        is_need_sync_firmware_info = False
+
+        try:
+            device_type_from_nacos = self.get_device_type_snapshot_from_nacos()
+            device_type_from_database = self.get_data_from_table_device_type(database_info)
+            firmware_info_from_nacos = self.get_firmware_info_snapshot_from_nacos()
+            firmware_info_from_database = self.get_data_from_table_firmware_info(database_info)
+        except NacosRequestException:
+            logger.warning("Something is wrong when trying to get data from nacos, the server may be down.")
+            self.nacos_server.mark_offline()
+            metrics.inc("failures_total", operation="database_nacos_fetch")
+            return
+
+        if device_type_from_nacos:
+            with metrics.time("database_phase_seconds", phase="diff", table="device_type"):
+                ddiff = self.diff_nacos_and_database(device_type_from_nacos, device_type_from_database)
+            if len(ddiff) > 0:
+                robot.send_text(msg=f"DB ({self.stage}) changes on table device_type detected: "
+                                    f"{ddiff.pretty()}", is_at_all=True)
+                logger.info("changes on table device_type detected, sync data from database to Nacos")
+                is_need_sync_device_type = True
+            else:
+                logger.info(f"device_type: no changes detected.")
+        else:
+            logger.info(f"device_type not found on Nacos, sync data from database to Nacos")
+            is_need_sync_device_type = True
+
+        if is_need_sync_device_type:
+            self.sync_device_type_to_nacos(device_type_from_database)
+
+        if firmware_info_from_nacos:
+            with metrics.time("database_phase_seconds", phase="diff", table="firmware_info"):
+                ddiff = self.diff_nacos_and_database(firmware_info_from_nacos, firmware_info_from_database)
+            if len(ddiff) > 0:
+                robot.send_text(msg=f"DB ({self.stage}) changes on table firmware_info detected: "
+                                    f"{ddiff.pretty()}", is_at_all=True)
+                logger.info("changes on table firmware_info detected, sync data from database to Nacos")
+                is_need_sync_firmware_info = True
+            else:
+                logger.info(f"firmware_info: no changes detected.")
+        else:
+            logger.info(f"firmware_info not found on Nacos, sync data from database to Nacos")
+            is_need_sync_firmware_info = True
+
+        if is_need_sync_firmware_info:
+            self.sync_firmware_info_to_nacos(firmware_info_from_database)
+
+    def run(self):
+        """
+        Compare between database and Nacos every DATABASE_SYNCER_INTERVAL seconds, until SIGTERM or SIGINT received.
+        If any change was detected, sync latest data to Nacos, and send notification via DingTalk.
+        """
+        from dingtalkchatbot.chatbot import DingtalkChatbot
+        access_token = "c8a9d345d0f37a99cf72af8d58a3984409161efa4350c437acf02e31443c90db"
+        webhook = f"https://oapi.dingtalk.com/robot/send?access_token={access_token}"
+        robot = DingtalkChatbot(webhook)
+
+        database_info = self.get_vesync_database_info_from_nacos()
+
+        # profiling is requested in public namespace, the same as NacosSyncer
+        nacos_client = nacos.NacosClient(self.nacos_server.server_address)
+        self.set_nacos_client_debug(nacos_client)
+        nacos_client.set_options(no_snapshot=True)
+        nacos_client.add_config_watchers(self.profiler.data_id, self.profiler.group, [self.profiler.on_config_changed])
+
+        metrics.serve(self.metrics_port)
+        self.runtime.install_signal_handlers()
+        self.profiler.install_signal_handler()
+        while not self.runtime.stopping:
+            with self.runtime.task("sync database"), self.profiler.cycle("sync_once"):
+                with tracer.span("database_sync_once", new_trace=True, stage=self.stage), \
+                        metrics.time("database_phase_seconds", phase="sync_once", table="all"):
+                    self.sync_once(robot, database_info)
+                metrics.dump(self.metrics_dump_file)
+            self.runtime.wait(settings.DATABASE_SYNCER_INTERVAL)
+        self.runtime.shutdown()
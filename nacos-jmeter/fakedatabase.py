@@ -0,0 +1,152 @@
+import random
+import sqlite3
+
+from loguru import logger
+
+import settings
+
+
+class _DictCursor(object):
+    """Cursor returning rows as dicts, usable with 'with' like cursors of pymysql."""
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, args=None):
+        return self._cursor.execute(sql, args or ())
+
+    def fetchall(self) -> list:
+        names = [column[0] for column in self._cursor.description]
+        return [dict(zip(names, row)) for row in self._cursor.fetchall()]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._cursor.close()
+
+
+class _Connection(object):
+    """Connection behaving like pymysql's in the ways DatabaseSyncer uses it: closed when leaving 'with'."""
+
+    def __init__(self, database_file):
+        self._connection = sqlite3.connect(database_file)
+
+    def cursor(self) -> _DictCursor:
+        return _DictCursor(self._connection.cursor())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._connection.close()
+
+
+class FakeVesyncDatabase(object):
+    """
+    Class representing a local stand-in of VeSync database, backed by SQLite.
+
+    Only tables read by DatabaseSyncer (device_type and firmware_info) are created. Pass connect as 'connect' of
+    DatabaseSyncer, and publish_database_info() to Nacos, then DatabaseSyncer runs without MySQL.
+    """
+
+    REGIONS = ["US", "EU", "JP"]
+
+    def __init__(self, database_file, seed=None):
+        """
+        Init database, tables are created if not exist.
+
+        :param database_file: SQLite database file
+        :param seed: seed of random, for generating and mutating
+        """
+        self.database_file = database_file
+        self._random = random.Random(seed)
+        self._version_code = 0
+        with sqlite3.connect(self.database_file) as connection:
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS device_type (
+                    type TEXT, model TEXT, model_img TEXT, model_name TEXT, device_img TEXT,
+                    config_model TEXT PRIMARY KEY, detail_table_name TEXT, device_brand TEXT, typeV2 TEXT,
+                    category TEXT
+                );
+                CREATE TABLE IF NOT EXISTS firmware_info (
+                    config_module TEXT, firmware_version TEXT, device_region TEXT, firmware_url TEXT,
+                    plugin_name TEXT, version_code INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS firmware_info_latest
+                    ON firmware_info (config_module, device_region, plugin_name, version_code);
+            """)
+
+    def connect(self, **kwargs) -> _Connection:
+        """Same signature as pymysql.connect, connection arguments are ignored."""
+        return _Connection(self.database_file)
+
+    def publish_database_info(self, fake_nacos, namespace_id):
+        """Publish database connection config read by DatabaseSyncer.get_vesync_database_info_from_nacos()."""
+        content = "\n".join([
+            f"{settings.KEY_TO_VESYNC_DATABASE_HOST}=127.0.0.1",
+            f"{settings.KEY_TO_VESYNC_DATABASE_PORT}=3306",
+            f"{settings.KEY_TO_VESYNC_DATABASE_USER}=fake",
+            f"{settings.KEY_TO_VESYNC_DATABASE_PASSWORD}=fake",
+            f"{settings.KEY_TO_VESYNC_DATABASE_NAME}={self.database_file}"
+        ])
+        fake_nacos.publish_config(settings.VESYNC_DATABASE_DATA_ID, settings.VESYNC_DATABASE_GROUP, content,
+                                  namespace_id)
+
+    def _next_firmware_version(self, config_module, region, plugin_name):
+        """Return a firmware_info row of a newer version."""
+        self._version_code += 1
+        version = f"1.{self._version_code // 100}.{self._version_code % 100}"
+        return (config_module, version, region,
+                f"https://firmware.example.com/{config_module}/{plugin_name}/{version}.bin",
+                plugin_name, self._version_code)
+
+    def _device_type_row(self, index, revision=0):
+        config_model = f"Model{index:06d}"
+        return ("wifi-switch", f"Core{index}", f"https://image.example.com/{config_model}/{revision}.png",
+                f"Device {index} rev {revision}", f"https://image.example.com/{config_model}/device.png",
+                config_model, f"device_{index % 50}", "VeSync", f"type-{index % 20}", "Air")
+
+    def generate(self, device_types, firmware_versions=3, plugins=1):
+        """
+        Replace tables with generated rows.
+
+        :param device_types: rows of device_type
+        :param firmware_versions: versions of every model, region and plugin in firmware_info
+        :param plugins: plugins of every model
+        """
+        with sqlite3.connect(self.database_file) as connection:
+            connection.execute("DELETE FROM device_type")
+            connection.execute("DELETE FROM firmware_info")
+            connection.executemany("INSERT INTO device_type VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                   (self._device_type_row(i) for i in range(device_types)))
+            connection.executemany("INSERT INTO firmware_info VALUES (?, ?, ?, ?, ?, ?)", (
+                self._next_firmware_version(f"Model{i:06d}", region, f"plugin-{p}")
+                for i in range(device_types) for region in self.REGIONS for p in range(plugins)
+                for _ in range(firmware_versions)
+            ))
+        logger.info(f"Fake database generated: {device_types} device types, "
+                    f"{device_types * len(self.REGIONS) * plugins * firmware_versions} firmware versions")
+
+    def mutate(self, ratio) -> dict:
+        """
+        Change randomly chosen rows as production does: update device types and release new firmware versions.
+
+        :param ratio: ratio of device types changed, and of models releasing a new firmware
+        :return: count of rows changed as {"device_type": n, "firmware_info": m}
+        """
+        with sqlite3.connect(self.database_file) as connection:
+            models = [row[0] for row in connection.execute("SELECT config_model FROM device_type ORDER BY 1")]
+            if not models or ratio <= 0:
+                return {"device_type": 0, "firmware_info": 0}
+            chosen = self._random.sample(range(len(models)), max(1, round(len(models) * ratio)))
+            revision = self._random.randint(1, 1000000)
+            for index in chosen:
+                row = self._device_type_row(index, revision)
+                connection.execute("UPDATE device_type SET model_img = ?, model_name = ? WHERE config_model = ?",
+                                   (row[2], row[3], row[5]))
+            connection.executemany("INSERT INTO firmware_info VALUES (?, ?, ?, ?, ?, ?)", [
+                self._next_firmware_version(models[index], self._random.choice(self.REGIONS), "plugin-0")
+                for index in chosen
+            ])
+        return {"device_type": len(chosen), "firmware_info": len(chosen)}
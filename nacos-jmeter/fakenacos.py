@@ -0,0 +1,386 @@
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote_plus, urlparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+
+from loguru import logger
+
+import settings
+
+# separators used by listener long-polling of Nacos
+WORD_SEPARATOR = "\x02"
+LINE_SEPARATOR = "\x01"
+
+
+class FakeNacosServer(object):
+    """
+    Class representing an in-process stand-in of Nacos server.
+
+    Only v1 APIs used by this project are implemented: namespaces listing, readiness, config get / publish / delete,
+    paginated config search and listener long-polling. Everything is kept in memory.
+    Used in tests and benchmarks, so the sync pipeline can run without real Nacos:
+
+        with FakeNacosServer() as fake:
+            fake.generate_dataset(namespace_count=4, configs_per_namespace=100, value_size=1024)
+            nacos_server = NacosServer(fake.host, fake.port)
+            syncer = NacosSyncer(nacos_server)
+    """
+
+    NAMESPACES_PATH = "/nacos/v1/console/namespaces"
+    HEALTH_PATH = "/nacos/v1/console/health/readiness"
+    CONFIGS_PATH = "/nacos/v1/cs/configs"
+    LISTENER_PATH = "/nacos/v1/cs/configs/listener"
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0, failure_rate=0, failure_status=503,
+                 max_long_polling_timeout=30, seed=None):
+        """
+        Init a server, call start() to listen.
+
+        :param host: host to bind
+        :param port: port to bind, a free port is chosen if set to 0
+        :param latency: seconds to sleep before handling every request
+        :param failure_rate: probability that a request (except listener) fails with failure_status
+        :param failure_status: http status of injected failures
+        :param max_long_polling_timeout: max seconds a listener request hangs, whatever the client asks
+        :param seed: seed of random, for failure injection and dataset generating
+        """
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.max_long_polling_timeout = max_long_polling_timeout
+        self.ready = True  # readiness endpoint responds with 503 if set False
+        self.request_counts = Counter()  # key as 'namespaces', 'config-get', 'config-search', ...
+
+        self._random = random.Random(seed)
+        self._namespaces = {"": "public"}  # namespace id -> show name
+        self._configs = {}  # (namespace id, group, data id) -> content
+        self._failures_scheduled = []  # list of [count, status, request kind or None]
+        self._condition = threading.Condition()  # guards data above, notified when any config changes
+        self._stopping = False
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def host(self):
+        return self._server.server_address[0]
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    @property
+    def server_address(self):
+        """Address as 'host:port', can be passed to NacosClient directly."""
+        return f"{self.host}:{self.port}"
+
+    @property
+    def request_count(self):
+        """Count of all requests received."""
+        return sum(self.request_counts.values())
+
+    @staticmethod
+    def get_md5(content):
+        """Return md5 of content as Nacos does, empty string if content is None."""
+        return "" if content is None else hashlib.md5(content.encode("utf-8")).hexdigest()
+
+    def add_namespace(self, namespace_id, namespace_name=None):
+        """Add a namespace, show name is the same as id if not set."""
+        with self._condition:
+            self._namespaces[namespace_id] = namespace_name or namespace_id
+
+    def remove_namespace(self, namespace_id):
+        """Remove a namespace and all its configs."""
+        with self._condition:
+            self._namespaces.pop(namespace_id, None)
+            for key in [key for key in self._configs if key[0] == namespace_id]:
+                del self._configs[key]
+            self._condition.notify_all()
+
+    def publish_config(self, data_id, group, content, namespace_id=""):
+        """Add or update a config in-process, listeners are notified."""
+        with self._condition:
+            if namespace_id not in self._namespaces:
+                self._namespaces[namespace_id] = namespace_id
+            self._configs[(namespace_id, group, data_id)] = content
+            self._condition.notify_all()
+
+    def remove_config(self, data_id, group, namespace_id=""):
+        """Remove a config in-process, listeners are notified."""
+        with self._condition:
+            self._configs.pop((namespace_id, group, data_id), None)
+            self._condition.notify_all()
+
+    def get_config(self, data_id, group, namespace_id=""):
+        """Return content of a config, None if not exist."""
+        with self._condition:
+            return self._configs.get((namespace_id, group, data_id))
+
+    def get_namespaces(self) -> list:
+        """Return namespaces in the same format as Nacos console API, public namespace comes first."""
+        with self._condition:
+            config_counts = Counter(key[0] for key in self._configs)
+            return [{
+                "namespace": namespace_id,
+                "namespaceShowName": namespace_name,
+                "quota": 200,
+                "configCount": config_counts[namespace_id],
+                "type": 0 if namespace_id == "" else 2
+            } for namespace_id, namespace_name in sorted(self._namespaces.items(), key=lambda item: item[0] != "")]
+
+    def generate_dataset(self, namespace_count, configs_per_namespace, value_size=128, groups=None) -> int:
+        """
+        Generate configs in memory: namespace_count namespaces, configs_per_namespace configs in each, every config
+        is a property file of about value_size bytes.
+
+        Cross-env and stage namespaces are used first, so collector picks up the configs, then 'ns-01', 'ns-02', ...
+
+        :param namespace_count: count of namespaces
+        :param configs_per_namespace: count of configs in each namespace
+        :param value_size: bytes of each config
+        :param groups: groups used in turn, STAGE_PRESET_GROUPS and DEBUG_GROUP if not set
+        :return: count of configs generated
+        """
+        preset_namespace_ids = [settings.CROSS_ENV_NAMESPACE_ID, *settings.STAGE_TO_NAMESPACE_IDS.values()]
+        namespace_ids = preset_namespace_ids[:namespace_count]
+        namespace_ids += [f"ns-{i:02d}" for i in range(1, namespace_count - len(namespace_ids) + 1)]
+        groups = groups or [*settings.STAGE_PRESET_GROUPS, settings.DEBUG_GROUP]
+
+        for namespace_id in namespace_ids:
+            self.add_namespace(namespace_id)
+            for i in range(configs_per_namespace):
+                data_id = f"config-{i:05d}.{namespace_id}"
+                self.publish_config(data_id, groups[i % len(groups)], self._random_properties(data_id, value_size),
+                                    namespace_id)
+        logger.info(f"Fake Nacos dataset generated: {len(namespace_ids)} namespaces x {configs_per_namespace} configs "
+                    f"x {value_size} bytes")
+        return len(namespace_ids) * configs_per_namespace
+
+    def mutate_dataset(self, ratio, value_size=128) -> int:
+        """
+        Replace content of randomly chosen configs, listeners are notified.
+
+        :param ratio: ratio of configs to modify, at least one config is modified
+        :param value_size: bytes of new content
+        :return: count of configs modified
+        """
+        with self._condition:
+            keys = sorted(self._configs)
+            chosen = self._random.sample(keys, min(len(keys), max(1, round(len(keys) * ratio))))
+            for key in chosen:
+                self._configs[key] = self._random_properties(key[2], value_size)
+            self._condition.notify_all()
+        return len(chosen)
+
+    def _random_properties(self, prefix, size):
+        """Return property lines of about size bytes."""
+        line_count = max(1, math.ceil(size / 64))
+        value_length = max(1, size // line_count - len(prefix) - 10)
+        alphabet = "abcdefghijklmnopqrstuvwxyz0123456789"
+        return "".join(f"{prefix}.{i:03d}={''.join(self._random.choices(alphabet, k=value_length))}\n"
+                       for i in range(line_count))
+
+    def fail_next(self, count=1, status=None, kind=None):
+        """
+        Let next requests fail.
+
+        :param count: count of requests to fail
+        :param status: http status, self.failure_status if not set
+        :param kind: fail only this kind of requests (as keys of self.request_counts) if set
+        """
+        with self._condition:
+            self._failures_scheduled.append([count, status or self.failure_status, kind])
+
+    def _pop_failure(self, kind):
+        """Return status of an injected failure for the request, or None."""
+        with self._condition:
+            for failure in self._failures_scheduled:
+                if failure[2] is None or failure[2] == kind:
+                    failure[0] -= 1
+                    if failure[0] <= 0:
+                        self._failures_scheduled.remove(failure)
+                    return failure[1]
+            if kind != "listener" and self.failure_rate and self._random.random() < self.failure_rate:
+                return self.failure_status
+        return None
+
+    def _search_configs(self, params) -> dict:
+        """Return one page of configs as search API of Nacos does."""
+        namespace_id = params.get("tenant", "")
+        group = params.get("group", "")
+        data_id = params.get("dataId", "")
+        page_no = max(int(params.get("pageNo", 1)), 1)
+        page_size = max(int(params.get("pageSize", 100)), 1)
+        with self._condition:
+            keys = sorted(key for key in self._configs if key[0] == namespace_id and
+                          (not group or key[1] == group) and (not data_id or key[2] == data_id))
+            page_keys = keys[(page_no - 1) * page_size:page_no * page_size]
+            page_items = [{
+                "id": str(index),
+                "dataId": key[2],
+                "group": key[1],
+                "content": self._configs[key],
+                "md5": self.get_md5(self._configs[key]),
+                "tenant": key[0],
+                "type": "properties"
+            } for index, key in enumerate(page_keys, start=(page_no - 1) * page_size + 1)]
+        return {
+            "totalCount": len(keys),
+            "pageNumber": page_no,
+            "pagesAvailable": math.ceil(len(keys) / page_size),
+            "pageItems": page_items
+        }
+
+    def _changed_keys(self, listening_configs) -> list:
+        """Return (data id, group, namespace id) of listened configs whose md5 differs from server. Hold condition."""
+        changed = []
+        for line in listening_configs.split(LINE_SEPARATOR):
+            if not line.strip():
+                continue
+            parts = line.split(WORD_SEPARATOR)
+            data_id, group, md5 = parts[0], parts[1], parts[2]
+            namespace_id = parts[3] if len(parts) > 3 else ""
+            content = self._configs.get((namespace_id, group, data_id))
+            if self.get_md5(content) != md5:
+                changed.append((data_id, group, namespace_id))
+        return changed
+
+    def _listen(self, listening_configs, timeout) -> str:
+        """Hang until any listened config changes or timeout, return changed keys encoded as Nacos does."""
+        deadline = time.monotonic() + min(timeout, self.max_long_polling_timeout)
+        with self._condition:
+            changed = self._changed_keys(listening_configs)
+            while not changed and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+                changed = self._changed_keys(listening_configs)
+        lines = [WORD_SEPARATOR.join([data_id, group, namespace_id] if namespace_id else [data_id, group])
+                 for data_id, group, namespace_id in changed]
+        return quote_plus("".join(line + LINE_SEPARATOR for line in lines))
+
+    def _handler_class(self):
+        """Return a request handler class bound to this server."""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _params(self):
+                """Merge query string and urlencoded body, as Nacos accepts both."""
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+                length = int(self.headers.get("Content-Length", 0))
+                if length:
+                    body = self.rfile.read(length).decode("utf-8")
+                    params.update({k: v[0] for k, v in parse_qs(body, keep_blank_values=True).items()})
+                return url.path, params
+
+            def _send(self, status, body="", content_type="text/plain;charset=UTF-8", headers=None):
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _handle(self, method):
+                path, params = self._params()
+                if path == fake.NAMESPACES_PATH and method == "GET":
+                    kind = "namespaces"
+                elif path == fake.HEALTH_PATH and method == "GET":
+                    kind = "health"
+                elif path == fake.LISTENER_PATH and method == "POST":
+                    kind = "listener"
+                elif path == fake.CONFIGS_PATH and method == "GET":
+                    kind = "config-search" if params.get("search") else "config-get"
+                elif path == fake.CONFIGS_PATH and method == "POST":
+                    kind = "config-publish"
+                elif path == fake.CONFIGS_PATH and method == "DELETE":
+                    kind = "config-delete"
+                else:
+                    self._send(404, "not found")
+                    return
+
+                with fake._condition:
+                    fake.request_counts[kind] += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+                status = fake._pop_failure(kind)
+                if status:
+                    self._send(status, "injected failure")
+                    return
+
+                namespace_id = params.get("tenant", "")
+                if kind == "namespaces":
+                    body = json.dumps({"code": 200, "message": None, "data": fake.get_namespaces()})
+                    etag = f'"{hashlib.md5(body.encode("utf-8")).hexdigest()}"'
+                    if self.headers.get("If-None-Match") == etag:
+                        self._send(304, headers={"ETag": etag})
+                    else:
+                        self._send(200, body, "application/json", {"ETag": etag})
+                elif kind == "health":
+                    if fake.ready:
+                        self._send(200, "OK")
+                    else:
+                        self._send(503, "not ready")
+                elif kind == "listener":
+                    timeout = int(self.headers.get("Long-Pulling-Timeout", 30000)) / 1000
+                    self._send(200, fake._listen(params.get("Listening-Configs", ""), timeout))
+                elif kind == "config-search":
+                    self._send(200, json.dumps(fake._search_configs(params)), "application/json")
+                elif kind == "config-get":
+                    content = fake.get_config(params.get("dataId"), params.get("group"), namespace_id)
+                    if content is None:
+                        self._send(404, "config data not exist")
+                    else:
+                        self._send(200, content)
+                elif kind == "config-publish":
+                    fake.publish_config(params["dataId"], params["group"], params.get("content", ""), namespace_id)
+                    self._send(200, "true")
+                elif kind == "config-delete":
+                    fake.remove_config(params["dataId"], params["group"], namespace_id)
+                    self._send(200, "true")
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+            def do_DELETE(self):
+                self._handle("DELETE")
+
+            def log_message(self, format, *args):
+                logger.trace(f"fake nacos: {format % args}")
+
+        return Handler
+
+    def start(self):
+        """Start serving in a daemon thread."""
+        self._stopping = False
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Fake Nacos is listening on {self.server_address}")
+        return self
+
+    def stop(self):
+        """Release hanging listener requests, stop serving and release the port."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
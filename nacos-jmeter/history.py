@@ -0,0 +1,290 @@
+from pathlib import Path
+import csv
+import datetime
+import json
+import math
+import os
+import sqlite3
+import statistics
+import xml.etree.ElementTree as ET
+
+from loguru import logger
+
+import settings
+
+
+class PerformanceHistory(object):
+    """
+    Class representing a local store of aggregate JMeter results of every Jenkins build.
+
+    Results are keyed by job name, stage, test plan and sampler label, so latency of one sampler can be compared
+    with the same sampler of previous builds.
+    """
+
+    PERCENTILES = (50, 90, 95, 99)
+
+    def __init__(self, db_file=settings.PERFORMANCE_HISTORY_DB):
+        """
+        Init a history store, tables are created if not exist.
+
+        :param db_file: SQLite database file
+        """
+        self.db_file = db_file
+        Path(os.path.dirname(os.path.abspath(self.db_file))).mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.db_file)
+        self.connection.row_factory = sqlite3.Row
+        self.baseline_runs = settings.PERFORMANCE_BASELINE_RUNS
+        self.baseline_min_runs = settings.PERFORMANCE_BASELINE_MIN_RUNS
+        self.regression_z_score = settings.PERFORMANCE_REGRESSION_Z_SCORE
+        self.regression_min_ratio = settings.PERFORMANCE_REGRESSION_MIN_RATIO
+        self._create_tables()
+
+    def _create_tables(self):
+        """Create tables 'runs' and 'samples' if not exist."""
+        with self.connection:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_name TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    build_id TEXT,
+                    created_at TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS samples (
+                    run_id INTEGER NOT NULL REFERENCES runs(id),
+                    plan TEXT NOT NULL,
+                    label TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    error_count INTEGER NOT NULL,
+                    mean REAL NOT NULL,
+                    p50 REAL NOT NULL,
+                    p90 REAL NOT NULL,
+                    p95 REAL NOT NULL,
+                    p99 REAL NOT NULL,
+                    max REAL NOT NULL,
+                    throughput REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_runs_job_stage ON runs (job_name, stage);
+                CREATE INDEX IF NOT EXISTS idx_samples_key ON samples (plan, label, run_id);
+            """)
+
+    def close(self):
+        """Close the database connection."""
+        self.connection.close()
+
+    @staticmethod
+    def _read_jtl(jtl_file) -> list:
+        """
+        Read samples from a jtl file, both XML and CSV (with header) formats are supported.
+
+        Only top level samples are returned, sub-samples of transaction controllers or redirects are omitted.
+
+        :param jtl_file: result file generated by JMeter
+        :return: list of tuple (label, timestamp in ms, elapsed in ms, success)
+        """
+        with open(jtl_file, "r", encoding="utf-8") as f:
+            is_xml = f.read(1) == "<"
+
+        samples = []
+        if is_xml:
+            depth = 0
+            for event, element in ET.iterparse(jtl_file, events=("start", "end")):
+                if event == "start":
+                    depth += 1
+                    continue
+                depth -= 1
+                # <testResults> is the root element, so top level samples have depth 1 when ended
+                if depth == 1 and element.get("lb") is not None:
+                    samples.append((
+                        element.get("lb"),
+                        int(element.get("ts", 0)),
+                        int(element.get("t", 0)),
+                        element.get("s", "true") == "true"
+                    ))
+                if depth <= 1:
+                    element.clear()
+        else:
+            with open(jtl_file, "r", encoding="utf-8", newline="") as f:
+                for row in csv.DictReader(f):
+                    samples.append((
+                        row["label"],
+                        int(row["timeStamp"]),
+                        int(row["elapsed"]),
+                        row.get("success", "true") == "true"
+                    ))
+        return samples
+
+    @staticmethod
+    def _percentile(sorted_values, percent):
+        """Return the nearest-rank percentile of a sorted list."""
+        rank = max(int(math.ceil(percent / 100 * len(sorted_values))), 1)
+        return sorted_values[rank - 1]
+
+    @classmethod
+    def aggregate_jtl(cls, jtl_file) -> dict:
+        """
+        Aggregate latency and throughput for each sampler label in a jtl file.
+
+        returns as:
+            {
+                "login": {"count": 10, "error_count": 0, "mean": 120.5, "p50": 118, ..., "throughput": 2.5}
+            }
+        """
+        samples_by_label = {}
+        for label, timestamp, elapsed, success in cls._read_jtl(jtl_file):
+            samples_by_label.setdefault(label, []).append((timestamp, elapsed, success))
+
+        aggregate = {}
+        for label, samples in samples_by_label.items():
+            elapsed_list = sorted(s[1] for s in samples)
+            start = min(s[0] for s in samples)
+            end = max(s[0] + s[1] for s in samples)
+            duration_seconds = (end - start) / 1000
+            stats = {
+                "count": len(samples),
+                "error_count": sum(1 for s in samples if not s[2]),
+                "mean": statistics.fmean(elapsed_list),
+                "max": elapsed_list[-1],
+                "throughput": len(samples) / duration_seconds if duration_seconds > 0 else 0.0
+            }
+            for percent in cls.PERCENTILES:
+                stats[f"p{percent}"] = cls._percentile(elapsed_list, percent)
+            aggregate[label] = stats
+        logger.debug(f"aggregate of {jtl_file}: {json.dumps(aggregate)}")
+        return aggregate
+
+    def record(self, job_name, stage, plan_results: dict, build_id=None) -> int:
+        """
+        Record aggregate results of one run.
+
+        :param job_name: name of Jenkins job
+        :param stage: stage flag as ci, testonline, ...
+        :param plan_results: dict as {plan: {label: stats}}, stats is what aggregate_jtl returns for one label
+        :param build_id: Jenkins build id, optional
+        :return: id of the new run, None if no sample in results (the run is not recorded, so it never becomes
+                 part of the baseline)
+        """
+        if not any(plan_results.values()):
+            logger.warning(f"No sample in results of job {job_name} (stage: {stage}), the run is not recorded.")
+            return None
+        created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (job_name, stage, build_id, created_at) VALUES (?, ?, ?, ?)",
+                (job_name, stage, build_id, created_at)
+            )
+            run_id = cursor.lastrowid
+            for plan, label_results in plan_results.items():
+                self.connection.executemany(
+                    "INSERT INTO samples (run_id, plan, label, count, error_count, mean, p50, p90, p95, p99, max, "
+                    "throughput) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (run_id, plan, label, s["count"], s["error_count"], s["mean"], s["p50"], s["p90"], s["p95"],
+                         s["p99"], s["max"], s["throughput"])
+                        for label, s in label_results.items()
+                    ]
+                )
+        logger.success(f"Run {run_id} of job {job_name} (stage: {stage}) recorded to {self.db_file}")
+        return run_id
+
+    def record_workspace(self, job_name, stage, jenkins_job_workspace, build_id=None) -> int:
+        """
+        Record results of all test plans listed in jmx.json of the Jenkins workspace.
+
+        :param job_name: name of Jenkins job
+        :param stage: stage flag as ci, testonline, ...
+        :param jenkins_job_workspace: workspace of job where jmx.json and jtl files were saved
+        :param build_id: Jenkins build id, optional
+        :return: id of the new run, None if no sample found
+        """
+        with open(os.path.join(jenkins_job_workspace, "jmx.json"), "r") as f:
+            jmx_file_names = json.load(f)
+
+        plan_results = {}
+        for jmx_file_name in jmx_file_names:
+            result_jtl = os.path.join(jenkins_job_workspace, f"{jmx_file_name}.jtl")
+            if not os.path.exists(result_jtl):
+                logger.warning(f"Result file {result_jtl} does not exist, skip test plan {jmx_file_name}")
+                continue
+            plan_results[jmx_file_name] = self.aggregate_jtl(result_jtl)
+        return self.record(job_name, stage, plan_results, build_id)
+
+    def _latest_run_id(self, job_name, stage):
+        """Return id of the latest run of the job with samples, or None if never recorded."""
+        # runs without samples may be left by versions which recorded them
+        row = self.connection.execute(
+            "SELECT max(r.id) AS run_id FROM runs AS r WHERE r.job_name = ? AND r.stage = ? "
+            "AND EXISTS (SELECT 1 FROM samples AS s WHERE s.run_id = r.id)", (job_name, stage)
+        ).fetchone()
+        return row["run_id"]
+
+    def _baseline(self, job_name, stage, plan, label, before_run_id) -> list:
+        """Return rows of the same sampler from the latest runs before the given run."""
+        return self.connection.execute(
+            """
+            SELECT s.p95, s.p99 FROM samples AS s INNER JOIN runs AS r ON s.run_id = r.id
+            WHERE r.job_name = ? AND r.stage = ? AND s.plan = ? AND s.label = ? AND r.id < ?
+            ORDER BY r.id DESC LIMIT ?
+            """,
+            (job_name, stage, plan, label, before_run_id, self.baseline_runs)
+        ).fetchall()
+
+    def _is_regression(self, current, baseline_values) -> bool:
+        """
+        Return True if current value is significantly greater than the baseline.
+
+        Both conditions must be met:
+            1. the z-score of current value against the baseline reaches the threshold
+            2. current value exceeds the baseline mean by the minimum ratio, so tiny but stable changes are ignored
+        """
+        mean = statistics.fmean(baseline_values)
+        if current <= mean * (1 + self.regression_min_ratio):
+            return False
+        stdev = statistics.stdev(baseline_values) if len(baseline_values) > 1 else 0
+        if stdev == 0:
+            return True
+        return (current - mean) / stdev >= self.regression_z_score
+
+    def compare(self, job_name, stage, run_id=None) -> list:
+        """
+        Compare p95 / p99 of one run against the rolling baseline built from previous runs.
+
+        Samplers with fewer baseline runs than settings.PERFORMANCE_BASELINE_MIN_RUNS are skipped.
+
+        :param job_name: name of Jenkins job
+        :param stage: stage flag as ci, testonline, ...
+        :param run_id: run to compare, the latest run if not set
+        :return: list of dict, each one describes a regression
+        """
+        if run_id is None:
+            run_id = self._latest_run_id(job_name, stage)
+            if run_id is None:
+                logger.warning(f"No run of job {job_name} (stage: {stage}) recorded yet.")
+                return []
+
+        regressions = []
+        rows = self.connection.execute(
+            "SELECT plan, label, p95, p99 FROM samples WHERE run_id = ?", (run_id,)
+        ).fetchall()
+        for row in rows:
+            baseline = self._baseline(job_name, stage, row["plan"], row["label"], run_id)
+            if len(baseline) < self.baseline_min_runs:
+                logger.debug(f"Only {len(baseline)} baseline runs for {row['plan']}/{row['label']}, skip.")
+                continue
+            for metric in ("p95", "p99"):
+                baseline_values = [b[metric] for b in baseline]
+                if self._is_regression(row[metric], baseline_values):
+                    regressions.append({
+                        "plan": row["plan"],
+                        "label": row["label"],
+                        "metric": metric,
+                        "current": row[metric],
+                        "baseline_mean": statistics.fmean(baseline_values),
+                        "baseline_runs": len(baseline_values)
+                    })
+
+        for regression in regressions:
+            logger.warning(f"Latency regression detected: {json.dumps(regression)}")
+        if not regressions:
+            logger.success(f"No latency regression detected for run {run_id} of job {job_name} (stage: {stage}).")
+        return regressions
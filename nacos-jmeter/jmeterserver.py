@@ -0,0 +1,99 @@
+import os
+import platform
+import socket
+import subprocess
+import tempfile
+import time
+
+from loguru import logger
+
+
+class LocalJMeterServers(object):
+    """
+    Class representing JMeter servers started on local host.
+
+    Used as stand-in of remote load generators, so build.xml generated in distributed mode can be run and tested
+    without real load generators.
+    """
+
+    def __init__(self, jmeter_home, count=2, base_port=1099, start_timeout=60):
+        """
+        Init servers, call start() to launch them.
+
+        :param jmeter_home: JMeter home
+        :param count: count of servers
+        :param base_port: RMI port of the first server, the others use the following ports
+        :param start_timeout: seconds to wait for every server to listen
+        """
+        self.jmeter_home = jmeter_home
+        self.count = count
+        self.base_port = base_port
+        self.start_timeout = start_timeout
+        self.log_dir = tempfile.mkdtemp(prefix="jmeter-server-")
+        self.processes = []
+
+    @property
+    def hosts(self) -> list:
+        """Hosts to be set as 'remote-hosts' of Builder or passed to -R."""
+        return [f"127.0.0.1:{self.base_port + i}" for i in range(self.count)]
+
+    def _jmeter_executable(self):
+        """Return full path of JMeter launch script."""
+        script = "jmeter.bat" if platform.system() == "Windows" else "jmeter"
+        return os.path.join(self.jmeter_home, "bin", script)
+
+    @staticmethod
+    def _is_listening(port):
+        """Return True if something is listening on the local port."""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.settimeout(1)
+            return s.connect_ex(("127.0.0.1", port)) == 0
+
+    def start(self) -> list:
+        """
+        Start servers and wait until all of them are listening.
+
+        :return: hosts of servers
+        """
+        for i in range(self.count):
+            port = self.base_port + i
+            command = [
+                self._jmeter_executable(), "-s",
+                f"-Dserver_port={port}",
+                f"-Jserver.rmi.localport={port}",
+                "-Jserver.rmi.ssl.disable=true",
+                "-j", os.path.join(self.log_dir, f"jmeter-server-{port}.log")
+            ]
+            logger.debug(f"start JMeter server: {command}")
+            self.processes.append(subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+
+        deadline = time.time() + self.start_timeout
+        for i in range(self.count):
+            port = self.base_port + i
+            while not self._is_listening(port):
+                if time.time() > deadline:
+                    self.stop()
+                    raise TimeoutError(f"JMeter server on port {port} is not listening after {self.start_timeout}s, "
+                                       f"see logs in {self.log_dir}")
+                time.sleep(1)
+        logger.success(f"JMeter servers started: {self.hosts}")
+        return self.hosts
+
+    def stop(self):
+        """Terminate all servers."""
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.processes.clear()
+        logger.info("JMeter servers stopped.")
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -0,0 +1,309 @@
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import bisect
+import json
+import math
+import os
+import threading
+import time
+
+from loguru import logger
+
+import settings
+
+
+class MetricsRegistry(object):
+    """
+    Class representing histograms, counters and gauges of one process, exposed in Prometheus text format and as JSON.
+
+    Metrics are defined once (name, help, label names), then observed with label values as keyword arguments:
+
+        registry.define_histogram("sync_phase_seconds", "Seconds of each sync phase.", ["phase"])
+        with registry.time("sync_phase_seconds", phase="git_push"):
+            origin.push()
+
+    Pool workers should not observe metrics of this registry, as their copies are dropped when they exit.
+    Return the measurements to the parent process instead, and observe them there.
+    """
+
+    HISTOGRAM = "histogram"
+    COUNTER = "counter"
+    GAUGE = "gauge"
+
+    def __init__(self, prefix=settings.METRICS_PREFIX, buckets=settings.METRICS_HISTOGRAM_BUCKETS):
+        """
+        Init an empty registry.
+
+        :param prefix: prefix of every metric name exposed
+        :param buckets: upper bounds of histogram buckets (in seconds), +Inf is added automatically
+        """
+        self.prefix = prefix
+        self.buckets = sorted(buckets)
+        self._lock = threading.Lock()
+        self._definitions = {}  # name -> {"type": ..., "help": ..., "labels": [...]}
+        self._series = {}  # name -> {label values tuple -> counter value, or histogram as dict}
+        self._server = None
+
+    def _define(self, metric_type, name, documentation, label_names):
+        with self._lock:
+            definition = {"type": metric_type, "help": documentation, "labels": list(label_names or [])}
+            existing = self._definitions.get(name)
+            assert existing is None or existing == definition, f"Metric {name} is defined differently: {existing}"
+            self._definitions[name] = definition
+            self._series.setdefault(name, {})
+
+    def define_histogram(self, name, documentation, label_names=None):
+        """Define a histogram, defining the same one again is allowed."""
+        self._define(self.HISTOGRAM, name, documentation, label_names)
+
+    def define_counter(self, name, documentation, label_names=None):
+        """Define a counter, defining the same one again is allowed."""
+        self._define(self.COUNTER, name, documentation, label_names)
+
+    def define_gauge(self, name, documentation, label_names=None):
+        """Define a gauge, defining the same one again is allowed."""
+        self._define(self.GAUGE, name, documentation, label_names)
+
+    def _label_values(self, name, metric_type, labels) -> tuple:
+        definition = self._definitions.get(name)
+        assert definition is not None, f"Metric {name} is not defined"
+        assert definition["type"] == metric_type, f"Metric {name} is a {definition['type']}"
+        assert set(labels) == set(definition["labels"]), \
+            f"Labels of {name} must be {definition['labels']}, got {list(labels)}"
+        return tuple(str(labels[label_name]) for label_name in definition["labels"])
+
+    def observe(self, name, value, **labels):
+        """Add one observation to a histogram."""
+        with self._lock:
+            label_values = self._label_values(name, self.HISTOGRAM, labels)
+            series = self._series[name].setdefault(
+                label_values, {"buckets": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0})
+            series["buckets"][bisect.bisect_left(self.buckets, value)] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def inc(self, name, value=1, **labels):
+        """Increase a counter."""
+        assert value >= 0, f"Counter {name} can only be increased, got {value}"
+        with self._lock:
+            label_values = self._label_values(name, self.COUNTER, labels)
+            self._series[name][label_values] = self._series[name].get(label_values, 0) + value
+
+    def set(self, name, value, **labels):
+        """Set value of a gauge."""
+        with self._lock:
+            label_values = self._label_values(name, self.GAUGE, labels)
+            self._series[name][label_values] = value
+
+    @contextmanager
+    def time(self, name, **labels):
+        """Observe seconds the block takes to a histogram, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    @staticmethod
+    def _escape(value):
+        return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+    def _format_labels(self, label_names, label_values, extra=None) -> str:
+        pairs = list(zip(label_names, label_values)) + (extra or [])
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{self._escape(v)}"' for k, v in pairs) + "}"
+
+    def render_prometheus(self) -> str:
+        """Return all metrics in Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            for name, definition in sorted(self._definitions.items()):
+                full_name = f"{self.prefix}_{name}"
+                label_names = definition["labels"]
+                lines.append(f"# HELP {full_name} {definition['help']}")
+                lines.append(f"# TYPE {full_name} {definition['type']}")
+                for label_values, series in sorted(self._series[name].items()):
+                    if definition["type"] != self.HISTOGRAM:
+                        lines.append(f"{full_name}{self._format_labels(label_names, label_values)} {series}")
+                        continue
+                    cumulative = 0
+                    for bound, count in zip([*self.buckets, "+Inf"], series["buckets"]):
+                        cumulative += count
+                        labels = self._format_labels(label_names, label_values, [("le", str(bound))])
+                        lines.append(f"{full_name}_bucket{labels} {cumulative}")
+                    labels = self._format_labels(label_names, label_values)
+                    lines.append(f"{full_name}_sum{labels} {series['sum']}")
+                    lines.append(f"{full_name}_count{labels} {series['count']}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> dict:
+        """Return all metrics as a dict which can be dumped to JSON."""
+        result = {"buckets": self.buckets, "metrics": {}}
+        with self._lock:
+            for name, definition in self._definitions.items():
+                result["metrics"][name] = {
+                    **definition,
+                    "series": [
+                        {"labels": dict(zip(definition["labels"], label_values)),
+                         "value": series if definition["type"] != self.HISTOGRAM else dict(series)}
+                        for label_values, series in self._series[name].items()
+                    ]
+                }
+        return result
+
+    def dump(self, out_file):
+        """Write metrics to a JSON file, replaced atomically so readers never see a partial file."""
+        Path(os.path.dirname(out_file)).mkdir(parents=True, exist_ok=True)
+        data = self.to_dict()
+        data["dumped_at"] = time.time()
+        tmp_file = f"{out_file}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_file, out_file)
+
+    def serve(self, port, host=settings.METRICS_HOST):
+        """
+        Expose metrics on http://host:port/metrics (Prometheus text) and /metrics.json in a daemon thread.
+
+        :return: port listened, useful if port is 0
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = registry.render_prometheus(), "text/plain; version=0.0.4; charset=utf-8"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(registry.to_dict()), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True).start()
+        logger.info(f"Metrics served on http://{host}:{self._server.server_address[1]}/metrics")
+        return self._server.server_address[1]
+
+    def stop_serving(self):
+        """Stop the server started by serve()."""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class LatencyTracker(object):
+    """
+    Class representing latencies of one kind of event (e.g. trigger to push) reached at several stages.
+
+    Latencies are observed to a histogram of the registry, recent ones are kept to report rolling percentiles as
+    a gauge, and a warning is logged for every latency missing the target (SLO) of its stage.
+    Not thread-safe, observe from one thread (e.g. the sync task) only.
+    """
+
+    def __init__(self, name, targets, window_size=settings.LATENCY_WINDOW_SIZE,
+                 quantiles=settings.LATENCY_QUANTILES, metrics_registry=None):
+        """
+        Init a tracker, metrics named '{name}_seconds', '{name}_percentile_seconds' and '{name}_slo_misses_total'
+        are defined in the registry.
+
+        :param name: name of the latency, e.g. 'trigger_latency'
+        :param targets: dict of max seconds expected of each stage, stages not in it have no target
+        :param window_size: latencies of each stage kept for percentiles
+        :param quantiles: quantiles reported, e.g. [0.5, 0.99]
+        :param metrics_registry: registry to record to, the one of this process if not set
+        """
+        self.name = name
+        self.targets = dict(targets)
+        self.window_size = window_size
+        self.quantiles = list(quantiles)
+        self._windows = {}  # stage -> deque of latencies
+        self._registry_override = metrics_registry
+        self.registry.define_histogram(f"{name}_seconds", f"Seconds of {name} by stage.", ["stage"])
+        self.registry.define_gauge(f"{name}_percentile_seconds",
+                                   f"Rolling percentiles of {name} over last {window_size} observations.",
+                                   ["stage", "quantile"])
+        self.registry.define_counter(f"{name}_slo_misses_total", f"Observations of {name} missing the target.",
+                                     ["stage"])
+
+    @property
+    def registry(self) -> MetricsRegistry:
+        return self._registry_override or registry
+
+    def __getstate__(self):
+        """The registry is per process, do not send it to worker processes."""
+        state = self.__dict__.copy()
+        state["_registry_override"] = None
+        return state
+
+    @staticmethod
+    def percentile(values, quantile):
+        """Return percentile of values with nearest-rank method."""
+        ordered = sorted(values)
+        rank = math.ceil(round(quantile * len(ordered), 6))  # rounded first, as 0.9 * 10 is 9.000000000000002
+        return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+    def observe(self, stage, latency, context=""):
+        """
+        Record one latency of a stage.
+
+        :param stage: stage reached, e.g. 'push'
+        :param latency: seconds since the event happened
+        :param context: text logged if target is missed, to identify the event
+        :return: True if target of the stage is met (or the stage has no target)
+        """
+        window = self._windows.setdefault(stage, deque(maxlen=self.window_size))
+        window.append(latency)
+        self.registry.observe(f"{self.name}_seconds", latency, stage=stage)
+        for quantile in self.quantiles:
+            self.registry.set(f"{self.name}_percentile_seconds", self.percentile(window, quantile),
+                              stage=stage, quantile=quantile)
+
+        target = self.targets.get(stage)
+        if target is not None and latency > target:
+            self.registry.inc(f"{self.name}_slo_misses_total", stage=stage)
+            logger.warning(f"{self.name} of stage {stage} missed the target: {latency:.1f}s > {target}s, "
+                           f"{self.summary(stage)}. {context}")
+            return False
+        return True
+
+    def summary(self, stage) -> str:
+        """Return rolling percentiles of a stage as text, e.g. 'p50 1.2s, p99 3.4s (last 10)'."""
+        window = self._windows.get(stage)
+        if not window:
+            return f"no {self.name} of stage {stage} yet"
+        percentiles = ", ".join(f"p{quantile * 100:g} {self.percentile(window, quantile):.1f}s"
+                                for quantile in self.quantiles)
+        return f"{percentiles} (last {len(window)})"
+
+
+# metrics of this process, shared by syncers and the modules they use
+registry = MetricsRegistry()
+registry.define_histogram("sync_phase_seconds", "Seconds of each phase of NacosSyncer.sync_to_git().", ["phase"])
+registry.define_histogram("snapshot_namespace_seconds", "Seconds downloading configs of one namespace.",
+                          ["namespace"])
+registry.define_histogram("database_phase_seconds", "Seconds of each phase of DatabaseSyncer.sync_once().",
+                          ["phase", "table"])
+registry.define_histogram("snapshot_maintenance_seconds", "Seconds of each maintenance task of snapshot repo.",
+                          ["task"])
+registry.define_gauge("snapshot_repo_bytes", "Bytes of loose objects and packs of snapshot repo.", ["kind"])
+registry.define_counter("snapshot_configs_total", "Configs downloaded when making snapshot.", ["namespace"])
+registry.define_counter("snapshot_bytes_total", "Bytes of configs downloaded when making snapshot.", ["namespace"])
+registry.define_counter("snapshot_files_changed_total", "Snapshot files changed by make_snapshot().", ["change"])
+registry.define_counter("database_rows_total", "Rows read from database tables.", ["table"])
+registry.define_counter("published_bytes_total", "Bytes published to Nacos.", ["data_id"])
+registry.define_counter("retries_total", "Operations retried.", ["operation"])
+registry.define_counter("failures_total", "Operations failed.", ["operation"])
@@ -1,51 +1,223 @@
 import json
+import random
+import threading
 import time
 
-import requests
 from loguru import logger
+from nacos.exception import NacosRequestException
+import requests
+
+import settings
 
 
 class NacosServer(object):
     """Class representing one Nacos server."""
 
+    STATE_UNKNOWN = "unknown"
+    STATE_ONLINE = "online"
+    STATE_OFFLINE = "offline"
+
     def __init__(self, host, port, wait_until_online=True):
         """Init class."""
         self.host = host
+        self.port = port
+        self.server_address = f"{host}:{port}"  # passed to NacosClient
         self.host_port = f"http://{host}:{port}"
         self.login_path = f"/nacos/#/login"
         self.login_url = f"{self.host_port}{self.login_path}"
+        self.health_path = f"/nacos/v1/console/health/readiness"
+        self.health_url = f"{self.host_port}{self.health_path}"
         self.get_namespaces_path = f"/nacos/v1/console/namespaces"
         self.get_namespaces_url = f"{self.host_port}{self.get_namespaces_path}"
+        self.configs_path = f"/nacos/v1/cs/configs"
+        self.configs_url = f"{self.host_port}{self.configs_path}"
+
+        self.health_cache_ttl = settings.NACOS_HEALTH_CACHE_TTL
+        self.health_check_timeout = settings.NACOS_HEALTH_CHECK_TIMEOUT
+        self.health_backoff_base = settings.NACOS_HEALTH_BACKOFF_BASE
+        self.health_backoff_max = settings.NACOS_HEALTH_BACKOFF_MAX
+        self._health_lock = threading.Lock()
+        self._state = self.STATE_UNKNOWN
+        self._checked_at = 0.0  # time.monotonic() of last check
+        self._next_check_at = 0.0  # no check before this time while offline
+        self._failures = 0  # continuous failures
+
+        self.namespace_cache_ttl = settings.NACOS_NAMESPACE_CACHE_TTL
+        self._namespaces_lock = threading.Lock()
+        self._namespaces = None  # None means never fetched
+        self._namespaces_fetched_at = 0.0
+        self._namespaces_etag = None
+        self._namespace_listeners = []
         if wait_until_online:
             self.wait_until_online()
 
-    def is_nacos_online(self):
-        """Returns true if login url can be opened successfully."""
-        logger.info(f"nacos login url: {self.login_url}")
+    def __getstate__(self):
+        """Locks and listeners cannot be pickled, drop them when sent to worker processes."""
+        state = self.__dict__.copy()
+        del state["_health_lock"]
+        del state["_namespaces_lock"]
+        state["_namespace_listeners"] = []
+        return state
+
+    def __setstate__(self, state):
+        """Recreate locks dropped by __getstate__."""
+        self.__dict__.update(state)
+        self._health_lock = threading.Lock()
+        self._namespaces_lock = threading.Lock()
+
+    @property
+    def state(self):
+        """Last known state of Nacos, no request is made."""
+        return self._state
+
+    def _check_health(self):
+        """Returns true if readiness endpoint responds with 200."""
+        logger.debug(f"nacos health url: {self.health_url}")
         try:
-            response = requests.get(self.login_url)
-        except requests.exceptions.ConnectionError:
+            response = requests.get(self.health_url, timeout=self.health_check_timeout)
+        except requests.exceptions.RequestException:
             logger.warning(f"Cannot connect to Nacos now.")
             return False
 
         if response.status_code == 200:
-            logger.success("Nacos service is available now.")
             return True
         else:
-            logger.warning("Nacos service is available, but cannot open login page now.")
+            logger.warning(f"Nacos service is available, but not ready now (status code: {response.status_code}).")
             return False
 
+    def _update_state(self, online):
+        """Update state, back off exponentially with jitter on continuous failures. Must hold self._health_lock."""
+        now = time.monotonic()
+        self._checked_at = now
+        if online:
+            if self._state != self.STATE_ONLINE:
+                logger.success("Nacos service is available now.")
+            self._state = self.STATE_ONLINE
+            self._failures = 0
+            self._next_check_at = now
+        else:
+            self._state = self.STATE_OFFLINE
+            self._failures += 1
+            delay = min(self.health_backoff_base * 2 ** (self._failures - 1), self.health_backoff_max)
+            # equal jitter: half of the delay is kept, the other half is random, so several clients do not hit a
+            # recovering Nacos at the same time while none checks sooner than half the delay
+            delay = random.uniform(delay / 2, delay)
+            self._next_check_at = now + delay
+            logger.debug(f"Nacos is offline ({self._failures} continuous failures), next check in {delay:.1f}s.")
+
+    def mark_offline(self):
+        """Record a failure found by caller (for example, a request to Nacos failed), no request is made."""
+        with self._health_lock:
+            self._update_state(False)
+
+    def seconds_until_next_check(self):
+        """Seconds to wait before next real check makes sense, 0 if online or never checked."""
+        return max(self._next_check_at - time.monotonic(), 0)
+
+    def is_nacos_online(self, force=False):
+        """
+        Returns true if Nacos is ready.
+
+        Result is cached for settings.NACOS_HEALTH_CACHE_TTL seconds when online.
+        When offline, False is returned without request until the backoff delay passes.
+
+        :param force: check by request anyway if set True
+        """
+        with self._health_lock:
+            now = time.monotonic()
+            if not force:
+                if self._state == self.STATE_ONLINE and now - self._checked_at < self.health_cache_ttl:
+                    return True
+                if self._state == self.STATE_OFFLINE and now < self._next_check_at:
+                    return False
+            self._update_state(self._check_health())
+            return self._state == self.STATE_ONLINE
+
     def wait_until_online(self):
         """Stop polling until Nacos server is available."""
         while not self.is_nacos_online():
-            logger.info("Nacos server is not available now, try 10 seconds later again.")
-            time.sleep(10)
-
-    def get_namespaces(self):
-        """Get all namespaces information."""
-        response = requests.get(self.get_namespaces_url).text
-        logger.info(f"Response of {self.get_namespaces_path}: {response}")
-        return json.loads(response)["data"]
+            delay = self.seconds_until_next_check()
+            logger.info(f"Nacos server is not available now, try {delay:.1f} seconds later again.")
+            time.sleep(delay)
+
+    def add_namespace_listener(self, callback):
+        """
+        Register a callback called in-process when namespaces change on refresh.
+
+        The callback is called with a dict as {"added": [...], "removed": [...], "changed": [...]}, each list
+        contains namespace ids, "changed" means configCount of the namespace changed.
+        No callback is called on the first fetch, as nothing to compare with.
+        """
+        self._namespace_listeners.append(callback)
+
+    @staticmethod
+    def _diff_namespaces(old_namespaces, new_namespaces) -> dict:
+        """Compare two lists of namespaces and return ids added, removed, or with configCount changed."""
+        old_counts = {n["namespace"]: n["configCount"] for n in old_namespaces}
+        new_counts = {n["namespace"]: n["configCount"] for n in new_namespaces}
+        return {
+            "added": [i for i in new_counts if i not in old_counts],
+            "removed": [i for i in old_counts if i not in new_counts],
+            "changed": [i for i in new_counts if i in old_counts and new_counts[i] != old_counts[i]]
+        }
+
+    def get_namespaces(self, force_refresh=False):
+        """
+        Get all namespaces information.
+
+        Result is cached for settings.NACOS_NAMESPACE_CACHE_TTL seconds. On refresh, ETag of last response is sent,
+        cache is kept if Nacos responds with 304. Listeners are notified if namespaces changed.
+
+        :param force_refresh: refresh even if cache is still fresh
+        """
+        with self._namespaces_lock:
+            now = time.monotonic()
+            if not force_refresh and self._namespaces is not None and \
+                    now - self._namespaces_fetched_at < self.namespace_cache_ttl:
+                return list(self._namespaces)
+
+            headers = {"If-None-Match": self._namespaces_etag} if self._namespaces_etag else {}
+            response = requests.get(self.get_namespaces_url, headers=headers, timeout=self.health_check_timeout)
+            self._namespaces_fetched_at = now
+            if response.status_code == 304 and self._namespaces is not None:
+                logger.debug(f"{self.get_namespaces_path} not modified.")
+                return list(self._namespaces)
+
+            logger.debug(f"Response of {self.get_namespaces_path}: {response.text}")
+            namespaces = json.loads(response.text)["data"]
+            self._namespaces_etag = response.headers.get("ETag")
+            old_namespaces = self._namespaces
+            self._namespaces = namespaces
+
+        if old_namespaces is not None:
+            changes = self._diff_namespaces(old_namespaces, namespaces)
+            if any(changes.values()):
+                logger.info(f"Namespaces changed: {changes}")
+                for callback in self._namespace_listeners:
+                    callback(changes)
+        return list(namespaces)
+
+    def publish_config(self, data_id, group, content, namespace_id=""):
+        """
+        Publish a config with content sent in the request body.
+
+        NacosClient.publish_config() puts content in the query string, which is rejected by the server once longer
+        than its max request line, so large configs (for example, database table snapshots) are published here.
+
+        :raise NacosRequestException: if Nacos is unreachable or does not accept the config
+        """
+        data = {"dataId": data_id, "group": group, "content": content}
+        if namespace_id:
+            data["tenant"] = namespace_id
+        try:
+            response = requests.post(self.configs_url, data=data, timeout=settings.NACOS_PUBLISH_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            raise NacosRequestException(f"Failed to publish config (data id: {data_id}, group: {group}): {e}")
+        if response.status_code != 200 or response.text != "true":
+            raise NacosRequestException(f"Failed to publish config (data id: {data_id}, group: {group}), "
+                                        f"status: {response.status_code}, response: {response.text}")
+        logger.debug(f"Config published (data id: {data_id}, group: {group}, namespace: {namespace_id}), "
+                     f"{len(content)} characters")
 
     def _namespace_name_to_id(self):
         """Build the relationship between namespace name and corresponding id."""
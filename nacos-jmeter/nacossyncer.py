@@ -0,0 +1,674 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import Pool
+from pathlib import Path
+import datetime
+import os
+import re
+import tempfile
+import threading
+import time
+
+from loguru import logger
+import git
+import nacos
+
+import settings
+from nacosserver import NacosServer
+from collector import Collector
+from daemon import DaemonRuntime
+from metrics import LatencyTracker, registry as metrics
+from profiling import CycleProfiler
+from snapshot import SnapshotWriter
+from snapshotrepo import SnapshotRepoMaintenance, clone_snapshot_repo
+from tracing import tracer
+
+
+@contextmanager
+def sync_phase(phase, **attributes):
+    """Measure a phase of NacosSyncer.sync_to_git() as a metric and as a span, attributes are passed to the span."""
+    with tracer.span(phase, **attributes) as span, metrics.time("sync_phase_seconds", phase=phase):
+        yield span
+
+
+class NacosSyncer(object):
+    """Class representing syncer from Nacos to git."""
+    def __init__(self, nacos_server: NacosServer, nacos_client_debug=False, nacos_snapshot_repo_url=None,
+                 nacos_snapshot_repo_dir=None, commit_history_file=None, nacos_snapshot_clone_mode=None,
+                 maintenance_intervals=None):
+        """
+        Init class.
+
+        Repo url, repo dir and commit history file default to the ones in settings, set them to run against
+        a local git remote (for example, in benchmarks). Clone mode and maintenance intervals default to
+        settings.NACOS_SNAPSHOT_CLONE_MODE and settings.SNAPSHOT_MAINTENANCE_INTERVALS.
+        """
+        self.nacos_server = nacos_server
+
+        self.index = []  # tasks staged (borrow the concept of git)
+        self.index_namespace_ids = set()  # namespaces named by tasks in index
+        self.index_full_sync = False  # True if any task in index names no namespace, i.e. all should be synced
+        self.index_trigger_times = []  # time.time() when each task in index was added
+        self.sync_task_lock = False  # True if one sync task (make snapshot and push to git remote) is running
+        self.sync_task_reason = ""
+
+        self.nacos_snapshot_repo_url = nacos_snapshot_repo_url or settings.NACOS_SNAPSHOT_REPO_URL
+        self.nacos_snapshot_repo_dir = nacos_snapshot_repo_dir or settings.NACOS_SNAPSHOT_REPO_DIR
+        self.nacos_snapshot_clone_mode = nacos_snapshot_clone_mode or settings.NACOS_SNAPSHOT_CLONE_MODE
+        self.nacos_snapshot_repo = self._init_nacos_snapshot_repo()
+        self.snapshot_repo_maintenance = SnapshotRepoMaintenance(self.nacos_snapshot_repo_dir, maintenance_intervals)
+
+        self.commit_history_file = commit_history_file or settings.COMMIT_HISTORY
+        self.sync_trigger_data_id = settings.SYNC_TRIGGER_DATA_ID
+        self.sync_trigger_group = settings.SYNC_TRIGGER_GROUP
+        self.sync_trigger_namespace_data_id_prefix = settings.SYNC_TRIGGER_NAMESPACE_DATA_ID_PREFIX
+        self.sync_trigger_namespaces_key = settings.SYNC_TRIGGER_NAMESPACES_KEY
+        self.nacos_client_debug = nacos_client_debug
+
+        self.cross_env_namespace_id = settings.CROSS_ENV_NAMESPACE_ID
+        self.stage_to_namespace_ids = settings.STAGE_TO_NAMESPACE_IDS
+        self.summary_namespace_id = settings.SUMMARY_NAMESPACE_ID
+        self.summary_group_debug = settings.SUMMARY_GROUP_DEBUG
+        self.summary_group_stable = settings.SUMMARY_GROUP_STABLE
+
+        self.snapshot_page_size = settings.SNAPSHOT_PAGE_SIZE
+        self.snapshot_page_concurrency = settings.SNAPSHOT_PAGE_CONCURRENCY
+        self.snapshot_namespace_retries = settings.SNAPSHOT_NAMESPACE_RETRIES
+
+        # namespaces added, removed or whose config count changed since last snapshot
+        self.changed_namespace_ids = set()
+        self.nacos_server.add_namespace_listener(self.on_namespaces_changed)
+
+        self.metrics_port = settings.METRICS_PORT_NACOS_SYNCER
+        # from trigger to stages: summary_publish, commit, push
+        self.trigger_latency = LatencyTracker("trigger_latency", settings.TRIGGER_LATENCY_TARGETS)
+        self.metrics_dump_file = os.path.join(settings.METRICS_DUMP_DIR, "nacos_syncer.json")
+
+        self.profiler = CycleProfiler("nacos-syncer")
+        self.runtime = DaemonRuntime("NacosSyncer")
+        self.runtime.add_shutdown_hook(self.flush_index)
+        self.runtime.add_shutdown_hook(lambda: metrics.dump(self.metrics_dump_file))
+
+    def _init_nacos_snapshot_repo(self) -> git.Repo:
+        """
+        Returns an instance of git.Repo
+
+        Returns:
+            instance of git.Repo
+        """
+        return clone_snapshot_repo(self.nacos_snapshot_repo_url, self.nacos_snapshot_repo_dir,
+                                   self.nacos_snapshot_clone_mode, settings.NACOS_SNAPSHOT_CLONE_DEPTH)
+
+    def set_nacos_client_debug(self, client: nacos.NacosClient):
+        """Enable NacosClient debugging when possible."""
+        if self.nacos_client_debug:
+            client.set_debugging()
+
+    @staticmethod
+    def _save_config_items(items, namespace_id, snapshot_base) -> int:
+        """
+        Save configs of one page to snapshot base, file name format as DATA_ID+GROUP+NAMESPACE.
+
+        Args:
+            items: list of configs, each one is a dict with keys 'dataId', 'group', 'content'.
+            namespace_id: id of namespace, None or "" for public namespace.
+            snapshot_base: Dir to store snapshot config files.
+
+        Returns:
+            bytes written
+        """
+        size = 0
+        for item in items:
+            file_name = "+".join([item["dataId"], item["group"], namespace_id or ""])
+            with open(os.path.join(snapshot_base, file_name), "wb") as f:
+                size += f.write((item["content"] or "").encode("utf-8"))
+        return size
+
+    def _download_one_page(self, nacos_client, namespace_id, page_no, snapshot_base, trace_context=None):
+        """
+        Download one page of configs and save them to snapshot base.
+
+        Args:
+            trace_context: context of parent span, as pages are downloaded in threads
+
+        Returns:
+            tuple (count of configs in the page, count of pages available reported by server, bytes written,
+            count of configs in namespace reported by server)
+        """
+        with tracer.span("download_page", parent=trace_context, page_no=page_no) as span:
+            page = nacos_client.get_configs(no_snapshot=True, page_no=page_no, page_size=self.snapshot_page_size)
+            items = page.get("pageItems") or []
+            size = self._save_config_items(items, namespace_id, snapshot_base)
+            span.set_attributes(configs=len(items), bytes=size)
+        return len(items), page.get("pagesAvailable", 0), size, page.get("totalCount")
+
+    def _download_all_pages(self, nacos_client, namespace_id, snapshot_base, trace_context=None):
+        """
+        Download every page of configs of one namespace, pages after the first one are downloaded concurrently.
+        Since config count may be stale, pages keep being downloaded until server returns a page not full.
+
+        Returns:
+            tuple (count of configs, bytes written, count of configs in namespace reported with the first page)
+        """
+        count, pages_available, size, total_count = self._download_one_page(nacos_client, namespace_id, 1,
+                                                                             snapshot_base)
+        total = count
+        last_page_full = count == self.snapshot_page_size
+        if pages_available > 1:
+            with ThreadPoolExecutor(self.snapshot_page_concurrency) as executor:
+                results = list(executor.map(
+                    lambda page_no: self._download_one_page(nacos_client, namespace_id, page_no, snapshot_base,
+                                                            trace_context),
+                    range(2, pages_available + 1)
+                ))
+            total += sum(r[0] for r in results)
+            size += sum(r[2] for r in results)
+            last_page_full = results[-1][0] == self.snapshot_page_size
+
+        # configs added after the first page was got
+        page_no = max(pages_available, 1)
+        while last_page_full:
+            page_no += 1
+            count, _, page_size, _ = self._download_one_page(nacos_client, namespace_id, page_no, snapshot_base)
+            total += count
+            size += page_size
+            last_page_full = count == self.snapshot_page_size
+        return total, size, total_count
+
+    def download_one_namespace_configs(self, namespace_id, namespace_name, namespace_config_count, snapshot_base,
+                                       trace_context=None):
+        """
+        Download all configs of specific namespace page by page.
+
+        Configs are written to snapshot as soon as each page arrives, so memory used does not grow with size of
+        the namespace. Pages after the first one are downloaded concurrently.
+        Configs added or removed while pages are being downloaded shift the others between pages, so some can be
+        missed. If count of configs reported by server changed by the end of the download, the namespace is
+        downloaded again (at most self.snapshot_namespace_retries times), and reported as not consistent if it
+        keeps changing, so that files of it are not removed from snapshot.
+
+        Args:
+            namespace_id: id of namespace, passed when initializing NacosClient.
+            namespace_name: name of namespace, used for logging.
+            namespace_config_count: count of configs when namespaces were listed, used for logging.
+            snapshot_base: Dir to store snapshot config files.
+            trace_context: context of parent span, as this runs in a Pool worker.
+
+        Returns:
+            dict of measurements as {"configs": n, "bytes": n, "seconds": n, "consistent": bool}, observed as
+            metrics by the parent process since this runs in a Pool worker
+        """
+        with tracer.span("download_namespace", parent=trace_context, namespace=namespace_name) as span:
+            start = time.perf_counter()
+            nacos_client = nacos.NacosClient(self.nacos_server.server_address, namespace=namespace_id)
+            self.set_nacos_client_debug(nacos_client)
+            Path(snapshot_base).mkdir(parents=True, exist_ok=True)
+            logger.info(f"Begin to get configs from namespace: {namespace_name} "
+                        f"(about {namespace_config_count} configs)")
+
+            for attempt in range(self.snapshot_namespace_retries + 1):
+                if attempt:
+                    # files of last attempt may belong to configs removed since then
+                    for file_name in os.listdir(snapshot_base):
+                        if SnapshotWriter.namespace_of(file_name) == (namespace_id or ""):
+                            os.remove(os.path.join(snapshot_base, file_name))
+                total, size, total_count = self._download_all_pages(nacos_client, namespace_id, snapshot_base,
+                                                                    span.context)
+                total_count_after = nacos_client.get_configs(no_snapshot=True, page_no=1, page_size=1).get("totalCount")
+                consistent = total_count == total_count_after
+                if consistent:
+                    break
+                logger.warning(f"Count of configs in namespace {namespace_name} changed from {total_count} to "
+                               f"{total_count_after} while downloading (attempt {attempt + 1})")
+            logger.success(f"Succeed to get {total} configs from namespace: {namespace_name}")
+            span.set_attributes(configs=total, bytes=size, consistent=consistent)
+        return {"configs": total, "bytes": size, "seconds": time.perf_counter() - start, "consistent": consistent}
+
+    def on_namespaces_changed(self, changes):
+        """
+        Record namespaces changed, which must be downloaded in next snapshot even if not requested.
+
+        Args:
+            changes: dict of namespace ids as {"added": [...], "removed": [...], "changed": [...]}
+        """
+        self.changed_namespace_ids.update(*changes.values())
+        logger.info(f"Namespaces to be downloaded in next snapshot: {self.changed_namespace_ids}")
+
+    def make_snapshot(self, snapshot_base, clean_base=False, namespace_ids=None) -> dict:
+        """
+        Download all configurations of every namespace to local in parallel.
+
+        Configs are downloaded to a staging directory first, then only files with changed content are replaced
+        (atomically) in snapshot base, unchanged files are left untouched.
+        Set clean_base to True if want to track configs deleted, files deleted on Nacos are removed only after
+        download succeeded, and never for namespaces failed to download or changing while downloading.
+        Namespace 'summary' is neither downloaded nor cleaned: summaries in snapshot base are generated from the
+        snapshot by Collector, what was published to Nacos carries the sync reason as a header.
+
+        :param snapshot_base: Dir to store snapshot config files, whose parent directory is named with 'nacos-snapshot'.
+        :param clean_base: Remove files in base which were not downloaded if set as True.
+        :param namespace_ids: Download only these namespaces (plus namespaces changed since last snapshot) if set,
+            only files of these namespaces are removed when clean_base is True.
+        :return: dict of file names changed as {"added": [...], "modified": [...], "removed": [...]}
+        """
+        namespaces = self.nacos_server.get_namespaces(force_refresh=True)
+        namespaces = [n for n in namespaces if n["namespace"] != self.summary_namespace_id]
+        target_namespace_ids = None
+        if namespace_ids is not None:
+            target_namespace_ids = set(namespace_ids) | self.changed_namespace_ids
+            namespaces = [n for n in namespaces if n["namespace"] in target_namespace_ids]
+
+        logger.info("Begin to make snapshot of Nacos.")
+        with SnapshotWriter(snapshot_base) as writer:
+            # Note:
+            #   When running in Windows, if another change occurs when handling current change, the process will always
+            #   wait nearly one minute and I don't know why, but in macOS, it works great.
+            #   If running on Linux this happens, log pid to try to find reason.
+            results = {}
+            if namespaces:
+                p = Pool(len(namespaces))
+                for item in namespaces:
+                    namespace_id = item["namespace"]
+                    namespace_id = None if not namespace_id else namespace_id
+                    namespace_name = item["namespaceShowName"]
+                    namespace_config_count = item["configCount"]
+                    results[item["namespace"]] = p.apply_async(
+                        self.download_one_namespace_configs,
+                        args=(namespace_id, namespace_name, namespace_config_count, writer.staging_dir,
+                              tracer.current_context())
+                    )
+                p.close()
+                p.join()
+
+            failed_namespace_ids = set()
+            for namespace_id, result in results.items():
+                try:
+                    measurements = result.get()
+                except Exception as e:
+                    logger.error(f"Failed to download namespace '{namespace_id}': {e!r}")
+                    failed_namespace_ids.add(namespace_id)
+                    metrics.inc("failures_total", operation="snapshot_namespace")
+                    continue
+                metrics.observe("snapshot_namespace_seconds", measurements["seconds"], namespace=namespace_id)
+                metrics.inc("snapshot_configs_total", measurements["configs"], namespace=namespace_id)
+                metrics.inc("snapshot_bytes_total", measurements["bytes"], namespace=namespace_id)
+                if not measurements["consistent"]:
+                    # configs may be missed, files downloaded are kept but none of the namespace is removed
+                    logger.error(f"Namespace '{namespace_id}' kept changing while downloading, "
+                                 f"files of it are not removed from snapshot")
+                    failed_namespace_ids.add(namespace_id)
+                    metrics.inc("failures_total", operation="snapshot_namespace_changing")
+
+            if failed_namespace_ids:
+                # remove files only of namespaces downloaded successfully
+                deletable_namespace_ids = set(results.keys()) - failed_namespace_ids
+            else:
+                deletable_namespace_ids = target_namespace_ids
+            changes = writer.commit(delete=clean_base, namespace_ids=deletable_namespace_ids,
+                                    keep_namespace_ids={self.summary_namespace_id})
+        for change, file_names in changes.items():
+            metrics.inc("snapshot_files_changed_total", len(file_names), change=change)
+
+        # namespaces failed to download are kept, so they are downloaded again next time
+        handled_namespace_ids = target_namespace_ids if target_namespace_ids is not None else \
+            set(self.changed_namespace_ids)
+        self.changed_namespace_ids -= handled_namespace_ids - failed_namespace_ids
+        return changes
+
+    def publish_one_stage_summary(self, stage, publish_for_debug=False, trace_context=None):
+        """
+        Find summary property file and publish to namespace 'summary' if file exist.
+
+        Args:
+            stage: stage flag
+            publish_for_debug: publish DEBUG summary to group DEBUG if set to True
+            trace_context: context of parent span, as this runs in a Pool worker
+
+        Returns:
+            bytes published, 0 if summary file does not exist
+        """
+        with tracer.span("publish_summary", parent=trace_context, stage=stage, debug=publish_for_debug):
+            logger.debug(f"Handle publishing stage summary properties, stage: {stage}, "
+                         f"publish for debug: {publish_for_debug}")
+            summary_group = self.summary_group_debug if publish_for_debug else self.summary_group_stable
+            summary_file_name = "+".join([stage, summary_group, self.summary_namespace_id])
+            summary_file_path = os.path.join(self.nacos_snapshot_repo_dir, summary_file_name)
+            if os.path.exists(summary_file_path):
+                logger.debug(f"summary file for stage {stage} exists: {summary_file_path}")
+                with open(summary_file_path, "r") as summary:
+                    content = self.sync_task_reason + "\n\n" + summary.read()
+                    # summaries outgrow the query string NacosClient.publish_config() sends content in
+                    self.nacos_server.publish_config(stage, summary_group, content, self.summary_namespace_id)
+                    logger.success(f"Succeed to publish summary properties for stage {stage} "
+                                   f"with content from file {summary_file_name}.")
+                    return len(content.encode("utf-8"))
+            else:
+                logger.debug(f"summary file for stage {stage} does not exist: {summary_file_path}")
+                return 0
+
+    def collect_and_publish_summary(self, collect_for_debug=False, changed_files=None):
+        """
+        Collect summary properties for stages and publish to namespace 'summary', with data id set to {stage}.
+
+        Args:
+            collect_for_debug:  if set to True, summaries for both DEBUG and STAGE group would be published.
+            changed_files: if set, only summaries depending on these snapshot files are collected and published.
+
+        Returns:
+            list of summaries published as [(stage, debug)]
+        """
+        c = Collector(self.nacos_snapshot_repo_dir)
+        if changed_files is None:
+            summaries = c.get_all_summaries(collect_for_debug)
+        else:
+            summaries = c.get_affected_summaries(changed_files, collect_for_debug)
+        if not summaries:
+            logger.info("No summary affected, nothing to collect and publish.")
+            return []
+
+        # collect summaries and save to local snapshot base after decoding
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with sync_phase("summary_generate"):
+                c.generate_summaries(tmp_dir, summaries)
+            with sync_phase("summary_encode"):
+                c.encode_properties(tmp_dir, os.path.join(tmp_dir, "nacos.xml"))
+
+        # publish summary property file to Nacos
+        with sync_phase("summary_publish"):
+            p = Pool(len(summaries))
+            results = {(stage, debug): p.apply_async(self.publish_one_stage_summary,
+                                                     args=(stage, debug, tracer.current_context()))
+                       for stage, debug in summaries}
+            p.close()
+            p.join()
+        published = []
+        for (stage, debug), result in results.items():
+            try:
+                size = result.get()
+            except Exception as e:
+                logger.error(f"Failed to publish summary (stage: {stage}, debug: {debug}): {e!r}")
+                metrics.inc("failures_total", operation="summary_publish")
+                continue
+            metrics.inc("published_bytes_total", size, data_id=stage)
+            if size:
+                published.append((stage, debug))
+        return published
+
+    def add(self, params):
+        """
+        Add tasks to index (waiting room), just like 'git add .'.
+
+        Args:
+            params: parameters got from caller.
+
+        Returns:
+            None
+        """
+        date_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        trigger_data_id = params.get("data_id") or self.sync_trigger_data_id
+        trigger_message = params["content"]
+        logger.info(f"{trigger_data_id} changed at {date_str}, content: {trigger_message}")
+        namespace_ids = self.parse_trigger_namespace_ids(params)
+        if namespace_ids is None:
+            self.index_full_sync = True
+        else:
+            self.index_namespace_ids |= namespace_ids
+        self.index.append(f"{date_str} | {trigger_message}")
+        self.index_trigger_times.append(time.time())
+
+    def parse_trigger_namespace_ids(self, params):
+        """
+        Return namespace ids named by a trigger, or None if all namespaces should be synced.
+
+        Namespaces are named by data id of the trigger (e.g. nacos.commit.message.env-02),
+        or by a line as 'namespaces: env-02, cross-env' in trigger message.
+
+        Args:
+            params: parameters got from caller.
+
+        Returns:
+            set of namespace ids, or None
+        """
+        trigger_data_id = params.get("data_id") or self.sync_trigger_data_id
+        if trigger_data_id.startswith(self.sync_trigger_namespace_data_id_prefix):
+            return {trigger_data_id[len(self.sync_trigger_namespace_data_id_prefix):]}
+
+        pattern = rf"^\s*{re.escape(self.sync_trigger_namespaces_key)}\s*:(.*)$"
+        match = re.search(pattern, params.get("content") or "", re.MULTILINE | re.IGNORECASE)
+        if match:
+            namespace_ids = {item.strip() for item in match.group(1).split(",") if item.strip()}
+            if namespace_ids:
+                return namespace_ids
+        return None
+
+    def pop_index_namespace_ids(self):
+        """
+        Return namespace ids named by all tasks in index (None if all namespaces should be synced), and reset them.
+        """
+        namespace_ids = None if self.index_full_sync else set(self.index_namespace_ids)
+        self.index_namespace_ids = set()
+        self.index_full_sync = False
+        return namespace_ids
+
+    def pop_index_trigger_times(self):
+        """Return times when tasks in index were added, and reset them."""
+        trigger_times = self.index_trigger_times
+        self.index_trigger_times = []
+        return trigger_times
+
+    def observe_trigger_latency(self, stage, trigger_times, reached_at):
+        """
+        Record latency from each trigger to a stage of sync.
+
+        Args:
+            stage: stage reached, one of 'summary_publish', 'commit' and 'push'
+            trigger_times: times returned by pop_index_trigger_times()
+            reached_at: time.time() when the stage was reached
+        """
+        for trigger_time in trigger_times:
+            self.trigger_latency.observe(stage, reached_at - trigger_time, f"reason: {self.sync_task_reason}")
+
+    def clean_index(self):
+        """
+        Save commits in self.index to file.
+
+        Returns:
+            All commit messages (concatenated with "\n").
+        """
+        # save commit history in self.index to history file
+        commit_messages = "\n".join(self.index)
+        Path(os.path.dirname(self.commit_history_file)).mkdir(parents=True, exist_ok=True)
+        with open(self.commit_history_file, "a", encoding="utf-8") as history_file:
+            history_file.write(commit_messages + "\n")
+        self.index.clear()
+        self.index_trigger_times.clear()
+        return commit_messages
+
+    def flush_index(self):
+        """Save triggers not synced yet to commit history file, called when shutting down."""
+        if self.index:
+            logger.warning(f"{len(self.index)} trigger(s) not synced before shutdown, "
+                           f"saved to {self.commit_history_file}: {self.index}")
+            self.clean_index()
+
+    def commit_and_push_to_remote(self, commit_messages):
+        """
+        Commit and push to git remote repository.
+        Args:
+            commit_messages: commit messages.
+
+        Returns:
+            dict of time.time() when stages succeeded as {"commit": ..., "push": ...}, None if not succeeded
+        """
+        reached_at = {"commit": None, "push": None}
+        origin = self.nacos_snapshot_repo.remotes.origin
+
+        if self.nacos_snapshot_repo.is_dirty(untracked_files=True):
+            logger.info(f"Changes in local repo {self.nacos_snapshot_repo_dir} found, commit and push starts.")
+            with sync_phase("git_add"):
+                self.nacos_snapshot_repo.git.add(A=True)
+            with sync_phase("git_commit"):
+                self.nacos_snapshot_repo.index.commit(commit_messages)
+            reached_at["commit"] = time.time()
+            with sync_phase("git_push"):
+                info = origin.push()
+            # flags of ERROR begins with 1024
+            if info[0].flags >= 1024:
+                logger.warning(f"Failed to push to remote, "
+                               f"summary: {info[0].summary}, flags: {info[0].flags}, commit messages: {commit_messages}"
+                               f"try to pull before push.")
+                metrics.inc("retries_total", operation="git_push")
+                with sync_phase("git_pull"):
+                    origin.pull()  # pull once before pushing to prevent conflict.
+                with sync_phase("git_push"):
+                    info_again = origin.push()
+                if info_again[0].flags >= 1024:
+                    logger.error(f"Failed to push even pulled before,"
+                                 f"summary: {info[0].summary}, flags: {info[0].flags}, commit messages: {commit_messages}")
+                    metrics.inc("failures_total", operation="git_push")
+                else:
+                    reached_at["push"] = time.time()
+            else:
+                logger.success("Push to remote successfully.")
+                reached_at["push"] = time.time()
+        else:
+            logger.warning("One commit was triggered, but current working tree is clean.")
+        return reached_at
+
+    def dispatch_sync_task(self, params):
+        """
+        Determine if new sync task can be started.
+        Args:
+            params: parameter placeholder, set by NacosClient.
+
+        Returns:
+            None
+        """
+        if self.runtime.stopping:
+            logger.warning("Syncer is shutting down, new sync task will not be started.")
+        elif self.acquire_sync_task_lock():
+            try:
+                with self.runtime.task("sync to git"), self.profiler.cycle("sync_to_git"):
+                    self.sync_to_git(params)
+            finally:
+                self.sync_task_lock = False
+        else:
+            logger.info(f"One sync task (reason: {self.sync_task_reason}) is already running, wait a moment.")
+
+    def acquire_sync_task_lock(self) -> bool:
+        """
+        Set sync_task_lock if neither a sync task nor maintenance of snapshot repo is running.
+
+        Returns:
+            True if acquired, release it by setting sync_task_lock to False
+        """
+        with self.runtime.lock:  # sync tasks and maintenance run in different threads
+            if self.sync_task_lock:
+                return False
+            self.sync_task_lock = True
+            return True
+
+    def maintain_snapshot_repo(self, tasks) -> bool:
+        """
+        Run maintenance tasks of snapshot repo, unless a sync task is running.
+        Tasks staged while maintaining are synced right after.
+
+        Args:
+            tasks: names of maintenance tasks, see snapshotrepo.MAINTENANCE_COMMANDS
+
+        Returns:
+            True if maintenance ran, False if postponed
+        """
+        if self.runtime.stopping or not self.acquire_sync_task_lock():
+            return False
+        try:
+            self.sync_task_reason = f"maintenance of snapshot repo ({', '.join(tasks)})"
+            with self.runtime.task("maintain snapshot repo"), \
+                    tracer.span("maintain_snapshot_repo", new_trace=True, tasks=tasks):
+                self.snapshot_repo_maintenance.run(tasks)
+        finally:
+            self.sync_task_lock = False
+        # a trigger received meanwhile found the lock taken and only staged its task
+        if len(self.index) > 0 and not self.runtime.stopping:
+            logger.info("Tasks were staged while maintaining snapshot repo, begin to sync now.")
+            self.dispatch_sync_task(None)
+        return True
+
+    def run_snapshot_repo_maintenance(self):
+        """
+        Run maintenance tasks of snapshot repo when they are due, until shutdown. Run by a thread started in run().
+        """
+        maintenance = self.snapshot_repo_maintenance
+        while not self.runtime.wait(maintenance.seconds_until_due()):
+            tasks = maintenance.due_tasks()
+            if tasks and not self.maintain_snapshot_repo(tasks) and not self.runtime.stopping:
+                logger.info(f"Maintenance of snapshot repo postponed, "
+                            f"a sync task (reason: {self.sync_task_reason}) is running.")
+                self.runtime.wait(settings.SNAPSHOT_MAINTENANCE_RETRY_INTERVAL)
+
+    def sync_to_git(self, params):
+        """
+        Download all configs from every namespace and sync to git remote.
+
+        Args:
+            params: parameters got from caller.
+
+        Returns:
+            None
+        """
+        namespace_ids = self.pop_index_namespace_ids()
+        trigger_times = self.pop_index_trigger_times()
+        self.sync_task_reason = self.clean_index()
+        scope = "all namespaces" if namespace_ids is None else f"namespaces {sorted(namespace_ids)}"
+        logger.info(f"Begin to sync configs ({scope}) from Nacos to git remote, reason: {self.sync_task_reason}")
+        with sync_phase("sync_to_git", new_trace=True, reason=self.sync_task_reason, triggers=len(trigger_times),
+                        namespaces=sorted(namespace_ids) if namespace_ids is not None else "all"):
+            with sync_phase("make_snapshot") as span:
+                changes = self.make_snapshot(self.nacos_snapshot_repo_dir, clean_base=True,
+                                             namespace_ids=namespace_ids)
+            span.set_attributes(**{f"files.{change}": len(file_names) for change, file_names in changes.items()})
+            changed_files = changes["added"] + changes["modified"] + changes["removed"]
+            with sync_phase("collect_and_publish_summary"):
+                published = self.collect_and_publish_summary(collect_for_debug=True, changed_files=changed_files)
+            if published:
+                self.observe_trigger_latency("summary_publish", trigger_times, time.time())
+            with sync_phase("commit_and_push_to_remote"):
+                reached_at = self.commit_and_push_to_remote(self.sync_task_reason)
+        for stage in ["commit", "push"]:
+            if reached_at[stage]:
+                self.observe_trigger_latency(stage, trigger_times, reached_at[stage])
+        if trigger_times:
+            logger.info(f"Trigger to push latency: {self.trigger_latency.summary('push')}")
+        metrics.dump(self.metrics_dump_file)
+        # Note:
+        #   When one watcher is running and then another change occurs, the NacosClient will record the
+        #   change but will not call callbacks immediately (call callbacks after last watcher finished instead).
+        #   So the IF block below will never run.
+        if len(self.index) > 0 and not self.runtime.stopping:
+            logger.info(f"Last sync task finished (reason: {self.sync_task_reason}), "
+                        f"but index is not empty, begin to sync again.")
+            self.sync_to_git(params)
+        logger.success(f"Last sync task finished (reason: {self.sync_task_reason}), and index is empty, quit now.")
+
+    def run(self):
+        """
+        Trigger sync when nacos.commit.message (or per-namespace trigger) changes, until SIGTERM or SIGINT received.
+        """
+        nacos_client = nacos.NacosClient(self.nacos_server.server_address)
+        self.set_nacos_client_debug(nacos_client)
+        nacos_client.set_options(no_snapshot=True)
+        trigger_data_ids = [self.sync_trigger_data_id] + [
+            self.sync_trigger_namespace_data_id_prefix + namespace_id
+            for namespace_id in [self.cross_env_namespace_id, *self.stage_to_namespace_ids.values()]
+        ]
+        for trigger_data_id in trigger_data_ids:
+            nacos_client.add_config_watchers(
+                trigger_data_id, self.sync_trigger_group, [self.add, self.dispatch_sync_task])
+        nacos_client.add_config_watchers(self.profiler.data_id, self.profiler.group, [self.profiler.on_config_changed])
+        metrics.serve(self.metrics_port)
+        if self.snapshot_repo_maintenance.intervals:
+            threading.Thread(target=self.run_snapshot_repo_maintenance, name="snapshot-repo-maintenance",
+                             daemon=True).start()
+        self.runtime.install_signal_handlers()
+        self.profiler.install_signal_handler()
+        self.runtime.run_forever()
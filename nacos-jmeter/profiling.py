@@ -0,0 +1,167 @@
+from contextlib import contextmanager
+from pathlib import Path
+import cProfile
+import datetime
+import io
+import os
+import pstats
+import signal
+import tracemalloc
+
+from loguru import logger
+
+import settings
+
+
+def current_rss_mb() -> float:
+    """Return resident set size of this process in MB, 0 if not available (only Linux is supported)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024, 1)
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+class CycleProfiler(object):
+    """
+    Class representing opt-in profiling of the next N cycles (syncs) of a long-running syncer.
+
+    Profiling is requested by SIGUSR1 (settings.PROFILE_DEFAULT_CYCLES cycles), or by publishing the count of cycles
+    to Nacos config {PROFILING_DATA_ID_PREFIX}{name} (0 cancels). For each profiled cycle, these files are written to
+    {dump_dir}/{name}/:
+        1. {time}-cycle{n}.prof: cProfile stats, open with pstats or snakeviz
+        2. {time}-cycle{n}.txt: top functions by cumulative time, RSS, and top memory growth (by tracemalloc)
+           since the cycle before, and since profiling started
+
+    When no profiling is requested, cycle() only checks a counter: no profiler or tracemalloc is hooked.
+    Only this process is profiled, Pool workers are short-lived and not included.
+    """
+
+    def __init__(self, name, dump_dir=settings.PROFILE_DUMP_DIR, default_cycles=settings.PROFILE_DEFAULT_CYCLES,
+                 top=settings.PROFILE_TOP, tracemalloc_frames=settings.PROFILE_TRACEMALLOC_FRAMES):
+        """
+        Init a profiler, nothing is profiled until requested.
+
+        :param name: name of syncer, used in data id of Nacos config and directory of dump files
+        :param dump_dir: base directory of dump files
+        :param default_cycles: cycles profiled when requested by signal
+        :param top: count of functions and memory growth entries written to reports
+        :param tracemalloc_frames: frames kept by tracemalloc for each allocation, more frames cost more memory
+        """
+        self.name = name
+        self.dump_dir = os.path.join(dump_dir, name)
+        self.default_cycles = default_cycles
+        self.top = top
+        self.tracemalloc_frames = tracemalloc_frames
+        self.data_id = settings.PROFILING_DATA_ID_PREFIX + name
+        self.group = settings.PROFILING_GROUP
+        self.remaining_cycles = 0  # set from signal handler or Nacos listener thread, read by the syncing thread
+        self._cycle_no = 0
+        self._first_snapshot = None
+        self._last_snapshot = None
+        self._started_tracemalloc = False
+
+    def __getstate__(self):
+        """Snapshots are large, only settings are sent to worker processes, where nothing is profiled."""
+        return {"name": self.name, "dump_dir": os.path.dirname(self.dump_dir), "default_cycles": self.default_cycles,
+                "top": self.top, "tracemalloc_frames": self.tracemalloc_frames}
+
+    def __setstate__(self, state):
+        """Rebuild profiler from state returned by __getstate__."""
+        self.__init__(**state)
+
+    def request(self, cycles=None):
+        """Profile next cycles (default_cycles if not set), 0 cancels profiling after the current cycle."""
+        self.remaining_cycles = self.default_cycles if cycles is None else max(int(cycles), 0)
+
+    def _handle_signal(self, signum, frame):
+        self.request()
+
+    def install_signal_handler(self, signum=signal.SIGUSR1):
+        """Request profiling when signal received, must be called in main thread."""
+        signal.signal(signum, self._handle_signal)
+
+    def on_config_changed(self, params):
+        """
+        Watcher of Nacos config {PROFILING_DATA_ID_PREFIX}{name}, whose content is count of cycles to profile.
+
+        Args:
+            params: parameters set by NacosClient
+        """
+        content = (params.get("content") or "").strip()
+        try:
+            cycles = int(content or 0)
+        except ValueError:
+            logger.warning(f"Content of {self.data_id} must be count of cycles to profile, got: {content!r}")
+            return
+        logger.info(f"Profiling of {self.name} requested by Nacos config {self.data_id}: {cycles} cycle(s)")
+        self.request(cycles)
+
+    @contextmanager
+    def cycle(self, name="cycle"):
+        """Profile the block if profiling is requested, else run it as it is."""
+        if self.remaining_cycles <= 0:
+            if self._started_tracemalloc:  # profiling cancelled between cycles
+                self._stop_tracemalloc()
+            yield
+            return
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.tracemalloc_frames)
+            self._started_tracemalloc = True
+        if self._first_snapshot is None:
+            self._first_snapshot = self._last_snapshot = tracemalloc.take_snapshot()
+        self._cycle_no += 1
+        rss_before = current_rss_mb()
+        logger.info(f"Profiling {name} of {self.name}, cycle {self._cycle_no} "
+                    f"({self.remaining_cycles} remaining), RSS {rss_before} MB")
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            self.remaining_cycles -= 1
+            try:
+                self._dump(name, profiler, rss_before)
+            except Exception:
+                logger.exception(f"Failed to dump profile of {self.name}")
+            if self.remaining_cycles <= 0:
+                self._stop_tracemalloc()
+
+    def _dump(self, name, profiler, rss_before):
+        """Write stats of profiler, and memory growth since last cycle and since profiling started."""
+        snapshot = tracemalloc.take_snapshot()
+        Path(self.dump_dir).mkdir(parents=True, exist_ok=True)
+        date_str = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+        base = os.path.join(self.dump_dir, f"{date_str}-cycle{self._cycle_no}")
+        profiler.dump_stats(f"{base}.prof")
+
+        stats_text = io.StringIO()
+        pstats.Stats(profiler, stream=stats_text).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [
+            f"{name} of {self.name}, cycle {self._cycle_no}",
+            f"RSS: {rss_before} MB -> {current_rss_mb()} MB",
+            f"traced Python memory: {current / 1024 / 1024:.1f} MB (peak {peak / 1024 / 1024:.1f} MB)",
+            "",
+            f"Top {self.top} memory growth since last cycle:",
+            *[str(stat) for stat in snapshot.compare_to(self._last_snapshot, "lineno")[:self.top]],
+            "",
+            f"Top {self.top} memory growth since profiling started:",
+            *[str(stat) for stat in snapshot.compare_to(self._first_snapshot, "lineno")[:self.top]],
+            "",
+            stats_text.getvalue()
+        ]
+        with open(f"{base}.txt", "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+        self._last_snapshot = snapshot
+        logger.success(f"Profile of {name} written to {base}.prof and {base}.txt")
+
+    def _stop_tracemalloc(self):
+        """Stop tracemalloc started for profiling, once no more cycles are requested."""
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+            logger.info(f"Profiling of {self.name} finished, {self._cycle_no} cycle(s) written to {self.dump_dir}")
+        self._first_snapshot = self._last_snapshot = None
@@ -47,6 +47,8 @@ DATABASE_SNAPSHOT_GROUP = "DATABASE"
 
 # data ids
 SYNC_TRIGGER_DATA_ID = "nacos.commit.message"
+# per-namespace triggers, data id as "nacos.commit.message.env-02", only the namespace is synced when changed
+SYNC_TRIGGER_NAMESPACE_DATA_ID_PREFIX = SYNC_TRIGGER_DATA_ID + "."
 JENKINS_JMX_RELATIONSHIP_DATA_ID = "nacos.jmeter.test-plan"
 VESYNC_DATABASE_DATA_ID = "common"
 TABLE_DEVICE_TYPE_DATA_ID = "vesync-main.device-type"
@@ -61,3 +63,202 @@ KEY_TO_VESYNC_DATABASE_NAME = "cloud.service.database.name"
 
 ON_SAMPLE_ERROR_ACTION = "stopthread"
 DATABASE_SYNCER_INTERVAL = 60
+
+# performance history
+PERFORMANCE_HISTORY_DB = path.join(DATA_BASE, "performance_history.db")
+# count of previous runs used as rolling baseline
+PERFORMANCE_BASELINE_RUNS = 10
+# samplers with fewer baseline runs are not compared
+PERFORMANCE_BASELINE_MIN_RUNS = 5
+PERFORMANCE_REGRESSION_Z_SCORE = 3
+PERFORMANCE_REGRESSION_MIN_RATIO = 0.1
+
+# monitoring of smoke test
+# "jsr223": add JSR223Listener (pushToFalcon.groovy) to each HTTP Request
+# "backend": add one BackendListener to test plan, metrics are sent in batches asynchronously
+MONITOR_MODE = "jsr223"
+BACKEND_LISTENER_URL = "http://127.0.0.1:8086/write?db=jmeter"
+BACKEND_LISTENER_PERCENTILES = "90;95;99"
+BACKEND_LISTENER_QUEUE_SIZE = 5000
+# seconds between two sends of BackendListener
+BACKEND_LISTENER_SEND_INTERVAL = 5
+
+# disable GUI-only listeners and debug elements, and trim save configs of listeners for these stages
+OPTIMIZE_FOR_CI_STAGES = ["ci", "testonline", "predeploy", "production"]
+# jobs whose names start with "debug" are optimized too if set True
+OPTIMIZE_FOR_CI_IN_DEBUG = False
+
+# named load profiles, referred by key 'load-profile' in nacos.jmeter.test-plan, see TestPlan.apply_load_profile
+LOAD_PROFILES = {
+    "smoke": {"threads": 1, "ramp-up": 1, "loops": 1},
+    "load": {"threads": 200, "ramp-up": 60, "loops": -1, "duration": 600},
+    "stress": {"scale": 5, "ramp-up": 120, "loops": -1, "duration": 1800}
+}
+
+# JVM heap of each JMeter run (MB) = base + threads * per thread + samplers * per sampler
+JMETER_HEAP_BASE_MB = 256
+JMETER_HEAP_PER_THREAD_MB = 4
+JMETER_HEAP_PER_SAMPLER_MB = 0.1
+JMETER_HEAP_MIN_MB = 512
+JMETER_HEAP_MAX_MB = 8192
+JMETER_GC_JVM_ARGS = ["-XX:+UseG1GC", "-XX:MaxGCPauseMillis=100"]
+# total heap of JMeter runs in parallel on one Jenkins agent (MB)
+AGENT_MEMORY_BUDGET_MB = 12288
+
+# load a property file containing only properties referenced by the test plan, instead of the whole stage summary
+TRIM_PROPERTY_FILES = True
+# properties always kept in trimmed property files (regular expressions), mostly read by JMeter itself
+PROPERTY_KEYS_ALWAYS_KEPT = [
+    r"jmeter\..*",
+    r"httpclient.*",
+    r"httpsampler\..*",
+    r"http\..*",
+    r"https\..*",
+    r"hc\..*",
+    r"backend_.*",
+    r"summariser\..*",
+    r"sample_variables",
+    r"CookieManager\..*",
+    r"csvdataset\..*",
+    r"log_level.*",
+    r"server\..*",
+    r"client\..*"
+]
+
+# JMeter servers (host or host:port) to run test plans remotely, can be overwritten by key 'remote-hosts' of the job
+JMETER_REMOTE_HOSTS = []
+# "all": every test plan runs on all remote hosts; "split": test plans are spread across remote hosts
+JMETER_REMOTE_MODE = "all"
+# JMeter properties of the controller when running remotely
+JMETER_REMOTE_JMETER_PROPERTIES = {"server.rmi.ssl.disable": "true"}
+
+# health check of Nacos
+# seconds to trust last successful check
+NACOS_HEALTH_CACHE_TTL = 5
+NACOS_HEALTH_CHECK_TIMEOUT = 3
+# seconds to wait after first failure, doubled on each continuous failure until the max
+NACOS_HEALTH_BACKOFF_BASE = 1
+NACOS_HEALTH_BACKOFF_MAX = 60
+# seconds to trust namespaces got last time
+NACOS_NAMESPACE_CACHE_TTL = 30
+# seconds to wait for Nacos accepting a published config
+NACOS_PUBLISH_TIMEOUT = 30
+
+# configs downloaded in one request when making snapshot
+SNAPSHOT_PAGE_SIZE = 200
+# pages of one namespace downloaded concurrently
+SNAPSHOT_PAGE_CONCURRENCY = 4
+# times one namespace is downloaded again if its config count changed while pages were being downloaded
+SNAPSHOT_NAMESPACE_RETRIES = 2
+
+# how snapshot repo is cloned: "full", "shallow" (last *_CLONE_DEPTH commits), "blobless" (every commit, file
+# contents fetched when checked out) or "treeless" (trees are fetched on demand too), see snapshotrepo.py
+NACOS_SNAPSHOT_CLONE_MODE = "blobless"  # syncer keeps commit history, so pulling before push always finds a merge base
+NACOS_SNAPSHOT_CLONE_DEPTH = 50  # only used by "shallow"
+SNAPSHOT_AGENT_CLONE_MODE = "shallow"  # build agents only read the latest snapshot, see bin/clone_snapshot.py
+SNAPSHOT_AGENT_CLONE_DEPTH = 1
+# background maintenance of snapshot repo by NacosSyncer, seconds between runs of each task (empty to disable),
+# never runs while a sync task is running
+SNAPSHOT_MAINTENANCE_INTERVALS = {
+    "repack": 3600,  # pack loose objects written by commits
+    "commit-graph": 3600,
+    "gc": 7 * 24 * 3600
+}
+SNAPSHOT_MAINTENANCE_RETRY_INTERVAL = 60  # seconds to wait when maintenance was postponed by a running sync
+
+# seconds to wait for in-flight sync tasks when a syncer daemon is asked to stop (SIGTERM), None means forever
+DAEMON_SHUTDOWN_TIMEOUT = 300
+
+# a line as "namespaces: env-02, cross-env" in sync trigger message limits the sync to these namespaces
+SYNC_TRIGGER_NAMESPACES_KEY = "namespaces"
+
+# benchmarks
+BENCHMARK_RESULT_DIR = path.join(DATA_BASE, "benchmark")
+# wall time more than (1 + tolerance) times of baseline is reported as regression
+BENCHMARK_REGRESSION_TOLERANCE = 0.2
+# throughput of the largest case lower than this ratio of the smallest case means super-linear growth
+BENCHMARK_MIN_SCALING_RATIO = 0.25
+# phases faster than this (seconds) are too noisy for the scaling check
+BENCHMARK_MIN_WALL_TIME = 0.005
+# cases of NacosSyncer benchmark, from 100 to 50,000 configs, small to large values
+BENCHMARK_SYNCER_CASES = [
+    {"namespaces": 1, "configs_per_namespace": 100, "value_size": 128},
+    {"namespaces": 5, "configs_per_namespace": 200, "value_size": 1024},
+    {"namespaces": 5, "configs_per_namespace": 1000, "value_size": 1024},
+    {"namespaces": 10, "configs_per_namespace": 1000, "value_size": 4096},
+    {"namespaces": 20, "configs_per_namespace": 2500, "value_size": 1024},
+    {"namespaces": 5, "configs_per_namespace": 200, "value_size": 65536},
+]
+# ratio of configs modified before the incremental sync of each case
+BENCHMARK_SYNCER_MODIFY_RATIO = 0.01
+# cases of Collector / TestPlan / Builder benchmark
+BENCHMARK_BUILDER_CASES = [
+    {"snapshot_files": 200, "value_size": 128, "samplers": 100, "thread_groups": 1, "controller_depth": 1,
+     "test_plans": 1},
+    {"snapshot_files": 2000, "value_size": 512, "samplers": 1000, "thread_groups": 5, "controller_depth": 5,
+     "test_plans": 5},
+    {"snapshot_files": 20000, "value_size": 512, "samplers": 10000, "thread_groups": 10, "controller_depth": 50,
+     "test_plans": 10},
+]
+# min items per second of each operation
+BENCHMARK_BUILDER_THROUGHPUT_TARGETS = {
+    "collector.filter_data_ids": 100000,  # snapshot files per second
+    "collector.generate_all_stages_summary": 1000,  # snapshot files per second
+    "testplan.parse": 20000,  # samplers per second
+    "testplan.change_controller_type": 500,  # controllers per second
+    "testplan.add_jsr223listener_to_each_http_request": 5000,  # samplers per second
+    "testplan.save": 20000,  # samplers per second
+    "builder.generate_new_build_xml": 1000  # samplers of all test plans per second
+}
+# DatabaseSyncer benchmark, table sizes of today are multiplied by each scale
+BENCHMARK_DATABASE_DEVICE_TYPES = 300
+BENCHMARK_DATABASE_FIRMWARE_VERSIONS = 3  # versions kept of every model, region and plugin
+BENCHMARK_DATABASE_PLUGINS = 2  # plugins of every model
+BENCHMARK_DATABASE_SCALES = [1, 10, 100]
+# ratios of rows changed between two cycles
+BENCHMARK_DATABASE_MUTATION_RATIOS = [0, 0.01, 0.1]
+
+# metrics of syncers, served in Prometheus text format on local ports and dumped as JSON after every sync
+METRICS_PREFIX = "nacos_jmeter"
+METRICS_HISTOGRAM_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600]  # seconds
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT_NACOS_SYNCER = 9810
+METRICS_PORT_DATABASE_SYNCER = 9811  # stage index is added, so syncers of every stage can run on one host
+METRICS_DUMP_DIR = path.join(DATA_BASE, "metrics")
+# latencies kept for rolling percentiles, and percentiles reported
+LATENCY_WINDOW_SIZE = 500
+LATENCY_QUANTILES = [0.5, 0.9, 0.99]
+# max seconds expected from a sync trigger (nacos.commit.message changed) to each stage, a warning is logged if missed
+TRIGGER_LATENCY_TARGETS = {
+    "summary_publish": 120,
+    "commit": 180,
+    "push": 300
+}
+
+# trace spans of sync pipeline, exported as OTLP/JSON lines
+TRACING_ENABLED = True
+TRACING_SERVICE_NAME = "nacos-jmeter"
+TRACE_FILE = path.join(DATA_BASE, "trace", "spans.jsonl")
+TRACE_FILE_MAX_BYTES = 50 * 1024 * 1024  # rotated to {TRACE_FILE}.1 when larger
+
+# opt-in profiling of syncers, requested by SIGUSR1 or Nacos config {PROFILING_DATA_ID_PREFIX}{syncer name}
+PROFILE_DUMP_DIR = path.join(DATA_BASE, "profile")
+PROFILE_DEFAULT_CYCLES = 3  # cycles profiled when requested by signal
+PROFILE_TOP = 30  # functions and memory growth entries in reports
+PROFILE_TRACEMALLOC_FRAMES = 1
+PROFILING_DATA_ID_PREFIX = "nacos-jmeter.profiling."
+PROFILING_GROUP = "DEFAULT_GROUP"
+
+# budgets of import time (seconds) when each entry point starts, and modules it must not import (see syncer.py)
+STARTUP_IMPORT_BUDGETS = {
+    "bin/listen_on_nacos.py": 0.4,
+    "bin/listen_on_database.py": 0.4,
+    "nacos-jmeter/settings.py": 0.05,
+    "nacos-jmeter/common.py": 0.25
+}
+STARTUP_FORBIDDEN_IMPORTS = {
+    "bin/listen_on_nacos.py": ["pymysql", "pymysqlpool", "deepdiff", "dingtalkchatbot"],
+    "bin/listen_on_database.py": ["git", "pymysql", "pymysqlpool", "deepdiff", "dingtalkchatbot"],
+    "nacos-jmeter/settings.py": ["loguru", "yaml", "requests", "nacos", "git"],
+    "nacos-jmeter/common.py": ["yaml", "requests", "nacos", "git"]
+}
@@ -0,0 +1,82 @@
+import filecmp
+import glob
+import os
+import shutil
+import tempfile
+
+from loguru import logger
+
+
+class SnapshotWriter(object):
+    """
+    Class representing one update of Nacos snapshot.
+
+    Configs are downloaded to a staging directory beside snapshot base first, then only files with changed
+    content are moved into snapshot base by atomic renames, unchanged files are left untouched (so mtime and inode
+    are kept and git needs not to hash them again). Files deleted on Nacos are removed last.
+    """
+
+    def __init__(self, snapshot_base):
+        """
+        Init a writer for the snapshot base.
+
+        :param snapshot_base: Dir to store snapshot config files, whose parent directory is named with 'nacos-snapshot'.
+        """
+        self.snapshot_base = os.path.abspath(snapshot_base)
+        self.staging_dir = None
+
+    def __enter__(self):
+        """Create staging directory on the same file system as snapshot base, so files can be renamed atomically."""
+        parent_dir = os.path.dirname(self.snapshot_base)
+        self.staging_dir = tempfile.mkdtemp(prefix=f".{os.path.basename(self.snapshot_base)}-staging-", dir=parent_dir)
+        logger.debug(f"snapshot staging directory created: {self.staging_dir}")
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Remove staging directory, files not committed are discarded."""
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+    @staticmethod
+    def namespace_of(file_name):
+        """Return namespace id of snapshot file named as DATA_ID+GROUP+NAMESPACE."""
+        return file_name.split("+")[-1]
+
+    def commit(self, delete=True, namespace_ids=None, keep_namespace_ids=()) -> dict:
+        """
+        Move new and changed files from staging directory into snapshot base, then remove files not downloaded.
+
+        :param delete: remove files in snapshot base which are not in staging directory if set True
+        :param namespace_ids: if set, only files of these namespaces can be removed
+        :param keep_namespace_ids: files of these namespaces are never removed, even if namespace_ids is not set
+        :return: dict of file names as {"added": [...], "modified": [...], "removed": [...]}
+        """
+        changes = {"added": [], "modified": [], "removed": []}
+        staged_files = set(os.listdir(self.staging_dir))
+        for file_name in sorted(staged_files):
+            staged_file = os.path.join(self.staging_dir, file_name)
+            target_file = os.path.join(self.snapshot_base, file_name)
+            if not os.path.exists(target_file):
+                changes["added"].append(file_name)
+            elif not filecmp.cmp(staged_file, target_file, shallow=False):
+                changes["modified"].append(file_name)
+            else:
+                continue
+            os.replace(staged_file, target_file)
+
+        if delete:
+            # same as 'glob *', hidden files such as .git are never removed
+            for target_file in glob.glob(f"{glob.escape(self.snapshot_base)}/*"):
+                file_name = os.path.basename(target_file)
+                if file_name in staged_files or not os.path.isfile(target_file):
+                    continue
+                if namespace_ids is not None and self.namespace_of(file_name) not in namespace_ids:
+                    continue
+                if self.namespace_of(file_name) in keep_namespace_ids:
+                    continue
+                os.remove(target_file)
+                changes["removed"].append(file_name)
+
+        logger.info(f"snapshot committed, added: {len(changes['added'])}, modified: {len(changes['modified'])}, "
+                    f"removed: {len(changes['removed'])}, unchanged: "
+                    f"{len(staged_files) - len(changes['added']) - len(changes['modified'])}")
+        return changes
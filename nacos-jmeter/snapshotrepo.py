@@ -0,0 +1,153 @@
+import os
+import time
+
+from loguru import logger
+import git
+
+import settings
+from metrics import registry as metrics
+
+CLONE_MODES = ["full", "shallow", "blobless", "treeless"]
+
+# git commands of maintenance tasks, run in the order of settings.SNAPSHOT_MAINTENANCE_INTERVALS
+MAINTENANCE_COMMANDS = {
+    "repack": ["repack", "-d", "-l", "--quiet"],  # only loose objects are packed, existing packs are kept
+    "commit-graph": ["commit-graph", "write", "--reachable", "--changed-paths"],
+    "gc": ["gc", "--quiet"]
+}
+
+
+def clone_options(mode, depth) -> dict:
+    """
+    Return options of git clone (and git fetch) for a clone mode.
+
+    :param mode: one of CLONE_MODES
+    :param depth: commits kept by "shallow" clone
+    """
+    assert mode in CLONE_MODES, f"Clone mode must be one of {CLONE_MODES}, got: {mode}"
+    if mode == "shallow":
+        return {"depth": depth, "single_branch": True, "no_tags": True}
+    if mode == "blobless":
+        return {"filter": "blob:none"}
+    if mode == "treeless":
+        return {"filter": "tree:0"}
+    return {}
+
+
+def clone_snapshot_repo(url, repo_dir, mode=settings.NACOS_SNAPSHOT_CLONE_MODE,
+                        depth=settings.NACOS_SNAPSHOT_CLONE_DEPTH) -> git.Repo:
+    """
+    Clone snapshot repo, unless repo dir already exists.
+
+    Partial clones need the remote to allow filters (uploadpack.allowFilter, on by default in GitLab and GitHub),
+    otherwise git falls back to a full clone with a warning.
+
+    :param url: url of remote, a local path is turned into file:// url since git ignores depth and filter of local
+                clones
+    :param repo_dir: dir of working tree
+    :param mode: one of CLONE_MODES
+    :param depth: commits kept by "shallow" clone
+    :return: instance of git.Repo
+    """
+    if os.path.exists(repo_dir):
+        return git.Repo(repo_dir)
+    options = clone_options(mode, depth)
+    if options and os.path.isdir(url):
+        url = f"file://{os.path.abspath(url)}"
+    start = time.perf_counter()
+    repo = git.Repo.clone_from(url, repo_dir, **options)
+    logger.info(f"Snapshot repo cloned to {repo_dir} ({mode}) in {time.perf_counter() - start:.1f}s")
+    return repo
+
+
+def update_snapshot_repo(repo_dir, url=settings.NACOS_SNAPSHOT_REPO_URL, mode=settings.SNAPSHOT_AGENT_CLONE_MODE,
+                         depth=settings.SNAPSHOT_AGENT_CLONE_DEPTH) -> str:
+    """
+    Clone snapshot repo for a build agent, or update an existing clone to the latest commit of remote.
+
+    Local changes are discarded: an agent only reads the snapshot. A shallow clone is fetched with the same depth,
+    so history does not grow on agents.
+
+    :return: hexsha of the commit checked out
+    """
+    repo = clone_snapshot_repo(url, repo_dir, mode, depth)
+    if repo.head.is_detached:
+        branch = repo.git.rev_parse("--abbrev-ref", "origin/HEAD").split("/", 1)[1]
+    else:
+        branch = repo.active_branch.name
+    fetch_options = {"depth": depth} if mode == "shallow" else {}
+    repo.remotes.origin.fetch(branch, **fetch_options)
+    repo.git.reset("--hard", "FETCH_HEAD")
+    repo.git.gc("--auto", "--quiet")
+    logger.info(f"Snapshot repo {repo_dir} is at {repo.head.commit.hexsha} ({branch})")
+    return repo.head.commit.hexsha
+
+
+def count_objects(repo_dir) -> dict:
+    """Return bytes of loose objects and packs of a repo, as reported by git count-objects."""
+    output = git.Git(repo_dir).count_objects("-v")
+    kib = dict(line.split(": ", 1) for line in output.splitlines())
+    return {"loose": int(kib["size"]) * 1024, "pack": int(kib["size-pack"]) * 1024}
+
+
+class SnapshotRepoMaintenance(object):
+    """
+    Class representing scheduled maintenance of snapshot repo (repack, commit-graph, gc).
+
+    It only tells which tasks are due and runs them, the caller makes sure no sync runs at the same time
+    (see NacosSyncer.maintain_snapshot_repo()). Every task first runs one interval after the syncer started, so a
+    restart does not start with a gc.
+    """
+
+    def __init__(self, repo_dir, intervals=None):
+        """
+        Init a schedule, nothing runs until run() called.
+
+        :param repo_dir: dir of working tree
+        :param intervals: seconds between runs of each task, settings.SNAPSHOT_MAINTENANCE_INTERVALS if not set
+        """
+        self.repo_dir = repo_dir
+        self.intervals = dict(settings.SNAPSHOT_MAINTENANCE_INTERVALS if intervals is None else intervals)
+        for task in self.intervals:
+            assert task in MAINTENANCE_COMMANDS, f"Maintenance task must be one of {list(MAINTENANCE_COMMANDS)}"
+        now = time.monotonic()
+        self.last_run = {task: now for task in self.intervals}
+
+    def due_tasks(self, now=None) -> list:
+        now = time.monotonic() if now is None else now
+        return [task for task, interval in self.intervals.items() if now - self.last_run[task] >= interval]
+
+    def seconds_until_due(self, now=None):
+        """Return seconds until the next task is due (0 if any is due), None if no task is scheduled."""
+        if not self.intervals:
+            return None
+        now = time.monotonic() if now is None else now
+        return max(min(self.last_run[task] + interval - now for task, interval in self.intervals.items()), 0)
+
+    def run(self, tasks) -> dict:
+        """
+        Run maintenance tasks one by one, a failed task is logged and retried when it is due next time.
+
+        :param tasks: names of tasks, in MAINTENANCE_COMMANDS
+        :return: dict of seconds each succeeded task took
+        """
+        repo_git = git.Git(self.repo_dir)
+        before = count_objects(self.repo_dir)
+        durations = {}
+        for task in tasks:
+            start = time.perf_counter()
+            try:
+                with metrics.time("snapshot_maintenance_seconds", task=task):
+                    repo_git.execute(["git", *MAINTENANCE_COMMANDS[task]])
+            except git.GitCommandError as e:
+                logger.error(f"Maintenance task {task} of snapshot repo {self.repo_dir} failed: {e}")
+                metrics.inc("failures_total", operation=f"maintenance_{task}")
+            else:
+                durations[task] = time.perf_counter() - start
+            self.last_run[task] = time.monotonic()
+        after = count_objects(self.repo_dir)
+        for kind, size in after.items():
+            metrics.set("snapshot_repo_bytes", size, kind=kind)
+        logger.info(f"Maintenance of snapshot repo {self.repo_dir} finished: {durations}, "
+                    f"bytes of loose objects and packs {before} -> {after}")
+        return durations
@@ -1,9 +1,66 @@
+import copy
+import os
+import re
+
 from loguru import logger
 from lxml import etree as ET
 
 
 class TestPlan(object):
     """Class representing a JMeter test plan (jmx)."""
+
+    # listeners only useful in JMeter GUI, they cost CPU and heap in headless runs
+    GUI_ONLY_LISTENERS = [
+        "ViewResultsFullVisualizer",
+        "SummaryReport",
+        "StatVisualizer",
+        "StatGraphVisualizer",
+        "GraphVisualizer",
+        "TableVisualizer",
+        "RespTimeGraphVisualizer",
+        "AssertionVisualizer",
+        "ComparisonVisualizer",
+        "DistributionGraphVisualizer",
+        "SplineVisualizer"
+    ]
+    # guiclass prefix of listeners from jmeter-plugins, all of which are graphs
+    GUI_ONLY_LISTENER_PREFIX = "kg.apc.jmeter.vizualizers."
+    DEBUG_ELEMENTS = ["DebugSampler", "DebugPostProcessor"]
+    STEPPING_THREAD_GROUP = "kg.apc.jmeter.threads.SteppingThreadGroup"
+    CONCURRENCY_THREAD_GROUP = "com.blazemeter.jmeter.threads.concurrency.ConcurrencyThreadGroup"
+    LOAD_PROFILE_KEYS = ["threads", "scale", "ramp-up", "loops", "duration", "steps"]
+    # access to property 'props' in scripts that neither reads nor depends on the key
+    PROPS_WRITE_METHODS = ["put", "setProperty", "remove"]
+    PROPS_READ_METHODS = ["get", "getProperty"]
+    # properties read through JMeterUtils in scripts, keys are not analyzed
+    JMETER_UTILS_PROPERTY_PATTERN = re.compile(
+        r"\bJMeterUtils\s*\.\s*(getProperty|getPropDefault|getJMeterProperties)\b|\bgetPropDefault\s*\("
+    )
+    # thread groups run by JMeter in main phase, setUp and tearDown thread groups excluded
+    THREAD_GROUPS = [
+        "ThreadGroup",
+        STEPPING_THREAD_GROUP,
+        CONCURRENCY_THREAD_GROUP,
+        "kg.apc.jmeter.threads.UltimateThreadGroup",
+        "com.blazemeter.jmeter.threads.arrivals.ArrivalsThreadGroup",
+        "com.blazemeter.jmeter.threads.arrivals.FreeFormArrivalsThreadGroup"
+    ]
+    # minimal fields saved by listeners kept in CI mode, all other fields are set to false
+    MINIMAL_SAVE_CONFIG = {
+        "time": "true",
+        "latency": "true",
+        "timestamp": "true",
+        "success": "true",
+        "label": "true",
+        "code": "true",
+        "threadName": "true",
+        "bytes": "true",
+        "threadCounts": "true",
+        "fieldNames": "true",
+        "xml": "false",
+        "assertionsResultsToSave": "0"
+    }
+
     def __init__(self, test_plan):
         """
         Init a test plan.
@@ -46,9 +103,9 @@ class TestPlan(object):
 
         hash_trees = self.tree.xpath(".//HTTPSamplerProxy/following-sibling::hashTree[1]")
 
-        for hash_tree in hash_trees:
+        for index, hash_tree in enumerate(hash_trees):
             # fist http requests is preheat interface, no need to upload monitoring
-            if hash_trees.index(hash_tree) == 0:
+            if index == 0:
                 continue
 
             # add one sub-elements
@@ -73,6 +130,379 @@ class TestPlan(object):
             cache_key = ET.SubElement(jsr223_tree, "stringProp", attrib={"name": "cacheKey"})
             cache_key.text = "true"
 
+    def add_backend_listener(self, jenkins_job_name, influxdb_url, percentiles="90;95;99", queue_size=5000):
+        """
+        Add one BackendListener to the test plan level to support monitoring.
+
+        Unlike add_jsr223listener_to_each_http_request, metrics are aggregated by JMeter and sent in batches from
+        a background thread, so the overhead does not grow with count of samples or threads.
+        The flush interval is controlled by JMeter property 'backend_influxdb.send_interval'.
+
+        :param jenkins_job_name: name of Jenkins job, used as application name of the metrics
+        :param influxdb_url: url metrics are sent to, in InfluxDB line protocol
+        :param percentiles: percentiles to send, separated by ';'
+        :param queue_size: size of the queue between samplers and the sending thread
+        """
+        jmeter_test_plan = self.tree.getroot()
+
+        if jmeter_test_plan.get("backend-monitored"):
+            logger.debug("BackendListener has added to test plan, skip")
+            return
+        else:
+            jmeter_test_plan.set("backend-monitored", "true")
+
+        # elements directly under test plan are children of the second level hashTree
+        test_plan_hash_tree = self.tree.find("./hashTree/hashTree")
+
+        backend_listener = ET.SubElement(test_plan_hash_tree, "BackendListener", attrib={
+            "guiclass": "BackendListenerGui",
+            "testclass": "BackendListener",
+            "testname": "Backend Listener",
+            "enabled": "true"
+        })
+        arguments = ET.SubElement(backend_listener, "elementProp", attrib={
+            "name": "arguments",
+            "elementType": "Arguments",
+            "guiclass": "ArgumentsPanel",
+            "testclass": "Arguments"
+        })
+        collection = ET.SubElement(arguments, "collectionProp", attrib={"name": "Arguments.arguments"})
+        backend_arguments = {
+            "influxdbMetricsSender": "org.apache.jmeter.visualizers.backend.influxdb.HttpMetricsSender",
+            "influxdbUrl": influxdb_url,
+            "application": jenkins_job_name,
+            "measurement": "jmeter",
+            "summaryOnly": "false",
+            "samplersRegex": ".*",
+            "percentiles": percentiles,
+            "testTitle": jenkins_job_name,
+            "eventTags": ""
+        }
+        for name, value in backend_arguments.items():
+            argument = ET.SubElement(collection, "elementProp", attrib={"name": name, "elementType": "Argument"})
+            ET.SubElement(argument, "stringProp", attrib={"name": "Argument.name"}).text = name
+            ET.SubElement(argument, "stringProp", attrib={"name": "Argument.value"}).text = value
+            ET.SubElement(argument, "stringProp", attrib={"name": "Argument.metadata"}).text = "="
+
+        classname = ET.SubElement(backend_listener, "stringProp", attrib={"name": "classname"})
+        classname.text = "org.apache.jmeter.visualizers.backend.influxdb.InfluxdbBackendListenerClient"
+        property_queue_size = ET.SubElement(backend_listener, "stringProp", attrib={"name": "QUEUE_SIZE"})
+        property_queue_size.text = str(queue_size)
+
+        # every test element must be followed by a hashTree
+        ET.SubElement(test_plan_hash_tree, "hashTree")
+
+    def optimize_for_ci(self, trim_save_config=True):
+        """
+        Make the test plan lighter for headless runs.
+
+        GUI-only listeners and debug samplers / post processors are disabled (not removed, so the plan can still be
+        opened and compared in JMeter GUI).
+        Save configs of the listeners left are rewritten to a minimal CSV field set, response data included no more.
+
+        :param trim_save_config: rewrite save configs of listeners if set True
+        """
+        disabled_count = 0
+        for result_collector in self.tree.iter("ResultCollector"):
+            guiclass = result_collector.get("guiclass", "")
+            if guiclass in self.GUI_ONLY_LISTENERS or guiclass.startswith(self.GUI_ONLY_LISTENER_PREFIX):
+                if result_collector.get("enabled") != "false":
+                    result_collector.set("enabled", "false")
+                    disabled_count += 1
+
+        for tag in self.DEBUG_ELEMENTS:
+            for element in self.tree.iter(tag):
+                if element.get("enabled") != "false":
+                    element.set("enabled", "false")
+                    disabled_count += 1
+        logger.info(f"{disabled_count} GUI-only listeners and debug elements disabled in {self.test_plan}")
+
+        if not trim_save_config:
+            return
+
+        save_configs = self.tree.xpath(
+            ".//ResultCollector[not(@enabled='false')]/objProp[name='saveConfig']/value[@class='SampleSaveConfiguration']"
+        )
+        for save_config in save_configs:
+            for field in save_config:
+                field.text = self.MINIMAL_SAVE_CONFIG.get(field.tag, "false")
+        logger.info(f"{len(save_configs)} save configs trimmed in {self.test_plan}")
+
+    @staticmethod
+    def _set_string_prop(element, name, value):
+        """Set text of sub-element <stringProp name={name}>, the sub-element is created if not exist."""
+        string_prop = element.find(f"stringProp[@name='{name}']")
+        if string_prop is None:
+            string_prop = ET.SubElement(element, "stringProp", attrib={"name": name})
+        string_prop.text = str(value)
+
+    @staticmethod
+    def _get_int_prop(element, name, default):
+        """Return value of sub-element named {name} as int, default returned if not exist or not a number."""
+        prop = element.find(f"*[@name='{name}']")
+        try:
+            return int(prop.text)
+        except (AttributeError, TypeError, ValueError):
+            return default
+
+    def _scaled_threads(self, element, name, profile):
+        """Return thread count set by profile, either absolute by 'threads' or relative by 'scale'."""
+        if "threads" in profile:
+            return int(profile["threads"])
+        return max(1, round(self._get_int_prop(element, name, 1) * profile["scale"]))
+
+    def _apply_load_profile_to_thread_group(self, thread_group, profile):
+        """Apply load profile to one standard ThreadGroup."""
+        if "threads" in profile or "scale" in profile:
+            self._set_string_prop(thread_group, "ThreadGroup.num_threads",
+                                  self._scaled_threads(thread_group, "ThreadGroup.num_threads", profile))
+        if "ramp-up" in profile:
+            self._set_string_prop(thread_group, "ThreadGroup.ramp_time", profile["ramp-up"])
+        if "loops" in profile:
+            loop_controller = thread_group.find("elementProp[@name='ThreadGroup.main_controller']")
+            if loop_controller is None:
+                loop_controller = ET.SubElement(thread_group, "elementProp", attrib={
+                    "name": "ThreadGroup.main_controller",
+                    "elementType": "LoopController",
+                    "guiclass": "LoopControlPanel",
+                    "testclass": "LoopController"
+                })
+            loops = loop_controller.find("*[@name='LoopController.loops']")
+            if loops is not None:
+                loop_controller.remove(loops)
+            self._set_string_prop(loop_controller, "LoopController.loops", profile["loops"])
+        if "duration" in profile:
+            scheduler = thread_group.find("boolProp[@name='ThreadGroup.scheduler']")
+            if scheduler is None:
+                scheduler = ET.SubElement(thread_group, "boolProp", attrib={"name": "ThreadGroup.scheduler"})
+            scheduler.text = "true"
+            self._set_string_prop(thread_group, "ThreadGroup.duration", profile["duration"])
+
+    def _apply_load_profile_to_stepping_thread_group(self, thread_group, profile):
+        """Apply load profile to one jmeter-plugins Stepping Thread Group."""
+        old_threads = self._get_int_prop(thread_group, "ThreadGroup.num_threads", 1)
+        old_start_users_count = self._get_int_prop(thread_group, "Start users count", old_threads)
+        steps = profile.get("steps", -(-old_threads // max(old_start_users_count, 1)))
+        threads = old_threads
+        if "threads" in profile or "scale" in profile:
+            threads = self._scaled_threads(thread_group, "ThreadGroup.num_threads", profile)
+            self._set_string_prop(thread_group, "ThreadGroup.num_threads", threads)
+        # keep the count of steps, so more threads means more threads started in each step
+        self._set_string_prop(thread_group, "Start users count", max(1, -(-threads // steps)))
+        if "ramp-up" in profile:
+            self._set_string_prop(thread_group, "Start users period", max(1, int(profile["ramp-up"]) // steps))
+        if "duration" in profile:
+            self._set_string_prop(thread_group, "flighttime", profile["duration"])
+
+    def _apply_load_profile_to_concurrency_thread_group(self, thread_group, profile):
+        """Apply load profile to one jmeter-plugins Concurrency Thread Group."""
+        if "threads" in profile or "scale" in profile:
+            self._set_string_prop(thread_group, "TargetLevel",
+                                  self._scaled_threads(thread_group, "TargetLevel", profile))
+        if "ramp-up" in profile or "duration" in profile:
+            # RampUp and Hold share one Unit, profile is in seconds, so the one not in profile is converted too
+            unit = thread_group.find("stringProp[@name='Unit']")
+            if unit is not None and unit.text == "M":
+                for name in ["RampUp", "Hold"]:
+                    minutes = self._get_int_prop(thread_group, name, None)
+                    if minutes is not None:
+                        self._set_string_prop(thread_group, name, minutes * 60)
+            self._set_string_prop(thread_group, "Unit", "S")
+        if "ramp-up" in profile:
+            self._set_string_prop(thread_group, "RampUp", profile["ramp-up"])
+        if "steps" in profile:
+            self._set_string_prop(thread_group, "Steps", profile["steps"])
+        if "loops" in profile:
+            self._set_string_prop(thread_group, "Iterations", "" if int(profile["loops"]) < 0 else profile["loops"])
+        if "duration" in profile:
+            self._set_string_prop(thread_group, "Hold", profile["duration"])
+
+    def apply_load_profile(self, profile: dict):
+        """
+        Rewrite load parameters of every thread group, setUp and tearDown thread groups are not touched.
+
+        Thread Group, Stepping Thread Group and Concurrency Thread Group are supported.
+        Keys of the profile (all optional):
+            threads: count of threads (target concurrency)
+            scale: multiply current count of threads by this factor, ignored if 'threads' set
+            ramp-up: seconds to start all threads
+            loops: loop count of each thread, -1 means forever
+            duration: seconds to run (hold load)
+            steps: count of steps to start all threads, for Stepping and Concurrency Thread Group only
+
+        :param profile: a dict, for example {"threads": 200, "ramp-up": 60, "duration": 600}
+        """
+        unknown_keys = set(profile.keys()) - set(self.LOAD_PROFILE_KEYS)
+        if unknown_keys:
+            raise ValueError(f"Unknown keys {unknown_keys} in load profile, can only be {self.LOAD_PROFILE_KEYS}")
+
+        for thread_group in self.tree.iter("ThreadGroup"):
+            self._apply_load_profile_to_thread_group(thread_group, profile)
+        for thread_group in self.tree.iter(self.STEPPING_THREAD_GROUP):
+            self._apply_load_profile_to_stepping_thread_group(thread_group, profile)
+        for thread_group in self.tree.iter(self.CONCURRENCY_THREAD_GROUP):
+            self._apply_load_profile_to_concurrency_thread_group(thread_group, profile)
+        logger.info(f"load profile {profile} applied to {self.test_plan}")
+
+    @staticmethod
+    def _parse_count(text):
+        """
+        Parse count such as thread count, which may be a number or a property function with default value,
+        for example ${__P(threads,10)} or ${__property(threads,,10)}. 1 is returned if no number can be found.
+        """
+        text = (text or "").strip()
+        if text.isdigit():
+            return int(text)
+        matched = re.search(r"\$\{__P\([^,)]+,\s*(\d+)|\$\{__property\([^,)]+,[^,)]*,\s*(\d+)", text)
+        return int(matched.group(1) or matched.group(2)) if matched else 1
+
+    def count_threads(self) -> int:
+        """Return count of threads of all enabled thread groups, which would run concurrently at most."""
+        threads = 0
+        for tag in self.THREAD_GROUPS:
+            for thread_group in self.tree.iter(tag):
+                if thread_group.get("enabled") == "false":
+                    continue
+                prop_name = "TargetLevel" if tag == self.CONCURRENCY_THREAD_GROUP else "ThreadGroup.num_threads"
+                prop = thread_group.find(f"*[@name='{prop_name}']")
+                threads += self._parse_count(prop.text if prop is not None else None)
+        return threads
+
+    def count_samplers(self) -> int:
+        """Return count of enabled samplers."""
+        return sum(
+            1 for element in self.tree.iter(tag=ET.Element)
+            if (element.tag.endswith("Sampler") or element.tag.endswith("SamplerProxy"))
+            and element.get("enabled") != "false"
+        )
+
+    @staticmethod
+    def _function_calls(text, function_name) -> list:
+        """
+        Find every call of JMeter function in text and return the arguments.
+
+        For example, _function_calls("${__P(foo,1)}-${__P(bar.${id})}", "__P") returns [["foo", "1"], ["bar.${id}"]].
+        Nested calls are returned too.
+        """
+        calls = []
+        start_token = "${" + function_name + "("
+        start = text.find(start_token)
+        while start != -1:
+            i = start + len(start_token)
+            depth = 0
+            arguments = []
+            current = ""
+            while i < len(text):
+                char = text[i]
+                if char == "\\":
+                    # commas in arguments are escaped as '\,'
+                    current += text[i:i + 2]
+                    i += 2
+                    continue
+                if char in "({":
+                    depth += 1
+                elif char in ")}":
+                    if depth == 0:
+                        break
+                    depth -= 1
+                elif char == "," and depth == 0:
+                    arguments.append(current.strip())
+                    current = ""
+                    i += 1
+                    continue
+                current += char
+                i += 1
+            arguments.append(current.strip())
+            calls.append(arguments)
+            # search from inside the arguments, so nested calls are found too
+            start = text.find(start_token, start + len(start_token))
+        return calls
+
+    @staticmethod
+    def _key_to_pattern(key):
+        """
+        Convert a property key to regular expression, parts referring to variables or functions become wildcards.
+
+        For example, "device.${model}.cid" returns "device\\..*\\.cid".
+        """
+        pattern = ""
+        i = 0
+        while i < len(key):
+            if key.startswith("${", i):
+                depth = 0
+                while i < len(key):
+                    if key[i] == "{":
+                        depth += 1
+                    elif key[i] == "}":
+                        depth -= 1
+                        if depth == 0:
+                            break
+                    i += 1
+                pattern += ".*"
+            else:
+                pattern += re.escape(key[i])
+            i += 1
+        return pattern
+
+    def referenced_properties(self) -> dict:
+        """
+        Find JMeter properties referenced by the test plan.
+
+        Properties are referenced by functions ${__P(key)} / ${__property(key)}, or by 'props' in scripts.
+        Keys containing variables or functions are dynamic, which are recorded as regular expressions.
+        If properties can be referenced in a way cannot be analyzed, for example script files, 'props' accessed
+        with computed keys or JMeterUtils.getProperty() / getPropDefault(), the result is marked as incomplete.
+
+        returns as:
+            {
+                "keys": {"foo": False, "bar": True},  # key -> True if default value provided
+                "patterns": ["device\\..*\\.cid"],
+                "complete": True
+            }
+        """
+        keys = {}
+        patterns = set()
+        complete = True
+
+        def add_key(key, has_default):
+            if "${" in key:
+                patterns.add(self._key_to_pattern(key))
+            elif key:
+                keys[key] = keys.get(key, False) or has_default
+
+        for element in self.tree.iter(tag=ET.Element):
+            if element.tag.startswith("JSR223") or element.tag.startswith("BeanShell"):
+                filename = element.find("stringProp[@name='filename']")
+                if filename is not None and filename.text:
+                    logger.debug(f"script file {filename.text} referred, properties used cannot be analyzed")
+                    complete = False
+
+            text = element.text
+            if not text or not any(word in text for word in ["__P", "__property", "props", "getProp"]):
+                continue
+            matched = self.JMETER_UTILS_PROPERTY_PATTERN.search(text)
+            if matched:
+                logger.debug(f"'{matched.group(0)}' found, properties used cannot be analyzed")
+                complete = False
+            for arguments in self._function_calls(text, "__P"):
+                add_key(arguments[0], len(arguments) > 1)
+            for arguments in self._function_calls(text, "__property"):
+                add_key(arguments[0], len(arguments) > 2 and arguments[2] != "")
+            # key is only taken if it is a string literal as the whole first argument, e.g. not props.get("a" + b);
+            # 'props' used otherwise (props["a"], props.a, passed to a method, ...) cannot be analyzed
+            pattern = r"\bprops\b(?:\s*\.\s*(\w+)\s*\(\s*(?:(['\"])([^'\"]*)\2\s*[,)])?)?"
+            for matched in re.finditer(pattern, text):
+                method, key = matched.group(1), matched.group(3)
+                if method in self.PROPS_WRITE_METHODS:
+                    continue
+                if method in self.PROPS_READ_METHODS and key is not None:
+                    add_key(key, False)
+                else:
+                    logger.debug(f"'{matched.group(0)}' found, properties used cannot be analyzed")
+                    complete = False
+
+        return {"keys": keys, "patterns": sorted(patterns), "complete": complete}
+
     def set_on_sample_error(self, value):
         """Set on_sample_error."""
         if value not in ["continue", "stopthread"]:
@@ -82,6 +512,46 @@ class TestPlan(object):
             property_on_sampler_error = thread_group.find("stringProp[@name='ThreadGroup.on_sample_error']")
             property_on_sampler_error.text = value
 
+    def split_by_thread_groups(self, thread_groups_per_plan=1) -> list:
+        """
+        Split the test plan into standalone test plans, each one contains only some of the thread groups.
+
+        Elements directly under test plan other than thread groups (config elements, listeners, setUp / tearDown
+        thread groups, ...) and user defined variables of test plan are kept in every new test plan.
+        Disabled thread groups are dropped.
+        New test plans are saved in the same directory as original one (so relative paths such as CSV data files
+        still work), named as {name}-part{n}.jmx.
+
+        :param thread_groups_per_plan: count of thread groups in each new test plan
+        :return: list of full path of new test plans, or [self.test_plan] if no need to split
+        """
+        test_plan_hash_tree = self.tree.find("./hashTree/hashTree")
+        children = list(test_plan_hash_tree)
+        thread_group_indexes = [
+            i for i, child in enumerate(children) if child.tag in self.THREAD_GROUPS
+        ]
+        enabled_indexes = [i for i in thread_group_indexes if children[i].get("enabled") != "false"]
+        if len(enabled_indexes) <= thread_groups_per_plan:
+            logger.debug(f"only {len(enabled_indexes)} thread groups in {self.test_plan}, no need to split")
+            return [self.test_plan]
+
+        stem, extension = os.path.splitext(self.test_plan)
+        new_test_plans = []
+        for part, start in enumerate(range(0, len(enabled_indexes), thread_groups_per_plan), 1):
+            kept_indexes = set(enabled_indexes[start:start + thread_groups_per_plan])
+            new_tree = copy.deepcopy(self.tree)
+            new_children = list(new_tree.find("./hashTree/hashTree"))
+            for i in thread_group_indexes:
+                if i not in kept_indexes:
+                    # remove thread group together with the hashTree holding its children
+                    new_children[i].getparent().remove(new_children[i])
+                    new_children[i + 1].getparent().remove(new_children[i + 1])
+            new_test_plan = f"{stem}-part{part}{extension}"
+            new_tree.write(new_test_plan, encoding="utf-8", xml_declaration=True, pretty_print=True)
+            new_test_plans.append(new_test_plan)
+        logger.info(f"{self.test_plan} was split into {len(new_test_plans)} test plans: {new_test_plans}")
+        return new_test_plans
+
     def save(self, out_file):
         """
         Save tree to file.
@@ -0,0 +1,254 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+import json
+import os
+import secrets
+import threading
+import time
+
+from loguru import logger
+
+import settings
+
+# format of log files with trace id, so lines of one sync can be grepped across worker processes
+LOG_FORMAT = "{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <8} | {extra[trace_id]} | {name}:{function}:{line} - {message}"
+logger.configure(extra={"trace_id": "-"})
+
+# OpenTelemetry span kind and status codes
+SPAN_KIND_INTERNAL = 1
+STATUS_CODE_OK = 1
+STATUS_CODE_ERROR = 2
+
+
+class Span(object):
+    """Class representing one operation of a trace, started and ended by Tracer.span()."""
+
+    def __init__(self, name, trace_id, parent_span_id=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.attributes = dict(attributes or {})
+        self.start_time = time.time_ns()
+        self.end_time = None
+        self.error = None
+
+    @property
+    def context(self) -> dict:
+        """Context passed as parent to spans in other threads or processes, can be pickled."""
+        return {"trace_id": self.trace_id, "span_id": self.span_id}
+
+    def set_attributes(self, **attributes):
+        self.attributes.update(attributes)
+
+    @staticmethod
+    def _otel_value(value) -> dict:
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        if isinstance(value, (list, tuple, set)):
+            return {"arrayValue": {"values": [Span._otel_value(v) for v in value]}}
+        return {"stringValue": str(value)}
+
+    @staticmethod
+    def otel_attributes(attributes) -> list:
+        return [{"key": key, "value": Span._otel_value(value)} for key, value in attributes.items()]
+
+    def to_otel(self) -> dict:
+        """Return span in OTLP/JSON shape."""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(self.start_time),
+            "endTimeUnixNano": str(self.end_time),
+            "attributes": self.otel_attributes(self.attributes),
+            "status": {"code": STATUS_CODE_ERROR, "message": self.error} if self.error else {"code": STATUS_CODE_OK}
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+class Tracer(object):
+    """
+    Class representing a tracer which exports ended spans to a local JSON-lines file.
+
+    Each line is an OTLP/JSON ExportTraceServiceRequest holding one span (the format of file exporter of
+    OpenTelemetry Collector), so the file can be replayed to any OpenTelemetry backend.
+
+    Current span is kept in a context variable, so nested spans in one thread are linked automatically.
+    Threads and Pool workers do not inherit it, pass span.context explicitly and use it as parent:
+
+        with tracer.span("make_snapshot") as span:
+            pool.apply_async(download, args=(namespace_id, span.context))
+    """
+
+    def __init__(self, service_name=settings.TRACING_SERVICE_NAME, trace_file=settings.TRACE_FILE,
+                 enabled=settings.TRACING_ENABLED, max_bytes=settings.TRACE_FILE_MAX_BYTES):
+        """
+        Init a tracer.
+
+        :param service_name: service.name of resource
+        :param trace_file: JSON-lines file spans are appended to
+        :param enabled: spans are still created but never exported if set to False
+        :param max_bytes: trace file is renamed to {trace_file}.1 when larger than this
+        """
+        self.service_name = service_name
+        self.trace_file = trace_file
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self._current = ContextVar("current_span", default=None)
+        self._lock = threading.Lock()
+        self._export_failed = False
+        os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        """A lock held by another thread when forking is never released in the child."""
+        self._lock = threading.Lock()
+
+    def current_span(self):
+        return self._current.get()
+
+    def current_context(self):
+        """Return context of current span, None if no span is active."""
+        span = self._current.get()
+        return span.context if span else None
+
+    @contextmanager
+    def span(self, name, parent=None, new_trace=False, **attributes):
+        """
+        Start a span, which is ended and exported when the block exits.
+
+        :param name: name of the operation
+        :param parent: context of parent span (Span.context), current span of this thread if not set
+        :param new_trace: start a new trace even if there is a current span
+        :param attributes: attributes of the span, more can be set by span.set_attributes()
+        """
+        if new_trace:
+            parent = None
+        elif parent is None:
+            parent = self.current_context()
+        trace_id = parent["trace_id"] if parent else secrets.token_hex(16)
+        span = Span(name, trace_id, parent["span_id"] if parent else None, {
+            "thread.name": threading.current_thread().name,
+            **attributes
+        })
+        token = self._current.set(span)
+        try:
+            with logger.contextualize(trace_id=trace_id):
+                yield span
+        except BaseException as e:
+            span.error = repr(e)
+            raise
+        finally:
+            self._current.reset(token)
+            span.end_time = time.time_ns()
+            self._export(span)
+
+    def _export(self, span: Span):
+        """Append span to trace file, failures are logged once and never raised to the traced operation."""
+        if not self.enabled:
+            return
+        line = json.dumps({"resourceSpans": [{
+            "resource": {"attributes": Span.otel_attributes({
+                "service.name": self.service_name,
+                "process.pid": os.getpid()
+            })},
+            "scopeSpans": [{"scope": {"name": "nacos-jmeter"}, "spans": [span.to_otel()]}]
+        }]}, ensure_ascii=False) + "\n"
+        try:
+            with self._lock:
+                Path(os.path.dirname(self.trace_file)).mkdir(parents=True, exist_ok=True)
+                if os.path.exists(self.trace_file) and os.path.getsize(self.trace_file) > self.max_bytes:
+                    os.replace(self.trace_file, f"{self.trace_file}.1")
+                # one write of a line in append mode, so lines of worker processes do not interleave
+                with open(self.trace_file, "a", encoding="utf-8") as f:
+                    f.write(line)
+        except OSError as e:
+            if not self._export_failed:
+                logger.warning(f"Failed to export spans to {self.trace_file}: {e!r}")
+            self._export_failed = True
+
+
+def _from_otel_value(value):
+    kind, content = next(iter(value.items()))
+    if kind == "intValue":
+        return int(content)
+    if kind == "arrayValue":
+        return [_from_otel_value(v) for v in content.get("values", [])]
+    return content
+
+
+def load_spans(trace_file) -> list:
+    """
+    Load spans exported by Tracer, rotated file is read too.
+
+    :return: list of spans as dicts with keys trace_id, span_id, parent_span_id, name, start, end (in seconds),
+             attributes, status and pid
+    """
+    spans = []
+    for file_name in [f"{trace_file}.1", trace_file]:
+        if not os.path.exists(file_name):
+            continue
+        with open(file_name, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                for resource_spans in json.loads(line)["resourceSpans"]:
+                    resource = {a["key"]: _from_otel_value(a["value"])
+                                for a in resource_spans["resource"]["attributes"]}
+                    for scope_spans in resource_spans["scopeSpans"]:
+                        for span in scope_spans["spans"]:
+                            spans.append({
+                                "trace_id": span["traceId"],
+                                "span_id": span["spanId"],
+                                "parent_span_id": span.get("parentSpanId"),
+                                "name": span["name"],
+                                "start": int(span["startTimeUnixNano"]) / 1e9,
+                                "end": int(span["endTimeUnixNano"]) / 1e9,
+                                "attributes": {a["key"]: _from_otel_value(a["value"]) for a in span["attributes"]},
+                                "status": span["status"],
+                                "pid": resource.get("process.pid")
+                            })
+    return spans
+
+
+def critical_path(spans, root_span_id) -> list:
+    """
+    Return spans on the critical path under a root span, in the order they run.
+
+    Walking back from the end of a span, the child ending last is on the critical path, then the child ending last
+    before that one started, and so on. Children running in parallel with them are off the path.
+
+    :param spans: spans of one trace, as returned by load_spans()
+    :param root_span_id: id of span to start from
+    :return: list of (depth, span)
+    """
+    by_id = {span["span_id"]: span for span in spans}
+    children = {}
+    for span in spans:
+        children.setdefault(span["parent_span_id"], []).append(span)
+
+    def walk(span, depth):
+        on_path = []
+        cursor = span["end"]
+        for child in sorted(children.get(span["span_id"], []), key=lambda s: s["end"], reverse=True):
+            if child["end"] <= cursor:
+                on_path.append(child)
+                cursor = child["start"]
+        result = [(depth, span)]
+        for child in reversed(on_path):
+            result += walk(child, depth + 1)
+        return result
+
+    return walk(by_id[root_span_id], 0)
+
+
+# tracer of this process, shared by syncers and the modules they use
+tracer = Tracer()
@@ -0,0 +1,43 @@
+import os
+import sys
+import tempfile
+sys.path.append("../nacos-jmeter")
+
+import requests
+
+from backendreceiver import BackendReceiver
+from testplan import TestPlan
+
+JMX = """<?xml version="1.0" encoding="UTF-8"?>
+<jmeterTestPlan version="1.2" properties="5.0" jmeter="5.4.1">
+  <hashTree>
+    <TestPlan guiclass="TestPlanGui" testclass="TestPlan" testname="Test Plan" enabled="true"/>
+    <hashTree>
+      <ThreadGroup guiclass="ThreadGroupGui" testclass="ThreadGroup" testname="Thread Group" enabled="true"/>
+      <hashTree>
+        <HTTPSamplerProxy guiclass="HttpTestSampleGui" testclass="HTTPSamplerProxy" testname="a" enabled="true"/>
+        <hashTree/>
+        <HTTPSamplerProxy guiclass="HttpTestSampleGui" testclass="HTTPSamplerProxy" testname="b" enabled="true"/>
+        <hashTree/>
+      </hashTree>
+    </hashTree>
+  </hashTree>
+</jmeterTestPlan>
+"""
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp_dir, BackendReceiver() as receiver:
+        jmx = os.path.join(tmp_dir, "plan.jmx")
+        with open(jmx, "w", encoding="utf-8") as f:
+            f.write(JMX)
+
+        t = TestPlan(jmx)
+        t.add_backend_listener("smokeTest-Core400SUS-ci", receiver.url)
+        t.add_backend_listener("smokeTest-Core400SUS-ci", receiver.url)
+        t.save(jmx)
+        assert len(TestPlan(jmx).tree.findall(".//BackendListener")) == 1
+
+        requests.post(receiver.url, data="jmeter,application=smokeTest-Core400SUS-ci,transaction=all "
+                                         "count=2i,avg=10.5 1600000000000000000\n")
+        assert receiver.request_count == 1
+        assert receiver.points[0]["fields"] == {"count": 2, "avg": 10.5}, receiver.points
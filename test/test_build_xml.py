@@ -0,0 +1,112 @@
+import json
+import os
+import sys
+import tempfile
+import xml.etree.ElementTree as ET
+sys.path.append("../nacos-jmeter")
+
+from benchmark import generate_jmx, generate_snapshot
+from builder import Builder
+from testplan import TestPlan
+import settings
+
+
+def generate_build_xml(tmp_dir, job_config, plan_threads: dict, split=None) -> (Builder, ET.ElementTree):
+    """
+    Generate build.xml of job perfTest-ci running synthetic test plans.
+
+    :param job_config: object assigned to the job in nacos.jmeter.test-plan, test plans are filled in
+    :param plan_threads: dict as {test plan: threads of each of its 4 thread groups}
+    :param split: thread groups in each test plan split from original one, no splitting if None
+    """
+    snapshot_base = os.path.join(tmp_dir, "snapshot")
+    test_plan_base_dir = os.path.join(tmp_dir, "repo")
+    workspace = os.path.join(tmp_dir, "workspace")
+    jmeter_home = os.path.join(tmp_dir, "jmeter")
+    for directory in [workspace, jmeter_home]:
+        os.makedirs(directory, exist_ok=True)
+    generate_snapshot(snapshot_base, 10)
+    relationship_file = os.path.join(snapshot_base, "+".join([settings.JENKINS_JMX_RELATIONSHIP_DATA_ID,
+                                                              settings.JENKINS_JMX_RELATIONSHIP_GROUP,
+                                                              settings.JENKINS_JMX_RELATIONSHIP_NAMESPACE_ID]))
+    with open(relationship_file, "w", encoding="utf-8") as f:
+        json.dump({"perfTest": {**job_config, "testplans": list(plan_threads)}}, f)
+
+    build = Builder("perfTest-ci", snapshot_base)
+    build.sample_build_xml = os.path.join(settings.PROJECT_ROOT, "resources", "build_template.xml")
+    for test_plan, threads in plan_threads.items():
+        jmx = os.path.join(test_plan_base_dir, test_plan)
+        generate_jmx(jmx, samplers=8, thread_groups=4)
+        test_plan_instance = TestPlan(jmx)
+        test_plan_instance.apply_load_profile({"threads": threads})
+        test_plan_instance.save(jmx)
+        if split:
+            split_test_plans = test_plan_instance.split_by_thread_groups(split)
+            build.set_split_test_plans(test_plan, [os.path.relpath(p, test_plan_base_dir) for p in split_test_plans])
+    build_xml = os.path.join(workspace, "build.xml")
+    build.generate_new_build_xml(workspace, jmeter_home, "perf", test_plan_base_dir, build_xml)
+    return build, ET.parse(build_xml)
+
+
+def heap_of(jmeter_element):
+    """Return heap size (MB) set by -Xmx, None if not set."""
+    xmx = [a.get("value") for a in jmeter_element.findall("jvmarg") if a.get("value").startswith("-Xmx")]
+    return int(xmx[0][4:-1]) if xmx else None
+
+
+if __name__ == "__main__":
+    assert Builder.max_concurrent_runs([]) == 1
+    assert Builder.max_concurrent_runs([4096, 4096, 4096]) == 3
+    assert Builder.max_concurrent_runs([8192, 4096, 512, 512]) == 2
+    assert Builder.max_concurrent_runs([settings.AGENT_MEMORY_BUDGET_MB * 2]) == 1
+
+    # parallel: one <parallel> bounded by memory budget
+    with tempfile.TemporaryDirectory() as tmp:
+        _, tree = generate_build_xml(tmp, {"parallel": True}, {f"plans/plan-{i}.jmx": 100 for i in range(4)})
+        parallel = tree.find("target[@name='run']/parallel")
+        runs = parallel.findall("jmeter")
+        assert len(runs) == 4
+        assert int(parallel.get("threadCount")) == Builder.max_concurrent_runs([heap_of(r) for r in runs]) == 4
+
+    # split, not parallel: parts of one test plan run in parallel, bounded by processors and memory budget
+    with tempfile.TemporaryDirectory() as tmp:
+        _, tree = generate_build_xml(tmp, {}, {"plans/plan-0.jmx": 600, "plans/plan-1.jmx": 10}, split=1)
+        groups = tree.findall("target[@name='run']/parallel")
+        assert [len(g.findall("jmeter")) for g in groups] == [4, 4]
+        for group in groups:
+            heaps = [heap_of(r) for r in group.findall("jmeter")]
+            assert int(group.get("threadCount")) == min(os.cpu_count(), Builder.max_concurrent_runs(heaps))
+            assert group.get("threadsPerProcessor") is None
+
+    # heap of test plans in parallel scaled down together to fit the budget: 8 * 1856MB -> 8 * 1536MB
+    with tempfile.TemporaryDirectory() as tmp:
+        build, tree = generate_build_xml(tmp, {"parallel": True}, {f"plans/plan-{i}.jmx": 100 for i in range(8)})
+        parallel = tree.find("target[@name='run']/parallel")
+        assert [heap_of(r) for r in parallel.findall("jmeter")] == [1536] * 8
+        assert parallel.get("threadCount") == "8"
+
+    budget = settings.AGENT_MEMORY_BUDGET_MB
+    try:
+        # still over budget at minimum heap: fewer runs at the same time
+        settings.AGENT_MEMORY_BUDGET_MB = 1536
+        with tempfile.TemporaryDirectory() as tmp:
+            _, tree = generate_build_xml(tmp, {"parallel": True}, {f"plans/plan-{i}.jmx": 1 for i in range(4)})
+            parallel = tree.find("target[@name='run']/parallel")
+            assert [heap_of(r) for r in parallel.findall("jmeter")] == [settings.JMETER_HEAP_MIN_MB] * 4
+            assert parallel.get("threadCount") == "3"
+
+        # heap of a single run never exceeds the budget
+        settings.AGENT_MEMORY_BUDGET_MB = 1024
+        with tempfile.TemporaryDirectory() as tmp:
+            _, tree = generate_build_xml(tmp, {}, {"plans/plan-0.jmx": 100})
+            assert [heap_of(r) for r in tree.findall("target[@name='run']/jmeter")] == [1024]
+    finally:
+        settings.AGENT_MEMORY_BUDGET_MB = budget
+
+    # distributed mode: local JMeter is only the controller, no heap sized
+    with tempfile.TemporaryDirectory() as tmp:
+        build, tree = generate_build_xml(tmp, {"remote-hosts": ["10.0.0.1", "10.0.0.2"]},
+                                         {f"plans/plan-{i}.jmx": 1000 for i in range(8)})
+        runs = tree.findall("target[@name='run']/jmeter")
+        assert len(runs) == 8 and all(heap_of(r) is None for r in runs)
+        assert build._heap_sizes(os.path.join(tmp, "repo")) == {}
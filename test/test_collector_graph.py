@@ -0,0 +1,29 @@
+import os
+import sys
+import tempfile
+sys.path.append("../nacos-jmeter")
+
+from collector import Collector
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as snapshot_base:
+        for file_name in ["foo+SHARED+cross-env", "bar+DEVICE+env-03", "baz+DEBUG+env-01", "qux+SHARED+public",
+                          "ci+STABLE+summary", "ci+DEBUG+summary", "predeploy+STABLE+summary",
+                          "predeploy+DEBUG+summary"]:
+            with open(os.path.join(snapshot_base, file_name), "w") as f:
+                f.write("k=v\n")
+
+        c = Collector(snapshot_base)
+        graph = c.build_dependency_graph()
+        assert graph["bar+DEVICE+env-03"] == [("predeploy", False), ("predeploy", True)], graph
+        assert graph["baz+DEBUG+env-01"] == [("ci", True)], graph
+        assert len(graph["foo+SHARED+cross-env"]) == 8, graph
+        assert "qux+SHARED+public" not in graph
+
+        # summaries of testonline and production are not generated yet, so they are always affected
+        assert c.get_affected_summaries(["baz+DEBUG+env-01"], collect_for_debug=True) == [
+            ("ci", True), ("testonline", False), ("testonline", True), ("production", False), ("production", True)]
+        # file removed from snapshot
+        assert c.get_affected_summaries(["gone+DEVICE+env-03"]) == [
+            ("testonline", False), ("predeploy", False), ("production", False)]
+        assert c.get_affected_summaries(["qux+SHARED+public"]) == [("testonline", False), ("production", False)]
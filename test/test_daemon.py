@@ -0,0 +1,31 @@
+import os
+import signal
+import sys
+import threading
+import time
+sys.path.append("../nacos-jmeter")
+
+from daemon import DaemonRuntime
+
+if __name__ == "__main__":
+    # SIGTERM received while one task is running: wait for the task, then call shutdown hooks
+    runtime = DaemonRuntime("test", shutdown_timeout=10)
+    finished = []
+    runtime.add_shutdown_hook(lambda: finished.append("hook"))
+
+    def task():
+        with runtime.task("sync"):
+            time.sleep(1)
+        finished.append("task")
+
+    threading.Thread(target=task).start()
+    threading.Timer(0.2, os.kill, args=(os.getpid(), signal.SIGTERM)).start()
+    runtime.install_signal_handlers()
+    runtime.run_forever()
+    assert finished == ["task", "hook"], finished
+
+    # shutdown is bounded by timeout
+    runtime = DaemonRuntime("test", shutdown_timeout=0.5)
+    threading.Thread(target=task, daemon=True).start()
+    time.sleep(0.1)
+    assert not runtime.shutdown()
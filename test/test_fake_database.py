@@ -0,0 +1,53 @@
+import os
+import sys
+import tempfile
+sys.path.append("../nacos-jmeter")
+
+import yaml
+
+from fakedatabase import FakeVesyncDatabase
+from fakenacos import FakeNacosServer
+from nacosserver import NacosServer
+from databasesyncer import DatabaseSyncer
+import settings
+
+
+class Robot(object):
+    def __init__(self):
+        self.messages = []
+
+    def send_text(self, msg, is_at_all=False):
+        self.messages.append(msg)
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp_dir, FakeNacosServer() as fake:
+        database = FakeVesyncDatabase(os.path.join(tmp_dir, "vesync.db"), seed=0)
+        database.generate(device_types=20, firmware_versions=2)
+        database.publish_database_info(fake, settings.STAGE_TO_NAMESPACE_IDS["ci"])
+
+        database_syncer = DatabaseSyncer("ci", NacosServer(fake.host, fake.port), connect=database.connect)
+        database_info = database_syncer.get_vesync_database_info_from_nacos()
+        assert database_info["database"] == database.database_file
+
+        # latest firmware only, the second of two versions generated of each region has an even version code
+        firmware_info = database_syncer.get_data_from_table_firmware_info(database_info)
+        assert len(firmware_info) == 20
+        assert all(int(item["firmware_url"].rsplit(".", 2)[-2]) % 2 == 0 for item in firmware_info.values()), \
+            firmware_info
+
+        # first cycle publishes both tables, no notification as Nacos had no snapshot
+        robot = Robot()
+        database_syncer.sync_once(robot, database_info)
+        device_type = fake.get_config(settings.TABLE_DEVICE_TYPE_DATA_ID, settings.DATABASE_SNAPSHOT_GROUP, "env-01")
+        assert len(yaml.safe_load(device_type)) == 20 and not robot.messages
+
+        # nothing changed
+        database_syncer.sync_once(robot, database_info)
+        assert not robot.messages
+
+        assert database.mutate(0.1) == {"device_type": 2, "firmware_info": 2}
+        database_syncer.sync_once(robot, database_info)
+        assert any("device_type" in message for message in robot.messages), robot.messages
+        device_type = fake.get_config(settings.TABLE_DEVICE_TYPE_DATA_ID, settings.DATABASE_SNAPSHOT_GROUP, "env-01")
+        assert yaml.safe_load(device_type) == database_syncer.get_data_from_table_device_type(database_info)
@@ -0,0 +1,70 @@
+import sys
+import threading
+sys.path.append("../nacos-jmeter")
+
+from nacos.exception import NacosRequestException
+import nacos
+
+from fakenacos import FakeNacosServer
+from nacosserver import NacosServer
+
+
+def ignore_polling_result_eof(args):
+    """
+    Thread of NacosClient processing polling results reads the queue of puller forever and cannot be stopped, it gets
+    EOFError once the puller process is terminated. Other exceptions are reported as usual.
+    """
+    if args.exc_type is EOFError and args.thread is not None and "_process_polling_result" in args.thread.name:
+        return
+    threading.__excepthook__(args)
+
+
+if __name__ == "__main__":
+    threading.excepthook = ignore_polling_result_eof
+
+    with FakeNacosServer(seed=1) as fake:
+        assert fake.generate_dataset(namespace_count=2, configs_per_namespace=25, value_size=256) == 50
+
+        nacos_server = NacosServer(fake.host, fake.port)
+        namespaces = nacos_server.get_namespaces()
+        assert [n["namespace"] for n in namespaces] == ["", "cross-env", "env-01"], namespaces
+        assert namespaces[1]["configCount"] == 25
+
+        # paginated search
+        client = nacos.NacosClient(fake.server_address, namespace="cross-env")
+        client.set_options(no_snapshot=True)
+        page = client.get_configs(page_no=3, page_size=10)
+        assert page["totalCount"] == 25 and page["pagesAvailable"] == 3 and len(page["pageItems"]) == 5, page
+
+        # get and publish
+        assert client.publish_config("foo", "SHARED", "a=1")
+        assert client.get_config("foo", "SHARED") == "a=1"
+        assert client.get_config("not-exist", "SHARED") is None
+
+        # listener long-polling
+        changed = threading.Event()
+
+        def on_changed(params):
+            changed.set()
+
+        client.add_config_watchers("foo", "SHARED", [on_changed])
+        fake.publish_config("foo", "SHARED", "a=2", "cross-env")
+        assert changed.wait(10), "watcher is not called"
+        # puller process is terminated once its last watcher removed, before fake server stops
+        client.remove_config_watcher("foo", "SHARED", on_changed)
+        assert not client.puller_mapping
+
+        # failure injection
+        fake.fail_next(kind="config-get")
+        try:
+            client.get_config("foo", "SHARED")
+            raise AssertionError("injected failure is not raised")
+        except NacosRequestException:
+            pass
+        fake.ready = False
+        assert not nacos_server.is_nacos_online(force=True)
+        counts = fake.request_counts
+        assert counts["config-search"] == 1 and counts["config-publish"] == 1 and counts["listener"] >= 1, counts
+        # get of foo (published, injected failure), not-exist, plus the ones by puller when foo changed
+        assert counts["config-get"] >= 3 and counts["health"] >= 1, counts
+
@@ -0,0 +1,36 @@
+import os
+import random
+import sys
+import tempfile
+sys.path.append("../nacos-jmeter")
+
+from history import PerformanceHistory
+
+
+def write_jtl(jtl_file, latency):
+    """Write a XML jtl with 100 samples of label 'login' around the given latency."""
+    with open(jtl_file, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<testResults version="1.2">\n')
+        for i in range(100):
+            elapsed = int(random.gauss(latency, latency * 0.05))
+            f.write(f'<httpSample t="{elapsed}" ts="{1600000000000 + i * 100}" s="true" lb="login"/>\n')
+        f.write('</testResults>\n')
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        history = PerformanceHistory(os.path.join(tmp_dir, "history.db"))
+        jtl = os.path.join(tmp_dir, "plan.jtl")
+        for _ in range(10):
+            write_jtl(jtl, 100)
+            history.record("fullTest-Core400SUS-Cloud-API-ci", "ci", {"plan": history.aggregate_jtl(jtl)})
+        write_jtl(jtl, 200)
+        history.record("fullTest-Core400SUS-Cloud-API-ci", "ci", {"plan": history.aggregate_jtl(jtl)})
+        # a run without results is not recorded, so the regressed run is still compared
+        with open(jtl, "w", encoding="utf-8") as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n<testResults version="1.2">\n</testResults>\n')
+        assert history.record("fullTest-Core400SUS-Cloud-API-ci", "ci", {"plan": history.aggregate_jtl(jtl)}) is None
+        assert history.record("fullTest-Core400SUS-Cloud-API-ci", "ci", {}) is None
+        regressions = history.compare("fullTest-Core400SUS-Cloud-API-ci", "ci")
+        history.close()
+        assert {r["metric"] for r in regressions} == {"p95", "p99"}, regressions
@@ -0,0 +1,96 @@
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+sys.path.append("../nacos-jmeter")
+
+from jmeterserver import LocalJMeterServers
+from test_build_xml import generate_build_xml
+import settings
+
+HOSTS = ["10.0.0.1:1099", "10.0.0.2:1099"]
+
+
+def write_stage_summary(tmp_dir):
+    """Write stage summary of ci, so trimmed property files are sent to remote hosts."""
+    snapshot_base = os.path.join(tmp_dir, "snapshot")
+    Path(snapshot_base).mkdir(parents=True, exist_ok=True)
+    stage_summary = "+".join(["ci", settings.SUMMARY_GROUP_STABLE, settings.SUMMARY_NAMESPACE_ID])
+    with open(os.path.join(snapshot_base, stage_summary), "w", encoding="utf-8") as f:
+        f.write("threads=1\nconfig-000000.key=localhost\n")
+
+
+def jmeter_args(jmeter_element, prefix) -> list:
+    return [a.get("value")[2:] for a in jmeter_element.findall("jmeterarg") if a.get("value").startswith(prefix)]
+
+
+def plan_name_of(jmeter_element) -> str:
+    return os.path.basename(jmeter_element.get("testplan"))
+
+
+if __name__ == "__main__":
+    # remote mode "all": every test plan runs on all hosts, one after another
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        write_stage_summary(tmp_dir)
+        _, tree = generate_build_xml(tmp_dir, {"remote-hosts": ",".join(HOSTS)},
+                                     {f"plans/plan-{i}.jmx": 1 for i in range(3)})
+        target_run = tree.find("target[@name='run']")
+        assert target_run.find("parallel") is None
+        runs = target_run.findall("jmeter")
+        assert [plan_name_of(r) for r in runs] == ["plan-0.jmx", "plan-1.jmx", "plan-2.jmx"]
+        for run in runs:
+            assert jmeter_args(run, "-R") == [",".join(HOSTS)]
+            # trimmed property file loaded locally is sent to remote hosts
+            property_file = jmeter_args(run, "-q")[0]
+            assert jmeter_args(run, "-G") == [property_file] and property_file.endswith(".properties")
+            assert os.path.exists(property_file)
+            properties = {p.get("name"): p.get("value") for p in run.findall("property")}
+            assert properties.items() >= settings.JMETER_REMOTE_JMETER_PROPERTIES.items()
+
+    # remote mode "all" with 'parallel' or split test plans: runs sharing all hosts still never start together
+    for job_config, split in [({"parallel": True}, None), ({}, 1)]:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            write_stage_summary(tmp_dir)
+            _, tree = generate_build_xml(tmp_dir, {**job_config, "remote-hosts": HOSTS},
+                                         {f"plans/plan-{i}.jmx": 1 for i in range(2)}, split=split)
+            target_run = tree.find("target[@name='run']")
+            assert target_run.find(".//parallel") is None, job_config
+            runs = target_run.findall("jmeter")
+            assert len(runs) == (2 if split is None else 8), job_config
+            assert all(jmeter_args(r, "-R") == [",".join(HOSTS)] for r in runs)
+
+    # remote mode "split": test plans assigned to hosts in turn, each host runs its test plans one by one
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        write_stage_summary(tmp_dir)
+        _, tree = generate_build_xml(tmp_dir, {"remote-hosts": HOSTS, "remote-mode": "split", "parallel": True},
+                                     {f"plans/plan-{i}.jmx": 1 for i in range(3)})
+        target_run = tree.find("target[@name='run']")
+        assert target_run.findall("jmeter") == [] and len(target_run.findall("parallel")) == 1
+        sequentials = target_run.findall("parallel/sequential")
+        assert len(sequentials) == len(HOSTS)
+        assert [[plan_name_of(r) for r in s.findall("jmeter")] for s in sequentials] == \
+            [["plan-0.jmx", "plan-2.jmx"], ["plan-1.jmx"]]
+        for host, sequential in zip(HOSTS, sequentials):
+            for run in sequential.findall("jmeter"):
+                assert jmeter_args(run, "-R") == [host]
+                assert jmeter_args(run, "-G") == jmeter_args(run, "-q")
+
+    # run on two local JMeter servers with arguments of build.xml, only if JMeter is installed
+    jmeter = os.path.join(settings.JMETER_HOME, "bin", "jmeter")
+    if not os.path.exists(jmeter):
+        print(f"JMeter not installed at {settings.JMETER_HOME}, skip running on JMeter servers")
+        sys.exit(0)
+    with LocalJMeterServers(settings.JMETER_HOME, count=2) as servers, \
+            tempfile.TemporaryDirectory() as tmp_dir:
+        write_stage_summary(tmp_dir)
+        _, tree = generate_build_xml(tmp_dir, {"remote-hosts": servers.hosts}, {"plans/plan-0.jmx": 1})
+        run = tree.find("target[@name='run']/jmeter")
+        subprocess.run([
+            jmeter, "-n",
+            "-t", run.get("testplan"),
+            "-l", run.get("resultlog"),
+            *[a.get("value") for a in run.findall("jmeterarg")],
+            *[f"-J{p.get('name')}={p.get('value')}" for p in run.findall("property")]
+        ], check=True)
+        assert os.path.exists(run.get("resultlog")), "results are not sent back from JMeter servers"
@@ -0,0 +1,119 @@
+import os
+import sys
+import tempfile
+sys.path.append("../nacos-jmeter")
+
+from testplan import TestPlan
+
+JMX = """<?xml version="1.0" encoding="UTF-8"?>
+<jmeterTestPlan version="1.2" properties="5.0" jmeter="5.4.1">
+  <hashTree>
+    <TestPlan guiclass="TestPlanGui" testclass="TestPlan" testname="Test Plan" enabled="true"/>
+    <hashTree>
+      <ThreadGroup guiclass="ThreadGroupGui" testclass="ThreadGroup" testname="standard" enabled="true">
+        <elementProp name="ThreadGroup.main_controller" elementType="LoopController" guiclass="LoopControlPanel"
+                     testclass="LoopController">
+          <boolProp name="LoopController.continue_forever">false</boolProp>
+          <stringProp name="LoopController.loops">1</stringProp>
+        </elementProp>
+        <stringProp name="ThreadGroup.num_threads">10</stringProp>
+        <stringProp name="ThreadGroup.ramp_time">5</stringProp>
+      </ThreadGroup>
+      <hashTree/>
+      <ThreadGroup guiclass="ThreadGroupGui" testclass="ThreadGroup" testname="no loop controller" enabled="true">
+        <stringProp name="ThreadGroup.num_threads">4</stringProp>
+      </ThreadGroup>
+      <hashTree/>
+      <kg.apc.jmeter.threads.SteppingThreadGroup guiclass="kg.apc.jmeter.threads.SteppingThreadGroupGui"
+                                                 testclass="kg.apc.jmeter.threads.SteppingThreadGroup"
+                                                 testname="stepping" enabled="true">
+        <stringProp name="ThreadGroup.num_threads">10</stringProp>
+        <stringProp name="Start users count">2</stringProp>
+        <stringProp name="Start users period">30</stringProp>
+        <stringProp name="flighttime">60</stringProp>
+      </kg.apc.jmeter.threads.SteppingThreadGroup>
+      <hashTree/>
+      <com.blazemeter.jmeter.threads.concurrency.ConcurrencyThreadGroup
+          guiclass="com.blazemeter.jmeter.threads.concurrency.ConcurrencyThreadGroupGui"
+          testclass="com.blazemeter.jmeter.threads.concurrency.ConcurrencyThreadGroup" testname="concurrency"
+          enabled="true">
+        <stringProp name="TargetLevel">10</stringProp>
+        <stringProp name="RampUp">2</stringProp>
+        <stringProp name="Steps">0</stringProp>
+        <stringProp name="Hold">5</stringProp>
+        <stringProp name="Unit">M</stringProp>
+      </com.blazemeter.jmeter.threads.concurrency.ConcurrencyThreadGroup>
+      <hashTree/>
+    </hashTree>
+  </hashTree>
+</jmeterTestPlan>
+"""
+
+
+def load(tmp_dir, profile) -> TestPlan:
+    jmx = os.path.join(tmp_dir, "plan.jmx")
+    with open(jmx, "w", encoding="utf-8") as f:
+        f.write(JMX)
+    test_plan = TestPlan(jmx)
+    test_plan.apply_load_profile(profile)
+    # saved and parsed again, as JMeter reads it
+    test_plan.save(jmx)
+    return TestPlan(jmx)
+
+
+def prop(test_plan, thread_group_name, name):
+    return test_plan.tree.find(f".//*[@testname='{thread_group_name}']//*[@name='{name}']").text
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Thread Group
+        plan = load(tmp_dir, {"threads": 50, "ramp-up": 20, "loops": 3, "duration": 600})
+        assert prop(plan, "standard", "ThreadGroup.num_threads") == "50"
+        assert prop(plan, "standard", "ThreadGroup.ramp_time") == "20"
+        assert prop(plan, "standard", "LoopController.loops") == "3"
+        assert prop(plan, "standard", "ThreadGroup.scheduler") == "true"
+        assert prop(plan, "standard", "ThreadGroup.duration") == "600"
+        # loop controller created when missing
+        assert prop(plan, "no loop controller", "LoopController.loops") == "3"
+        plan = load(tmp_dir, {"scale": 2.5})
+        assert prop(plan, "standard", "ThreadGroup.num_threads") == "25"
+        assert prop(plan, "standard", "ThreadGroup.ramp_time") == "5"
+        assert prop(plan, "no loop controller", "ThreadGroup.num_threads") == "10"
+
+        # Stepping Thread Group: count of steps (10 / 2) is kept
+        plan = load(tmp_dir, {"threads": 100, "ramp-up": 50, "duration": 300})
+        assert prop(plan, "stepping", "ThreadGroup.num_threads") == "100"
+        assert prop(plan, "stepping", "Start users count") == "20"
+        assert prop(plan, "stepping", "Start users period") == "10"
+        assert prop(plan, "stepping", "flighttime") == "300"
+        plan = load(tmp_dir, {"steps": 4})
+        assert prop(plan, "stepping", "Start users count") == "3"
+
+        # Concurrency Thread Group: values of profile are seconds, so Unit is switched to seconds
+        plan = load(tmp_dir, {"scale": 3, "ramp-up": 90, "steps": 3, "loops": -1, "duration": 600})
+        assert prop(plan, "concurrency", "TargetLevel") == "30"
+        assert prop(plan, "concurrency", "RampUp") == "90"
+        assert prop(plan, "concurrency", "Steps") == "3"
+        assert (prop(plan, "concurrency", "Iterations") or "") == ""
+        assert prop(plan, "concurrency", "Hold") == "600"
+        assert prop(plan, "concurrency", "Unit") == "S"
+        # only ramp-up: hold of 5 minutes is kept as 300 seconds
+        plan = load(tmp_dir, {"ramp-up": 30})
+        assert prop(plan, "concurrency", "RampUp") == "30"
+        assert prop(plan, "concurrency", "Hold") == "300"
+        assert prop(plan, "concurrency", "Unit") == "S"
+        # only duration: ramp-up of 2 minutes is kept as 120 seconds
+        plan = load(tmp_dir, {"duration": 60})
+        assert prop(plan, "concurrency", "RampUp") == "120"
+        assert prop(plan, "concurrency", "Hold") == "60"
+        # untouched if neither set
+        plan = load(tmp_dir, {"threads": 5})
+        assert prop(plan, "concurrency", "Unit") == "M" and prop(plan, "concurrency", "Hold") == "5"
+
+        try:
+            load(tmp_dir, {"users": 5})
+        except ValueError:
+            pass
+        else:
+            assert False, "unknown keys must be rejected"
@@ -0,0 +1,100 @@
+import os
+import sys
+import tempfile
+sys.path.append("../nacos-jmeter")
+
+import nacos
+
+from fakenacos import FakeNacosServer
+from nacosserver import NacosServer
+from nacossyncer import NacosSyncer
+from test_snapshot_repo import init_remote
+from tracing import tracer
+import settings
+
+
+class ChangingNacosSyncer(NacosSyncer):
+    """Syncer whose download of cross-env namespace is always followed by a config added on Nacos."""
+
+    changes_per_download = None  # None as unlimited
+
+    def _download_all_pages(self, nacos_client, namespace_id, snapshot_base, trace_context=None):
+        result = super()._download_all_pages(nacos_client, namespace_id, snapshot_base, trace_context)
+        if namespace_id == settings.CROSS_ENV_NAMESPACE_ID and self.changes_per_download != 0:
+            client = nacos.NacosClient(self.nacos_server.server_address, namespace=namespace_id)
+            client.publish_config(f"added-{os.getpid()}-{len(os.listdir(snapshot_base))}", "SHARED", "a=1")
+            if self.changes_per_download is not None:
+                self.changes_per_download -= 1
+        return result
+
+
+def new_syncer(syncer_class, fake, tmp_dir) -> NacosSyncer:
+    remote_dir, _ = init_remote(tmp_dir, commits=1)
+    nacos_syncer = syncer_class(NacosServer(fake.host, fake.port), nacos_snapshot_repo_url=remote_dir,
+                                nacos_snapshot_repo_dir=os.path.join(tmp_dir, "syncer"),
+                                commit_history_file=os.path.join(tmp_dir, "commit.log"))
+    nacos_syncer.snapshot_page_size = 10
+    return nacos_syncer
+
+
+if __name__ == "__main__":
+    # spans of syncer are not under test, keep them out of data/trace of the project
+    tracer.enabled = False
+
+    group = settings.STAGE_PRESET_GROUPS[0]
+    cross_env_file = "+".join(["config-00000.cross-env", group, settings.CROSS_ENV_NAMESPACE_ID])
+
+    # count of configs changed once while downloading: downloaded again, removed configs are tracked
+    with FakeNacosServer(seed=0) as fake, tempfile.TemporaryDirectory() as tmp_dir:
+        fake.generate_dataset(namespace_count=2, configs_per_namespace=25)
+        nacos_syncer = new_syncer(ChangingNacosSyncer, fake, tmp_dir)
+        nacos_syncer.changes_per_download = 1
+        snapshot_base = nacos_syncer.nacos_snapshot_repo_dir
+        nacos_syncer.make_snapshot(snapshot_base, clean_base=True)
+        assert os.path.exists(os.path.join(snapshot_base, cross_env_file))
+        assert fake.request_counts["config-search"] > 2 * 3 * 2, fake.request_counts
+
+        fake.remove_config("config-00000.cross-env", group, settings.CROSS_ENV_NAMESPACE_ID)
+        changes = nacos_syncer.make_snapshot(snapshot_base, clean_base=True)
+        assert changes["removed"] == [cross_env_file], changes
+        assert not nacos_syncer.changed_namespace_ids
+
+    # count of configs keeps changing: files downloaded are kept, none of the namespace is removed
+    with FakeNacosServer(seed=0) as fake, tempfile.TemporaryDirectory() as tmp_dir:
+        fake.generate_dataset(namespace_count=2, configs_per_namespace=25)
+        nacos_syncer = new_syncer(ChangingNacosSyncer, fake, tmp_dir)
+        snapshot_base = nacos_syncer.nacos_snapshot_repo_dir
+        nacos_syncer.changes_per_download = 0
+        nacos_syncer.make_snapshot(snapshot_base, clean_base=True)
+        stage_namespace_id = list(settings.STAGE_TO_NAMESPACE_IDS.values())[0]
+        stage_file = "+".join([f"config-00000.{stage_namespace_id}", group, stage_namespace_id])
+
+        fake.remove_config("config-00000.cross-env", group, settings.CROSS_ENV_NAMESPACE_ID)
+        fake.remove_config(f"config-00000.{stage_namespace_id}", group, stage_namespace_id)
+        nacos_syncer.changes_per_download = None
+        changes = nacos_syncer.make_snapshot(snapshot_base, clean_base=True)
+        assert changes["removed"] == [stage_file], changes
+        assert os.path.exists(os.path.join(snapshot_base, cross_env_file))
+        assert any(f.startswith("added-") for f in changes["added"]), changes
+        # downloaded again next time
+        assert nacos_syncer.changed_namespace_ids == {settings.CROSS_ENV_NAMESPACE_ID}
+
+    # summaries are generated locally and published with a header, a full sync changing nothing keeps them as they are
+    with FakeNacosServer(seed=0) as fake, tempfile.TemporaryDirectory() as tmp_dir:
+        fake.generate_dataset(namespace_count=2, configs_per_namespace=25)
+        fake.add_namespace(settings.SUMMARY_NAMESPACE_ID)
+        nacos_syncer = new_syncer(NacosSyncer, fake, tmp_dir)
+        snapshot_base = nacos_syncer.nacos_snapshot_repo_dir
+        nacos_syncer.make_snapshot(snapshot_base, clean_base=True)
+        summary_file = os.path.join(snapshot_base, "+".join(["ci", settings.SUMMARY_GROUP_STABLE,
+                                                             settings.SUMMARY_NAMESPACE_ID]))
+        with open(summary_file, "wb") as f:
+            f.write(b"host=example.com\n")
+        nacos_syncer.sync_task_reason = "test: full sync"
+        assert nacos_syncer.publish_one_stage_summary("ci") > 0
+        assert fake.get_config("ci", settings.SUMMARY_GROUP_STABLE, settings.SUMMARY_NAMESPACE_ID).startswith("test")
+
+        changes = nacos_syncer.make_snapshot(snapshot_base, clean_base=True)
+        assert changes == {"added": [], "modified": [], "removed": []}, changes
+        with open(summary_file, "rb") as f:
+            assert f.read() == b"host=example.com\n"
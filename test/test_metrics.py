@@ -0,0 +1,66 @@
+import json
+import os
+import sys
+import tempfile
+sys.path.append("../nacos-jmeter")
+
+import requests
+
+from metrics import LatencyTracker, MetricsRegistry
+
+if __name__ == "__main__":
+    registry = MetricsRegistry(prefix="test", buckets=[0.1, 1])
+    registry.define_histogram("phase_seconds", "Seconds of each phase.", ["phase"])
+    registry.define_counter("bytes_total", "Bytes written.", ["namespace"])
+    registry.define_counter("bytes_total", "Bytes written.", ["namespace"])  # defined again
+
+    registry.observe("phase_seconds", 0.05, phase="git_push")
+    registry.observe("phase_seconds", 0.5, phase="git_push")
+    registry.observe("phase_seconds", 5, phase="git_push")
+    with registry.time("phase_seconds", phase="git_add"):
+        pass
+    registry.inc("bytes_total", 10, namespace='say "hi"')
+    registry.inc("bytes_total", 5, namespace='say "hi"')
+    try:
+        registry.inc("bytes_total", 1, stage="ci")
+        raise AssertionError("labels are not checked")
+    except AssertionError as e:
+        assert "Labels of bytes_total" in str(e), e
+
+    text = registry.render_prometheus()
+    assert "# TYPE test_phase_seconds histogram" in text, text
+    assert 'test_phase_seconds_bucket{phase="git_push",le="0.1"} 1' in text, text
+    assert 'test_phase_seconds_bucket{phase="git_push",le="1"} 2' in text, text
+    assert 'test_phase_seconds_bucket{phase="git_push",le="+Inf"} 3' in text, text
+    assert 'test_phase_seconds_count{phase="git_push"} 3' in text, text
+    assert 'test_bytes_total{namespace="say \\"hi\\""} 15' in text, text
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dump_file = os.path.join(tmp_dir, "metrics", "syncer.json")
+        registry.dump(dump_file)
+        with open(dump_file) as f:
+            data = json.load(f)
+        assert data["metrics"]["bytes_total"]["series"] == [{"labels": {"namespace": 'say "hi"'}, "value": 15}], data
+
+    port = registry.serve(0)
+    try:
+        response = requests.get(f"http://127.0.0.1:{port}/metrics", timeout=5)
+        assert response.status_code == 200 and response.text == registry.render_prometheus()
+        assert requests.get(f"http://127.0.0.1:{port}/metrics.json", timeout=5).json()["buckets"] == [0.1, 1]
+        assert requests.get(f"http://127.0.0.1:{port}/other", timeout=5).status_code == 404
+    finally:
+        registry.stop_serving()
+
+    # rolling percentiles and SLO
+    tracker = LatencyTracker("trigger_latency", {"push": 10}, window_size=10, quantiles=[0.5, 0.9],
+                             metrics_registry=registry)
+    assert tracker.summary("push") == "no trigger_latency of stage push yet"
+    for latency in range(1, 21):
+        assert tracker.observe("push", latency) == (latency <= 10)
+    assert tracker.observe("commit", 1000)  # no target
+    assert tracker.summary("push") == "p50 15.0s, p90 19.0s (last 10)", tracker.summary("push")
+    text = registry.render_prometheus()
+    assert 'test_trigger_latency_percentile_seconds{stage="push",quantile="0.9"} 19' in text, text
+    assert 'test_trigger_latency_slo_misses_total{stage="push"} 10' in text, text
+    assert 'test_trigger_latency_seconds_count{stage="push"} 20' in text, text
+    assert LatencyTracker.percentile([3, 1, 2], 0.99) == 3 and LatencyTracker.percentile([5], 0.5) == 5
@@ -0,0 +1,62 @@
+import os
+import pickle
+import signal
+import sys
+import tempfile
+import tracemalloc
+sys.path.append("../nacos-jmeter")
+
+from profiling import CycleProfiler
+
+leaked = []
+
+
+def leaky_cycle():
+    leaked.extend(str(i) * 10 for i in range(20000))
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        profiler = CycleProfiler("test-syncer", dump_dir=tmp_dir, default_cycles=2, top=5)
+        dump_dir = os.path.join(tmp_dir, "test-syncer")
+
+        # off: nothing hooked, nothing written
+        with profiler.cycle("sync"):
+            leaky_cycle()
+        assert not tracemalloc.is_tracing() and not os.path.exists(dump_dir)
+
+        # requested by signal
+        profiler.install_signal_handler()
+        os.kill(os.getpid(), signal.SIGUSR1)
+        assert profiler.remaining_cycles == 2
+        for _ in range(3):
+            with profiler.cycle("sync"):
+                leaky_cycle()
+        assert profiler.remaining_cycles == 0 and not tracemalloc.is_tracing()
+        files = sorted(os.listdir(dump_dir))
+        assert [f[-11:] for f in files] == ["cycle1.prof", "-cycle1.txt", "cycle2.prof", "-cycle2.txt"], files
+        with open(os.path.join(dump_dir, files[-1])) as f:
+            report = f.read()
+        assert "leaky_cycle" in report and "test_profiling.py:" in report, report
+        assert "memory growth since profiling started" in report, report
+
+        # requested by Nacos config, 0 cancels, invalid content is ignored
+        profiler.on_config_changed({"content": "5"})
+        assert profiler.remaining_cycles == 5
+        with profiler.cycle("sync"):
+            pickle.loads(pickle.dumps(profiler))  # snapshots are not pickled
+        profiler.on_config_changed({"content": "abc"})
+        assert profiler.remaining_cycles == 4
+        profiler.on_config_changed({"content": "0"})
+        with profiler.cycle("sync"):
+            pass
+        assert not tracemalloc.is_tracing() and len(os.listdir(dump_dir)) == 6
+
+        # errors of the block are raised, the cycle is still written
+        profiler.request(1)
+        try:
+            with profiler.cycle("sync"):
+                raise ValueError("sync failed")
+        except ValueError:
+            pass
+        assert len(os.listdir(dump_dir)) == 8 and not tracemalloc.is_tracing()
@@ -0,0 +1,75 @@
+import os
+import sys
+import tempfile
+from xml.sax.saxutils import escape
+sys.path.append("../nacos-jmeter")
+
+import common
+from testplan import TestPlan
+
+JMX = """<?xml version="1.0" encoding="UTF-8"?>
+<jmeterTestPlan version="1.2" properties="5.0" jmeter="5.4.1">
+  <hashTree>
+    <TestPlan guiclass="TestPlanGui" testclass="TestPlan" testname="Test Plan" enabled="true"/>
+    <hashTree>
+      <ThreadGroup guiclass="ThreadGroupGui" testclass="ThreadGroup" testname="users" enabled="true">
+        <stringProp name="ThreadGroup.num_threads">${{__P(threads,1)}}</stringProp>
+      </ThreadGroup>
+      <hashTree>
+        <JSR223Sampler guiclass="TestBeanGUI" testclass="JSR223Sampler" testname="script" enabled="true">
+          <stringProp name="filename">{filename}</stringProp>
+          <stringProp name="script">{script}</stringProp>
+        </JSR223Sampler>
+        <hashTree/>
+      </hashTree>
+    </hashTree>
+  </hashTree>
+</jmeterTestPlan>
+"""
+
+
+def references(tmp_dir, script, filename="") -> dict:
+    jmx = os.path.join(tmp_dir, "plan.jmx")
+    with open(jmx, "w", encoding="utf-8") as f:
+        f.write(JMX.format(script=escape(script, {'"': "&quot;"}), filename=filename))
+    return TestPlan(jmx).referenced_properties()
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # keys analyzed
+        result = references(tmp_dir, 'props.get("host"); props.getProperty("port", "80"); '
+                                     'props.put("x", vars.get("y"))')
+        assert result["keys"] == {"threads": True, "host": False, "port": False} and result["complete"], result
+        result = references(tmp_dir, 'log.info("${__P(device.${id}.cid)}")')
+        assert result["patterns"] == ["device\\..*\\.cid"] and result["complete"], result
+
+        # keys cannot be analyzed
+        for script in [
+            'props.get("device." + id)',
+            'props.getProperty(key)',
+            'props["host"]',
+            'props.host',
+            'def p = props; p.get("host")',
+            'org.apache.jmeter.util.JMeterUtils.getProperty("host")',
+            'JMeterUtils.getPropDefault("port", 80)',
+            'import static org.apache.jmeter.util.JMeterUtils.*; getPropDefault("port", 80)',
+        ]:
+            assert not references(tmp_dir, script)["complete"], script
+        assert not references(tmp_dir, "", filename="scripts/login.groovy")["complete"]
+
+        # separators of java.util.Properties: '=', ':' or whitespace
+        property_file = os.path.join(tmp_dir, "summary.properties")
+        with open(property_file, "w", encoding="iso-8859-1") as f:
+            f.write("# comment\n"
+                    "! comment\n"
+                    "host=example.com\n"
+                    "port: 80\n"
+                    "  user admin\n"
+                    "path\\=with\\:escapes = /\n"
+                    "list = a, \\\n"
+                    "       b\n"
+                    "empty\n")
+        lines = common.load_property_lines_from_file(property_file)
+        assert list(lines) == ["host", "port", "user", "path\\=with\\:escapes", "list", "empty"], list(lines)
+        assert lines["user"] == "  user admin\n" and lines["list"] == "list = a, \\\n       b\n"
@@ -0,0 +1,94 @@
+import os
+import sys
+import tempfile
+sys.path.append("../nacos-jmeter")
+
+import git
+
+from fakenacos import FakeNacosServer
+from nacosserver import NacosServer
+from nacossyncer import NacosSyncer
+from snapshotrepo import SnapshotRepoMaintenance, clone_snapshot_repo, count_objects, update_snapshot_repo
+from tracing import tracer
+
+
+def init_remote(base_dir, commits) -> (str, git.Repo):
+    """Create a bare remote allowing partial clones, with commits pushed by a seed clone."""
+    remote_dir = os.path.join(base_dir, "remote.git")
+    git.Repo.init(remote_dir, bare=True).git.config("uploadpack.allowFilter", "true")
+    seed_repo = git.Repo.clone_from(remote_dir, os.path.join(base_dir, "seed"))
+    for i in range(commits):
+        commit_file(seed_repo, i)
+    seed_repo.remotes.origin.push(seed_repo.active_branch.name)
+    return remote_dir, seed_repo
+
+
+def commit_file(repo, i):
+    with open(os.path.join(repo.working_dir, f"config{i % 5}.properties"), "w") as f:
+        f.write(f"value={i}\n" * 100)
+    repo.git.add(A=True)
+    repo.index.commit(f"commit {i}")
+
+
+if __name__ == "__main__":
+    # spans of syncer are not under test, keep them out of data/trace of the project
+    tracer.enabled = False
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        remote_dir, seed_repo = init_remote(tmp_dir, commits=20)
+
+        # clone modes
+        full = clone_snapshot_repo(remote_dir, os.path.join(tmp_dir, "full"), "full")
+        assert full.git.rev_list("--count", "HEAD") == "20"
+        shallow = clone_snapshot_repo(remote_dir, os.path.join(tmp_dir, "shallow"), "shallow", depth=3)
+        assert shallow.git.rev_list("--count", "HEAD") == "3"
+        blobless = clone_snapshot_repo(remote_dir, os.path.join(tmp_dir, "blobless"), "blobless")
+        assert blobless.git.rev_list("--count", "HEAD") == "20"
+        assert blobless.git.config("remote.origin.partialclonefilter") == "blob:none"
+        assert not blobless.is_dirty(untracked_files=True)
+        # existing repo dir is opened as it is
+        assert clone_snapshot_repo(remote_dir, os.path.join(tmp_dir, "shallow"), "full").git_dir == shallow.git_dir
+
+        # build agents: clone, then update to the latest commit without growing history
+        agent_dir = os.path.join(tmp_dir, "agent")
+        assert update_snapshot_repo(agent_dir, remote_dir, "shallow", 1) == seed_repo.head.commit.hexsha
+        commit_file(seed_repo, 20)
+        seed_repo.remotes.origin.push()
+        with open(os.path.join(agent_dir, "config0.properties"), "w") as f:
+            f.write("changed on agent\n")
+        assert update_snapshot_repo(agent_dir, remote_dir, "shallow", 1) == seed_repo.head.commit.hexsha
+        agent = git.Repo(agent_dir)
+        assert agent.git.rev_list("--count", "HEAD") == "1" and not agent.is_dirty()
+
+        # maintenance: nothing due until one interval passed
+        maintenance = SnapshotRepoMaintenance(full.working_dir, {"repack": 60, "commit-graph": 60, "gc": 3600})
+        assert maintenance.due_tasks() == [] and 0 < maintenance.seconds_until_due() <= 60
+        now = maintenance.last_run["gc"] + 60
+        assert maintenance.due_tasks(now) == ["repack", "commit-graph"] and maintenance.seconds_until_due(now) == 0
+        assert SnapshotRepoMaintenance(full.working_dir, {}).seconds_until_due() is None
+        for i in range(21, 30):
+            commit_file(full, i)
+        assert count_objects(full.working_dir)["loose"] > 0
+        durations = maintenance.run(["repack", "commit-graph", "gc"])
+        assert list(durations) == ["repack", "commit-graph", "gc"], durations
+        assert count_objects(full.working_dir)["loose"] == 0
+        assert os.path.exists(os.path.join(full.git_dir, "objects", "info", "commit-graph"))
+        assert maintenance.due_tasks(maintenance.last_run["gc"] + 60) == ["repack", "commit-graph"]
+
+        # syncer: maintenance never overlaps a sync, tasks staged meanwhile are synced right after
+        with FakeNacosServer(seed=0) as fake:
+            nacos_syncer = NacosSyncer(NacosServer(fake.host, fake.port), nacos_snapshot_repo_url=remote_dir,
+                                       nacos_snapshot_repo_dir=os.path.join(tmp_dir, "syncer"),
+                                       commit_history_file=os.path.join(tmp_dir, "commit.log"),
+                                       maintenance_intervals={"repack": 0, "gc": 0})
+            assert nacos_syncer.nacos_snapshot_repo.git.config("remote.origin.partialclonefilter") == "blob:none"
+            dispatched = []
+            nacos_syncer.dispatch_sync_task = dispatched.append
+
+            assert nacos_syncer.acquire_sync_task_lock() and not nacos_syncer.acquire_sync_task_lock()
+            assert not nacos_syncer.maintain_snapshot_repo(["repack", "gc"])
+            nacos_syncer.sync_task_lock = False
+
+            nacos_syncer.add({"content": "staged while maintaining"})
+            assert nacos_syncer.maintain_snapshot_repo(["repack", "gc"])
+            assert not nacos_syncer.sync_task_lock and dispatched == [None]
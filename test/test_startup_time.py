@@ -0,0 +1,41 @@
+import json
+import os
+import subprocess
+import sys
+sys.path.append("../nacos-jmeter")
+
+import settings
+
+# run in a fresh interpreter: only imports of the entry point are executed, not its __main__ block
+MEASURE = """
+import json, runpy, sys, time
+start = time.perf_counter()
+runpy.run_path(sys.argv[1])
+print(json.dumps({"seconds": time.perf_counter() - start, "modules": sorted(sys.modules)}))
+"""
+
+
+def measure_startup(entry_point, runs=3) -> dict:
+    """Return the fastest of several runs, so a busy host does not fail the budget."""
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", MEASURE, os.path.join(settings.PROJECT_ROOT, entry_point)],
+                                check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.splitlines()[-1]))
+    return min(results, key=lambda result: result["seconds"])
+
+
+if __name__ == "__main__":
+    for entry, budget in settings.STARTUP_IMPORT_BUDGETS.items():
+        result = measure_startup(entry)
+        print(f"{entry}: {result['seconds']:.3f}s (budget {budget}s)")
+        imported = [module for module in settings.STARTUP_FORBIDDEN_IMPORTS[entry] if module in result["modules"]]
+        assert not imported, f"{entry} imports {imported} at startup"
+        assert result["seconds"] <= budget, f"{entry} took {result['seconds']:.3f}s to start, budget {budget}s"
+
+    # names moved to nacossyncer and databasesyncer are still importable from syncer
+    import syncer
+    assert "nacossyncer" not in sys.modules and "databasesyncer" not in sys.modules
+    assert syncer.DatabaseSyncer.__module__ == "databasesyncer"
+    assert "nacossyncer" not in sys.modules
+    assert syncer.NacosSyncer.__module__ == "nacossyncer"
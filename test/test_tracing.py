@@ -0,0 +1,73 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing import Pool
+sys.path.append("../nacos-jmeter")
+
+from tracing import Tracer, critical_path, load_spans
+
+
+tracer = None  # module-level as tracing.tracer, inherited by forked workers instead of being pickled
+
+
+def work_in_worker(seconds, trace_context):
+    with tracer.span("worker", parent=trace_context, seconds=seconds):
+        time.sleep(seconds)
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        trace_file = os.path.join(tmp_dir, "trace", "spans.jsonl")
+        tracer = Tracer(service_name="test", trace_file=trace_file, enabled=True, max_bytes=10 * 1024 * 1024)
+
+        with tracer.span("sync_to_git", reason="test") as root:
+            with tracer.span("make_snapshot") as snapshot_span:
+                assert tracer.current_span() is snapshot_span and snapshot_span.parent_span_id == root.span_id
+                # threads do not inherit current span, context is passed explicitly
+                thread = threading.Thread(target=work_in_worker, args=(0.01, snapshot_span.context))
+                thread.start()
+                thread.join()
+                pool = Pool(2)
+                for seconds in [0.05, 0.2]:
+                    pool.apply_async(work_in_worker, args=(seconds, tracer.current_context()))
+                pool.close()
+                pool.join()
+            try:
+                with tracer.span("commit_and_push_to_remote"):
+                    raise RuntimeError("push rejected")
+            except RuntimeError:
+                pass
+        assert tracer.current_span() is None
+        with tracer.span("another", new_trace=False) as another:
+            assert another.trace_id != root.trace_id
+
+        # OTLP/JSON shape
+        with open(trace_file) as f:
+            lines = [json.loads(line) for line in f]
+        assert len(lines) == 7, lines
+        first = lines[0]["resourceSpans"][0]
+        assert {"key": "service.name", "value": {"stringValue": "test"}} in first["resource"]["attributes"], first
+        assert first["scopeSpans"][0]["spans"][0]["kind"] == 1
+
+        spans = load_spans(trace_file)
+        trace_spans = [s for s in spans if s["trace_id"] == root.trace_id]
+        assert len(trace_spans) == 6, trace_spans
+        assert len({s["pid"] for s in trace_spans}) >= 2, "spans of Pool workers are not exported"
+        failed = [s for s in trace_spans if s["name"] == "commit_and_push_to_remote"][0]
+        assert failed["status"]["code"] == 2 and "push rejected" in failed["status"]["message"], failed
+
+        # thread ran before the Pool, then worker sleeping 0.2s is on critical path, the one sleeping 0.05s is not
+        path = critical_path(trace_spans, root.span_id)
+        assert [(depth, s["name"], s["attributes"].get("seconds")) for depth, s in path] == [
+            (0, "sync_to_git", None), (1, "make_snapshot", None), (2, "worker", 0.01), (2, "worker", 0.2),
+            (1, "commit_and_push_to_remote", None)
+        ], path
+
+        # nothing exported when disabled
+        disabled = Tracer(trace_file=os.path.join(tmp_dir, "disabled.jsonl"), enabled=False)
+        with disabled.span("nothing"):
+            pass
+        assert not os.path.exists(os.path.join(tmp_dir, "disabled.jsonl"))